@@ -8,7 +8,7 @@ from app.models import (
     AuditReport, EvidenceItem, FeedbackRequest
 )
 from app.db import SessionLocal, AuditJob, Feedback
-from app.services.task_queue import task_queue_service
+from app.services.audit_queue import audit_queue
 from app.security import verify_api_key
 
 logger = logging.getLogger(__name__)
@@ -46,14 +46,14 @@ async def run_audit(
         db.commit()
         
         # Enqueue audit task
-        await task_queue_service.enqueue(
-            "audit",
+        await audit_queue.enqueue(
             job_id,
             {
                 "goal": request.goal,
                 "scope": request.scope,
                 "priority": request.priority,
-            }
+            },
+            priority=request.priority,
         )
         
         logger.info(f"Started audit job {job_id}: {request.goal}")
@@ -1,7 +1,11 @@
 """Health check endpoints."""
 from fastapi import APIRouter
 from datetime import datetime
+from typing import Any, Dict
 from app.models import HealthResponse
+from app.services.audit_scheduler import audit_scheduler
+from app.services.embeddings import embeddings_service
+from app.services.task_queue import task_queue_service
 
 router = APIRouter()
 
@@ -16,3 +20,14 @@ async def health_check():
         task_queue="ready",
         timestamp=datetime.utcnow(),
     )
+
+
+@router.get("/health/metrics")
+async def metrics() -> Dict[str, Any]:
+    """Runtime metrics for internal services."""
+    return {
+        "embeddings": embeddings_service.stats(),
+        "audits": await audit_scheduler.stats(),
+        "task_status": task_queue_service.tasks.stats(),
+        "timestamp": datetime.utcnow(),
+    }
@@ -4,7 +4,10 @@ import uuid
 import json
 from typing import List, Optional
 from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
+from app.services.ingest import delete_documents
 from app.services.task_queue import task_queue_service
+from app.services.uploads import discard_upload, spool_upload, upload_payload
+from app.services.ingest_queue import publish_ingest_task
 from app.security import verify_api_key
 import redis
 import os
@@ -46,53 +49,20 @@ async def ingest_batch(
             if not file.filename:
                 continue
             
+            payload = None
             try:
-                content = await file.read()
-                
-                # Parse based on file type
-                if file.filename.endswith('.pdf'):
-                    try:
-                        import PyPDF2
-                        from io import BytesIO
-                        pdf_reader = PyPDF2.PdfReader(BytesIO(content))
-                        text_content = ''
-                        for page in pdf_reader.pages:
-                            text_content += page.extract_text() + '\n'
-                    except Exception as e:
-                        logger.warning(f"PDF parsing failed for {file.filename}: {e}")
-                        text_content = content.decode('utf-8', errors='ignore')
-                elif file.filename.endswith('.txt'):
-                    text_content = content.decode('utf-8')
-                elif file.filename.endswith('.json'):
-                    try:
-                        text_content = json.dumps(json.loads(content.decode('utf-8')))
-                    except json.JSONDecodeError:
-                        text_content = content.decode('utf-8', errors='ignore')
-                else:
-                    text_content = content.decode('utf-8', errors='ignore')
+                # Stream to the shared spool; only a reference is queued
+                upload = await spool_upload(file)
                 
                 # Create ingest task
                 task_id = f"ingest_{uuid.uuid4().hex[:12]}"
-                
-                payload = {
-                    "title": file.filename,
-                    "content": text_content[:10000],  # Limit to 10k chars
-                    "metadata": {
-                        "source": "batch_upload",
-                        "filename": file.filename,
-                        "size": len(content),
-                    }
-                }
+                payload = upload_payload(upload)
                 
                 # Queue task in Redis or fallback to in-memory queue
                 if redis_client:
                     try:
-                        task_json = json.dumps({
-                            "task_id": task_id,
-                            "payload": payload,
-                        })
-                        redis_client.rpush("ingest_tasks", task_json)
-                        logger.info(f"✅ Queued Redis task {task_id} for {file.filename}")
+                        queue = publish_ingest_task(redis_client, task_id, payload)
+                        logger.info(f"✅ Queued Redis task {task_id} for {file.filename} on '{queue}'")
                     except Exception as e:
                         logger.error(f"Failed to queue in Redis: {e}. Using fallback.")
                         await task_queue_service.enqueue("ingest", task_id, payload)
@@ -103,12 +73,15 @@ async def ingest_batch(
                     "filename": file.filename,
                     "task_id": task_id,
                     "status": "queued",
-                    "size_bytes": len(content),
+                    "size_bytes": upload["size"],
+                    "sha256": upload["sha256"],
                 })
                 queued_count += 1
                 
             except Exception as e:
                 logger.error(f"Failed to queue file {file.filename}: {e}")
+                # Nothing will consume the spooled copy
+                discard_upload(payload)
                 results.append({
                     "filename": file.filename,
                     "status": "error",
@@ -131,6 +104,14 @@ async def ingest_batch(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, api_key: str = Depends(verify_api_key)):
+    """Delete a stored document and remove it from search."""
+    if not delete_documents([doc_id]):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"doc_id": doc_id, "status": "deleted"}
+
+
 @router.get("/status/{task_id}")
 async def get_ingest_status(task_id: str):
     """Get ingest task status."""
@@ -20,10 +20,56 @@ class Settings(BaseSettings):
     # Redis/Celery
     REDIS_URL: str = "redis://localhost:6379/0"
     USE_CELERY: bool = False  # Fallback to in-process by default
+    INGEST_TRANSPORT: str = "list"  # list (ingest_tasks) or stream (consumer groups, at-least-once)
+    INGEST_SHARDED_QUEUES: bool = False  # list transport: one queue per shard, by document id hash
+    INGEST_STREAM: str = "ingest_stream"
+    INGEST_STREAM_GROUP: str = "ingest_workers"
+    INGEST_CLAIM_IDLE_MS: int = 300000  # pending entries idle this long are reclaimed from dead workers
+    INGEST_MAX_DELIVERIES: int = 5  # deliveries before an entry moves to the dead-letter stream
+    INGEST_DEAD_LETTER_STREAM: str = "ingest_dead_letter"
     
     # Embeddings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
+    EMBEDDING_BACKEND: str = "hashing"  # hashing (offline) or sentence-transformers; same in backend and worker
+    EMBEDDING_CACHE_DIR: str = ""  # local model cache directory; empty uses the library default
+    EMBEDDING_DEVICE: str = ""  # e.g. cpu or cuda; empty lets sentence-transformers choose
+    EMBEDDING_BATCH_TOKENS: int = 8192  # padded tokens per model batch (batch size * longest text)
+    EMBEDDING_MAX_BATCH: int = 64
+    EMBEDDING_THREADS: int = 1  # inference executor threads
+    EMBEDDING_MICRO_BATCHING: bool = True  # coalesce concurrent single-text embeds
+    EMBEDDING_BATCH_MAX_ITEMS: int = 128  # texts per coalesced batch
+    EMBEDDING_BATCH_WAIT_MS: float = 5.0  # max time the first request waits for company
+    EMBEDDING_CACHE: bool = True  # reuse embeddings of previously seen texts
+    EMBEDDING_CACHE_MEMORY_MB: int = 64  # in-process LRU tier
+    EMBEDDING_CACHE_STORE: str = "auto"  # shared tier: auto (redis, else sqlite), redis, sqlite or none
+    EMBEDDING_CACHE_PATH: str = "./data/embedding_cache.db"  # sqlite tier file; empty disables it
+    EMBEDDING_CACHE_MAX_ROWS: int = 200000  # vectors kept in the sqlite tier, oldest evicted first; 0 = unbounded
+    EMBEDDING_CACHE_TTL: int = 2592000  # seconds a cached vector lives in redis; 0 = no expiry
+    EMBEDDING_QUANTIZATION: str = "none"  # none, float16, int8 or pq (compressed in-memory codes)
+    PQ_SUBVECTORS: int = 48  # bytes per vector for pq; must divide EMBEDDING_DIMENSION
+    PQ_TRAIN_SIZE: int = 10000  # vectors collected before training pq codebooks
+    RERANK_FACTOR: int = 4  # shortlist = RERANK_FACTOR * top_k, re-scored at full precision
+    
+    # Vector index
+    VECTOR_INDEX_TYPE: str = "flat"  # flat (exact), ivf (approximate), mmap (shared segment) or sharded
+    SHARD_INDEX_TYPE: str = "flat"  # per-shard index for sharded: flat, ivf or quantized
+    SEARCH_THREADS: int = 0  # sharded search fan-out threads; 0 = one per shard (MAX_WORKERS)
+    EMBEDDING_STORE_DIR: str = ""  # shared memory-mapped embedding segments; empty disables
+    VECTOR_INDEX_PATH: str = ""  # .npz snapshot path; empty disables persistence
+    IVF_NLIST: int = 256  # number of k-means lists
+    IVF_NPROBE: int = 8  # lists scanned per query (higher = better recall, slower)
+    INDEX_EVENTS_STREAM: str = "index_events"  # Redis stream of document added/removed events
+    INDEX_EVENTS_MAXLEN: int = 100000  # approximate cap on the events stream
+    INDEX_DELTA_MERGE_ROWS: int = 1000  # delta rows that trigger a background merge
+    INDEX_DELTA_MERGE_INTERVAL: float = 5.0  # max seconds a non-empty delta waits for a merge
+    INDEX_COMPACT_TOMBSTONES: int = 1000  # removed rows that trigger a compaction of the vector and lexical indexes
+    
+    # Lexical search
+    HYBRID_SEARCH: bool = True  # fuse BM25 lexical hits with vector hits in audits
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    LEXICAL_PREFILTER_SIZE: int = 0  # >0: vector search scores only the top-N lexical matches
     
     # LLM
     LLM_PROVIDER: str = "mock"  # mock, anthropic, openai, google
@@ -31,12 +77,32 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     GOOGLE_API_KEY: str = ""
     
+    # Uploads
+    UPLOAD_SPOOL_DIR: str = "./uploads"  # shared with workers, which parse the spooled files
+    UPLOAD_CHUNK_SIZE: int = 1048576  # bytes read per chunk while streaming an upload
+    UPLOAD_MAX_BYTES: int = 104857600  # larger uploads are rejected
+    PDF_EXTRACT_WORKERS: int = 0  # text extraction processes; 0 = one per CPU
+    PDF_PAGES_PER_TASK: int = 16  # pages per parallel extraction task
+    PDF_MAX_PAGES: int = 2000  # pages beyond this are not extracted
+    PDF_EXTRACT_TIMEOUT: float = 120.0  # seconds per document; 0 disables
+    
     # Processing
     MAX_WORKERS: int = 4
+    WORKER_CONCURRENCY: int = 2  # micro-batches one worker process handles at once (--concurrency)
+    WORKER_BATCH_SIZE: int = 64  # queued tasks embedded and written together
+    WORKER_BATCH_WAIT_MS: float = 50.0  # max wait for a micro-batch to fill
+    INGEST_INPROCESS_CONSUMERS: int = 2  # backend ingest consumers used without Redis; 0 disables
+    TASK_STATUS_TTL: float = 3600.0  # seconds an in-process task status is kept (as task_result:{id})
+    TASK_STATUS_MAX_ENTRIES: int = 100000  # oldest statuses are evicted beyond this
     CHUNK_SIZE: int = 1000
     OVERLAP: int = 100
     
     # Audit
+    AUDIT_MAX_CONCURRENT: int = 4  # audit jobs run at once; others wait by priority
+    AUDIT_QUEUE: str = "auto"  # redis (durable, shared by replicas), memory (one process), auto = redis if reachable
+    AUDIT_QUEUE_PREFIX: str = "audit"
+    AUDIT_VISIBILITY_TIMEOUT: float = 300.0  # seconds a job's lease lasts without a heartbeat before it is requeued
+    AUDIT_MAX_ATTEMPTS: int = 3  # leases before a job whose runners keep dying is failed
     TARGET_PRECISION: float = 0.85
     MAX_ITERATIONS: int = 5
     PRECISION_WEIGHT: float = 0.7
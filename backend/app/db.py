@@ -1,6 +1,11 @@
 """Database initialization and models."""
 import logging
-from sqlalchemy import create_engine, Column, String, Float, DateTime, Text, JSON
+import json
+import numpy as np
+from typing import Sequence
+from sqlalchemy import (
+    create_engine, inspect, text, Column, String, Float, Integer, DateTime, Text, JSON, LargeBinary
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -10,6 +15,28 @@ logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+EMBEDDING_DTYPE = "float32"
+_EMBEDDING_NUMPY_DTYPE = np.dtype("<f4")
+
+
+def encode_embedding(embedding: Sequence[float]) -> bytes:
+    """Serialize an embedding as raw little-endian float32 bytes."""
+    return np.asarray(embedding, dtype=_EMBEDDING_NUMPY_DTYPE).tobytes()
+
+
+def decode_embedding(raw, dim: int = None) -> np.ndarray:
+    """Deserialize a stored embedding (zero-copy for binary rows).
+
+    Rows written before the binary migration still hold JSON text and are
+    parsed as a fallback.
+    """
+    if isinstance(raw, str):
+        return np.asarray(json.loads(raw), dtype=np.float32)
+    vector = np.frombuffer(raw, dtype=_EMBEDDING_NUMPY_DTYPE)
+    if dim is not None and vector.shape[0] != dim:
+        raise ValueError(f"Stored embedding has {vector.shape[0]} values, expected {dim}")
+    return vector
+
 
 class Document(Base):
     """Document storage model."""
@@ -18,7 +45,9 @@ class Document(Base):
     id = Column(String, primary_key=True)
     title = Column(String)
     content = Column(Text)
-    embedding = Column(Text)  # JSON serialized list of floats
+    embedding = Column(LargeBinary)  # raw little-endian float32, see encode_embedding
+    embedding_dtype = Column(String, default=EMBEDDING_DTYPE)
+    embedding_dim = Column(Integer)
     doc_metadata = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     source = Column(String)
@@ -55,16 +84,64 @@ engine = create_engine(settings.DATABASE_URL, echo=False)
 SessionLocal = sessionmaker(bind=engine)
 
 
+def _ensure_embedding_columns():
+    """Add embedding format columns to databases created before they existed."""
+    columns = {col["name"] for col in inspect(engine).get_columns("documents")}
+    with engine.begin() as conn:
+        if "embedding_dtype" not in columns:
+            conn.execute(text("ALTER TABLE documents ADD COLUMN embedding_dtype VARCHAR"))
+        if "embedding_dim" not in columns:
+            conn.execute(text("ALTER TABLE documents ADD COLUMN embedding_dim INTEGER"))
+
+
 async def init_db():
     """Initialize database tables."""
     try:
         Base.metadata.create_all(engine)
+        _ensure_embedding_columns()
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
         raise
 
 
+def migrate_embeddings_to_binary(batch_size: int = 1000) -> int:
+    """Convert JSON-text embeddings to binary float32 in place, one batch per commit."""
+    _ensure_embedding_columns()
+    converted = 0
+    select_batch = text(
+        "SELECT id, embedding FROM documents "
+        "WHERE embedding_dim IS NULL AND embedding IS NOT NULL LIMIT :limit"
+    )
+    update_row = text(
+        "UPDATE documents SET embedding = :embedding, embedding_dtype = :dtype, "
+        "embedding_dim = :dim WHERE id = :id"
+    )
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_batch, {"limit": batch_size}).fetchall()
+            if not rows:
+                break
+            updates = []
+            for doc_id, raw in rows:
+                if isinstance(raw, bytes):
+                    vector = np.frombuffer(raw, dtype=_EMBEDDING_NUMPY_DTYPE)
+                else:
+                    vector = np.asarray(json.loads(raw), dtype=np.float32)
+                updates.append({
+                    "id": doc_id,
+                    "embedding": encode_embedding(vector),
+                    "dtype": EMBEDDING_DTYPE,
+                    "dim": int(vector.shape[0]),
+                })
+            conn.execute(update_row, updates)
+        converted += len(updates)
+        logger.info(f"Migrated {converted} embeddings to binary float32")
+
+    return converted
+
+
 def get_db():
     """Get database session."""
     db = SessionLocal()
@@ -5,73 +5,23 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.db import init_db, SessionLocal, AuditJob
+from app.db import init_db
 from app.api import health, audit, ingest
-from app.services.auditor import AuditorPlanner
+from app.services.audit_scheduler import audit_scheduler
+from app.services.vector_index import vector_index
+from app.services.index_events import IndexEventConsumer
+from app.services.embeddings import embeddings_service
+from app.services.ingest_pipeline import InProcessIngestPool
+from app.services.task_queue import task_queue_service
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Background task for audit processing
-_audit_processor_task = None
-
-
-async def process_audit_queue():
-    """Background task to process audit jobs from queue."""
-    logger.info("🟢 Audit queue processor started")
-    
-    while True:
-        try:
-            from app.services.task_queue import task_queue_service
-            
-            # Get next audit task
-            task = await task_queue_service.dequeue("audit")
-            
-            if task:
-                job_id, payload = task
-                logger.info(f"🔄 Processing audit job: {job_id}")
-                
-                try:
-                    db = SessionLocal()
-                    job = db.query(AuditJob).filter(AuditJob.id == job_id).first()
-                    
-                    if job:
-                        job.status = "processing"
-                        db.commit()
-                        
-                        # Run audit
-                        planner = AuditorPlanner(
-                            goal=payload.get("goal"),
-                            scope=payload.get("scope", "")
-                        )
-                        
-                        result = await planner.run_audit(job_id)
-                        
-                        # Update job with results
-                        job.status = "completed"
-                        job.progress = 100.0
-                        job.results = result
-                        db.commit()
-                        
-                        logger.info(f"✅ Audit job {job_id} completed")
-                    
-                    db.close()
-                
-                except Exception as e:
-                    logger.error(f"❌ Audit job {job_id} failed: {e}", exc_info=True)
-                    db = SessionLocal()
-                    job = db.query(AuditJob).filter(AuditJob.id == job_id).first()
-                    if job:
-                        job.status = "failed"
-                        db.commit()
-                    db.close()
-            else:
-                # No task, wait a bit before checking again
-                await asyncio.sleep(1)
-        
-        except Exception as e:
-            logger.error(f"Audit queue processor error: {e}", exc_info=True)
-            await asyncio.sleep(5)
+# Background task applying worker ingest events to the vector index
+_index_event_consumer = None
+_index_event_task = None
+# In-process ingest consumers for tasks queued without Redis
+_ingest_pool = None
 
 
 @asynccontextmanager
@@ -82,21 +32,41 @@ async def lifespan(app: FastAPI):
     await init_db()
     logger.info("Database initialized")
     
-    # Start audit processor
-    global _audit_processor_task
-    _audit_processor_task = asyncio.create_task(process_audit_queue())
-    logger.info("Audit processor started")
+    # Start audit scheduler
+    audit_scheduler.start()
+    
+    global _index_event_consumer, _index_event_task
+    _index_event_consumer = IndexEventConsumer(vector_index)
+    _index_event_task = asyncio.create_task(_index_event_consumer.start())
+    
+    global _ingest_pool
+    _ingest_pool = InProcessIngestPool(task_queue_service)
+    _ingest_pool.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down ODRA Backend...")
-    if _audit_processor_task:
-        _audit_processor_task.cancel()
+    if _index_event_consumer:
+        _index_event_consumer.stop()
+    if _ingest_pool:
+        await _ingest_pool.stop()
+    await audit_scheduler.stop()
+    if _index_event_task:
+        _index_event_task.cancel()
         try:
-            await _audit_processor_task
+            await _index_event_task
         except asyncio.CancelledError:
             pass
+    
+    if embeddings_service.batcher is not None:
+        await embeddings_service.batcher.aclose()
+    
+    if vector_index.loaded:
+        try:
+            vector_index.save()
+        except Exception as e:
+            logger.warning(f"Failed to save vector index: {e}")
 
 
 app = FastAPI(
@@ -0,0 +1,255 @@
+"""Audit job queues: in-process for a single backend, Redis for replicas."""
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+import redis
+import redis.asyncio as aioredis
+from app.config import settings
+from app.services.task_queue import TaskQueueService, task_queue_service
+
+logger = logging.getLogger(__name__)
+
+# Seconds a finished job's status is kept in Redis (as the workers' task_result keys)
+RESULT_TTL = 3600
+# Priority of jobs recovered from the database, which does not store it
+DEFAULT_PRIORITY = 5
+# Longest a waiting consumer goes without checking the queue itself
+WAKE_INTERVAL = 1.0
+# Wake-up tokens kept for consumers that are not waiting yet
+WAKE_BACKLOG = 100
+
+# Pops the most urgent job and leases it in one step, so a consumer that dies
+# while dequeuing leaves the job queued or leased, never lost.
+# KEYS: queue, leases; ARGV: lease deadline, now, job key prefix
+LEASE_SCRIPT = """
+local popped = redis.call('ZPOPMIN', KEYS[1])
+if #popped == 0 then
+    return false
+end
+local job_id = popped[1]
+local job_key = ARGV[3] .. job_id
+if redis.call('EXISTS', job_key) == 0 then
+    return {job_id}
+end
+redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+redis.call('HSET', job_key, 'status', 'processing', 'started_at', ARGV[2])
+redis.call('HINCRBY', job_key, 'attempts', 1)
+return {job_id, redis.call('HGET', job_key, 'payload'), redis.call('HGET', job_key, 'enqueued_at')}
+"""
+
+# Takes back one expired lease and requeues or fails its job in one step, so
+# a replica that dies while recovering leaves the job leased, never lost.
+# Only the replica that removes the lease recovers the job.
+# KEYS: leases, queue, wake, job; ARGV: job id, now, max attempts, failure result, result TTL, wake backlog
+RECOVER_SCRIPT = """
+local deadline = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not deadline or tonumber(deadline) > tonumber(ARGV[2]) then
+    return false
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+local job = redis.call('HMGET', KEYS[4], 'payload', 'priority', 'enqueued_at', 'attempts')
+if not job[1] then
+    return false
+end
+if tonumber(job[4] or 0) >= tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[4], 'status', 'failed', 'result', ARGV[4])
+    redis.call('EXPIRE', KEYS[4], ARGV[5])
+    return 'failed'
+end
+-- Same score as RedisAuditQueue._score; formatted so Lua does not round it
+local score = -tonumber(job[2]) * 1e13 + math.floor(tonumber(job[3]) * 1000)
+redis.call('HSET', KEYS[4], 'status', 'pending')
+redis.call('ZADD', KEYS[2], string.format('%.0f', score), ARGV[1])
+redis.call('LPUSH', KEYS[3], ARGV[1])
+redis.call('LTRIM', KEYS[3], 0, tonumber(ARGV[6]) - 1)
+return 'requeued'
+"""
+
+AuditTask = Tuple[str, Dict[str, Any], float]
+
+
+class MemoryAuditQueue:
+    """Audit jobs in the in-process TaskQueueService (one backend process).
+
+    Jobs are lost with the process; they are requeued from the database on
+    the next start (see recover_orphaned_jobs). Leases are not needed.
+    """
+
+    durable = False
+
+    def __init__(self, task_queue: TaskQueueService):
+        """Initialize queue on top of `task_queue`."""
+        self.task_queue = task_queue
+
+    async def enqueue(self, job_id: str, payload: Dict[str, Any], priority: int = 0):
+        await self.task_queue.enqueue("audit", job_id, payload, priority=priority)
+
+    async def dequeue(self, timeout: Optional[float] = None) -> Optional[AuditTask]:
+        """Next job as (job_id, payload, enqueued_at), or None on timeout."""
+        task = await self.task_queue.dequeue("audit", timeout=timeout)
+        if task is None:
+            return None
+        job_id, payload = task
+        status = self.task_queue.get_task_status(job_id)
+        return job_id, payload, status.get("enqueued_at", time.time())
+
+    async def extend(self, job_id: str):
+        pass
+
+    async def complete(self, job_id: str, status: str, result: Dict[str, Any] = None):
+        self.task_queue.update_task_status(job_id, status, result)
+
+    async def recover_expired(self) -> int:
+        return 0
+
+    async def tracked(self, job_id: str) -> bool:
+        return self.task_queue.get_task_status(job_id)["status"] in ("pending", "processing")
+
+    async def status(self, job_id: str) -> Dict[str, Any]:
+        return self.task_queue.get_task_status(job_id)
+
+    async def depth(self) -> int:
+        return self.task_queue.qsize("audit")
+
+
+class RedisAuditQueue:
+    """Durable audit jobs in Redis, shared by every backend replica.
+
+    Waiting jobs are a sorted set scored by priority, then enqueue time. A
+    Lua script pops the next job and leases it for `visibility_timeout`
+    seconds in one step; idle consumers block on a wake-up list that every
+    enqueue pushes to. The runner extends the lease while it works. Leases of a
+    crashed replica expire and recover_expired() puts those jobs back in
+    the queue; a job leased more than `max_attempts` times fails instead.
+    """
+
+    durable = True
+
+    def __init__(
+        self, client: aioredis.Redis, prefix: str = None, visibility_timeout: float = None, max_attempts: int = None
+    ):
+        """Initialize queue on `client` (created with decode_responses=True)."""
+        self.client = client
+        self.prefix = prefix or settings.AUDIT_QUEUE_PREFIX
+        self.visibility_timeout = visibility_timeout or settings.AUDIT_VISIBILITY_TIMEOUT
+        self.max_attempts = max_attempts or settings.AUDIT_MAX_ATTEMPTS
+        self.queue_key = f"{self.prefix}:queue"
+        self.leases_key = f"{self.prefix}:leases"
+        self.wake_key = f"{self.prefix}:wake"
+        self._lease = client.register_script(LEASE_SCRIPT)
+        self._recover = client.register_script(RECOVER_SCRIPT)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    @staticmethod
+    def _score(priority: int, enqueued_at: float) -> float:
+        # Higher priority sorts first, then older jobs (millisecond timestamps stay below 1e13)
+        return -int(priority) * 1e13 + int(enqueued_at * 1000)
+
+    async def enqueue(self, job_id: str, payload: Dict[str, Any], priority: int = 0):
+        enqueued_at = time.time()
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self._job_key(job_id), mapping={
+            "payload": json.dumps(payload),
+            "priority": int(priority),
+            "enqueued_at": enqueued_at,
+            "status": "pending",
+            "attempts": 0,
+        })
+        pipe.zadd(self.queue_key, {job_id: self._score(priority, enqueued_at)})
+        self._wake(pipe, job_id)
+        await pipe.execute()
+        logger.info(f"Enqueued audit job {job_id} (priority {priority})")
+
+    def _wake(self, pipe, job_id: str):
+        pipe.lpush(self.wake_key, job_id)
+        pipe.ltrim(self.wake_key, 0, WAKE_BACKLOG - 1)
+
+    async def dequeue(self, timeout: Optional[float] = None) -> Optional[AuditTask]:
+        """Lease the next job as (job_id, payload, enqueued_at), or None on timeout (None waits forever)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            now = time.time()
+            leased = await self._lease(
+                keys=[self.queue_key, self.leases_key],
+                args=[now + self.visibility_timeout, now, self._job_key("")],
+            )
+            if leased and len(leased) == 3:
+                job_id, payload, enqueued_at = leased
+                return job_id, json.loads(payload), float(enqueued_at)
+            if leased:
+                # Status expired or was never written; nothing to run
+                continue
+            wait = WAKE_INTERVAL if deadline is None else min(WAKE_INTERVAL, deadline - time.monotonic())
+            if wait <= 0:
+                return None
+            await self.client.blpop([self.wake_key], timeout=wait)
+
+    async def extend(self, job_id: str):
+        """Push back the lease deadline of a job that is still running."""
+        await self.client.zadd(self.leases_key, {job_id: time.time() + self.visibility_timeout}, xx=True)
+
+    async def complete(self, job_id: str, status: str, result: Dict[str, Any] = None):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem(self.leases_key, job_id)
+        pipe.hset(self._job_key(job_id), mapping={"status": status, "result": json.dumps(result or {})})
+        pipe.expire(self._job_key(job_id), RESULT_TTL)
+        await pipe.execute()
+
+    async def recover_expired(self) -> int:
+        """Requeue jobs whose lease ran out; returns how many were recovered."""
+        now = time.time()
+        expired = await self.client.zrangebyscore(self.leases_key, "-inf", now)
+        failure = json.dumps({"error": "lease expired too many times"})
+        recovered = 0
+        for job_id in expired:
+            outcome = await self._recover(
+                keys=[self.leases_key, self.queue_key, self.wake_key, self._job_key(job_id)],
+                args=[job_id, now, self.max_attempts, failure, RESULT_TTL, WAKE_BACKLOG],
+            )
+            if outcome == "failed":
+                logger.error(f"❌ Audit job {job_id} lease expired {self.max_attempts} times, giving up")
+            elif outcome == "requeued":
+                logger.warning(f"⚠️ Requeued audit job {job_id} after its lease expired")
+                recovered += 1
+        return recovered
+
+    async def tracked(self, job_id: str) -> bool:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zscore(self.queue_key, job_id)
+        pipe.zscore(self.leases_key, job_id)
+        return any(score is not None for score in await pipe.execute())
+
+    async def status(self, job_id: str) -> Dict[str, Any]:
+        job = await self.client.hgetall(self._job_key(job_id))
+        if not job:
+            return {"status": "not_found"}
+        status = {"status": job["status"], "enqueued_at": float(job["enqueued_at"])}
+        if "result" in job:
+            status["result"] = json.loads(job["result"])
+        return status
+
+    async def depth(self) -> int:
+        return await self.client.zcard(self.queue_key)
+
+
+def create_audit_queue(kind: str = None):
+    """Audit queue selected by AUDIT_QUEUE (auto = Redis when reachable)."""
+    kind = (kind or settings.AUDIT_QUEUE).lower()
+    if kind in ("auto", "redis"):
+        try:
+            redis.from_url(settings.REDIS_URL, socket_connect_timeout=2).ping()
+            logger.info("✅ Redis connected for audit queue")
+            return RedisAuditQueue(aioredis.from_url(settings.REDIS_URL, decode_responses=True))
+        except Exception as e:
+            if kind == "redis":
+                raise
+            logger.warning(f"⚠️ Redis not available for audit queue, using in-process queue: {e}")
+    elif kind != "memory":
+        logger.warning(f"Unknown AUDIT_QUEUE '{kind}', using in-process queue")
+    return MemoryAuditQueue(task_queue_service)
+
+
+audit_queue = create_audit_queue()
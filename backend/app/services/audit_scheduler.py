@@ -0,0 +1,228 @@
+"""Priority scheduler running queued audit jobs concurrently, with lease recovery."""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Set
+import numpy as np
+from app.config import settings
+from app.db import SessionLocal, AuditJob
+from app.services.auditor import AuditorPlanner
+from app.services.audit_queue import DEFAULT_PRIORITY, audit_queue
+
+logger = logging.getLogger(__name__)
+
+
+async def execute_audit_job(job_id: str, payload: Dict[str, Any]) -> bool:
+    """Run one queued audit job; returns whether it completed.
+
+    AuditorPlanner.run_audit records the job's status and results itself,
+    including the failed status when it returns an error.
+    """
+    try:
+        planner = AuditorPlanner(
+            goal=payload.get("goal"),
+            scope=payload.get("scope", "")
+        )
+        result = await planner.run_audit(job_id)
+    except Exception as e:
+        logger.error(f"❌ Audit job {job_id} failed: {e}", exc_info=True)
+        db = SessionLocal()
+        try:
+            job = db.query(AuditJob).filter(AuditJob.id == job_id).first()
+            if job:
+                job.status = "failed"
+                db.commit()
+        finally:
+            db.close()
+        return False
+
+    if "error" in result:
+        logger.error(f"❌ Audit job {job_id} failed: {result['error']}")
+        return False
+    logger.info(f"✅ Audit job {job_id} completed")
+    return True
+
+
+async def recover_orphaned_jobs(queue, min_age: float = 0.0) -> int:
+    """Requeue pending or processing jobs in the database that `queue` does not hold.
+
+    These are jobs of a process that stopped before finishing them. Jobs
+    updated within `min_age` seconds are left alone, as the API (or, with a
+    shared queue, another replica) may be about to queue them.
+    """
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=min_age)
+        jobs = db.query(AuditJob).filter(
+            AuditJob.status.in_(["pending", "processing"]), AuditJob.updated_at <= cutoff
+        ).all()
+        orphaned = [(job.id, job.goal, job.scope) for job in jobs]
+    finally:
+        db.close()
+
+    recovered = 0
+    for job_id, goal, scope in orphaned:
+        if await queue.tracked(job_id):
+            continue
+        await queue.enqueue(
+            job_id, {"goal": goal, "scope": scope, "priority": DEFAULT_PRIORITY}, priority=DEFAULT_PRIORITY
+        )
+        recovered += 1
+    if recovered:
+        logger.warning(f"⚠️ Requeued {recovered} audit jobs left unfinished by a stopped backend")
+    return recovered
+
+
+class AuditScheduler:
+    """Runs audit jobs from the audit queue, up to `max_concurrent` at once.
+
+    A slot is taken before the next job is dequeued, so whenever one frees
+    up it goes to the most urgent job waiting at that moment (priority, then
+    age), and a long audit only occupies its own slot. Queue wait and
+    execution time are tracked separately. With a durable queue, leases of
+    running jobs are extended while they run and expired leases of other
+    replicas are recovered.
+    """
+
+    def __init__(
+        self,
+        queue,
+        run_job: Callable[[str, Dict[str, Any]], Awaitable[bool]] = execute_audit_job,
+        max_concurrent: int = None,
+        recover_on_start: bool = True,
+    ):
+        """Initialize scheduler; it runs once start() is called."""
+        self.queue = queue
+        self.recover_on_start = recover_on_start
+        self.run_job = run_job
+        self.max_concurrent = max_concurrent or settings.AUDIT_MAX_CONCURRENT
+        self.completed = 0
+        self.failed = 0
+        self.recovered = 0
+        self._recent_waits = deque(maxlen=1000)
+        self._recent_runs = deque(maxlen=1000)
+        self._running: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start dispatching and recovery on the running loop."""
+        self._tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._recover())]
+        logger.info(f"🟢 Audit scheduler started ({self.max_concurrent} concurrent jobs)")
+
+    async def stop(self):
+        """Stop dispatching and cancel running jobs (a durable queue re-delivers them)."""
+        tasks = list(self._running) + self._tasks
+        self._tasks = []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _dispatch(self):
+        slots = asyncio.Semaphore(self.max_concurrent)
+        while True:
+            await slots.acquire()
+            try:
+                task = await self.queue.dequeue()
+            except asyncio.CancelledError:
+                slots.release()
+                raise
+            except Exception as e:
+                slots.release()
+                logger.error(f"Audit queue error: {e}", exc_info=True)
+                await asyncio.sleep(5)
+                continue
+            if task is None:
+                slots.release()
+                continue
+            run = asyncio.create_task(self._run(*task))
+            self._running.add(run)
+            run.add_done_callback(self._running.discard)
+            run.add_done_callback(lambda _: slots.release())
+
+    async def _recover_orphans(self, min_age: float):
+        try:
+            self.recovered += await recover_orphaned_jobs(self.queue, min_age)
+        except Exception as e:
+            logger.error(f"Failed to recover unfinished audit jobs: {e}", exc_info=True)
+
+    async def _recover(self):
+        # Jobs updated within a lease period may still be on their way into the queue
+        grace = self.queue.visibility_timeout if self.queue.durable else settings.AUDIT_VISIBILITY_TIMEOUT
+        if self.recover_on_start:
+            await self._recover_orphans(grace)
+        if not self.queue.durable:
+            if self.recover_on_start:
+                # Picks up jobs the stopped process touched just before it stopped
+                await asyncio.sleep(grace)
+                await self._recover_orphans(grace)
+            return
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 2)
+            try:
+                self.recovered += await self.queue.recover_expired()
+            except Exception as e:
+                logger.error(f"Failed to recover expired audit leases: {e}")
+
+    async def _keep_leased(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self.queue.extend(job_id)
+            except Exception as e:
+                logger.warning(f"Failed to extend lease of audit job {job_id}: {e}")
+
+    async def _run(self, job_id: str, payload: Dict[str, Any], enqueued_at: float):
+        started = time.time()
+        wait = max(0.0, started - enqueued_at)
+        logger.info(f"🔄 Processing audit job {job_id} (priority {payload.get('priority')}, waited {wait:.2f}s)")
+
+        heartbeat = asyncio.create_task(self._keep_leased(job_id)) if self.queue.durable else None
+        ok = False
+        try:
+            ok = await self.run_job(job_id, payload)
+        except Exception as e:
+            logger.error(f"❌ Audit job {job_id} failed: {e}", exc_info=True)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+        run = time.time() - started
+
+        self._recent_waits.append(wait)
+        self._recent_runs.append(run)
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        try:
+            await self.queue.complete(
+                job_id, "completed" if ok else "failed", {"wait_ms": wait * 1000, "exec_ms": run * 1000}
+            )
+        except Exception as e:
+            logger.error(f"Failed to record result of audit job {job_id}: {e}")
+
+    async def stats(self) -> Dict[str, Any]:
+        """Queued and running jobs, with queue wait and execution time percentiles."""
+        waits = np.asarray(self._recent_waits, dtype=np.float64) * 1000
+        runs = np.asarray(self._recent_runs, dtype=np.float64) * 1000
+        try:
+            queued = await self.queue.depth()
+        except Exception:
+            queued = None
+        return {
+            "queue": type(self.queue).__name__,
+            "queued": queued,
+            "running": len(self._running),
+            "max_concurrent": self.max_concurrent,
+            "completed": self.completed,
+            "failed": self.failed,
+            "recovered": self.recovered,
+            "wait_ms_p50": float(np.percentile(waits, 50)) if waits.size else 0.0,
+            "wait_ms_p99": float(np.percentile(waits, 99)) if waits.size else 0.0,
+            "exec_ms_p50": float(np.percentile(runs, 50)) if runs.size else 0.0,
+            "exec_ms_p99": float(np.percentile(runs, 99)) if runs.size else 0.0,
+        }
+
+
+audit_scheduler = AuditScheduler(audit_queue)
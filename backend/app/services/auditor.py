@@ -1,10 +1,13 @@
 """Auditor service for RAG-based report generation."""
+import asyncio
 import logging
-import json
 from typing import Dict, Any, List, Tuple
 from datetime import datetime
 from app.db import SessionLocal, Document, AuditJob
 from app.services.embeddings import embeddings_service, llm_service
+from app.services.vector_index import vector_index, reciprocal_rank_fusion
+from app.services.lexical_index import lexical_index
+from app.services.metadata_index import ScopeSyntaxError
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -32,28 +35,99 @@ class AuditorPlanner:
     
     async def vector_search(self, query: str, top_k: int = 10) -> List[Tuple[Document, float]]:
         """Search documents using vector similarity."""
+        results = await self.batch_vector_search([query], top_k=top_k)
+        return results[0]
+    
+    async def batch_vector_search(
+        self, queries: List[str], top_k: int = 10
+    ) -> List[List[Tuple[Document, float]]]:
+        """Search several queries with one embedding call and one index pass."""
+        vector_results, _ = await self.batch_hybrid_search(queries, top_k=top_k, lexical=False)
+        return vector_results
+    
+    async def batch_hybrid_search(
+        self, queries: List[str], top_k: int = 10, lexical: bool = None
+    ) -> Tuple[List[List[Tuple[Document, float]]], List[List[Tuple[Document, float]]]]:
+        """Run vector and BM25 lexical search for each query.
+        
+        Returns (vector results, lexical results), one list per query. The
+        planner's scope (e.g. "department:finance AND NOT source:email", or a
+        bare "Finance" matching department or tags) is resolved to candidate
+        sets first, so only in-scope documents are scored. Both retrievers
+        run concurrently, unless LEXICAL_PREFILTER_SIZE is set: then vector
+        search only scores the top lexical matches.
+        """
+        lexical = settings.HYBRID_SEARCH if lexical is None else lexical
+        empty = [[] for _ in queries]
         try:
-            query_embedding = embeddings_service.embed_single(query)
-            db = SessionLocal()
-            docs = db.query(Document).limit(100).all()
+            vector_index.ensure_loaded()
+            if lexical:
+                lexical_index.ensure_loaded()
+            try:
+                vector_candidates = vector_index.resolve_scope(self.scope)
+                lexical_candidates = lexical_index.resolve_scope(self.scope) if lexical else None
+            except ScopeSyntaxError as e:
+                logger.warning(f"Invalid audit scope '{self.scope}': {e}")
+                return empty, empty
+            if vector_candidates is not None and vector_candidates.size == 0:
+                logger.warning(f"Audit scope '{self.scope}' matches no documents")
+                return empty, empty
             
-            results = []
-            for doc in docs:
-                try:
-                    doc_embedding = json.loads(doc.embedding)
-                    score = embeddings_service.cosine_similarity(query_embedding, doc_embedding)
-                    results.append((doc, score))
-                except Exception as e:
-                    logger.warning(f"Failed to compute similarity for doc {doc.id}: {e}")
+            if not lexical:
+                vector_hits = await self._vector_hits(queries, top_k, vector_candidates)
+                lexical_hits = empty
+            elif settings.LEXICAL_PREFILTER_SIZE > 0:
+                prefilter = await asyncio.to_thread(
+                    lexical_index.search_batch, queries, settings.LEXICAL_PREFILTER_SIZE, lexical_candidates
+                )
+                matched = {doc_id for hits in prefilter for doc_id, _ in hits}
+                # Too few lexical matches (e.g. no shared terms): keep full vector recall
+                if len(matched) >= top_k:
+                    vector_candidates = vector_index.intersect_candidates(
+                        vector_candidates, vector_index.rows_for(matched)
+                    )
+                vector_hits = await self._vector_hits(queries, top_k, vector_candidates)
+                lexical_hits = [hits[:top_k] for hits in prefilter]
+            else:
+                vector_hits, lexical_hits = await asyncio.gather(
+                    self._vector_hits(queries, top_k, vector_candidates),
+                    asyncio.to_thread(lexical_index.search_batch, queries, top_k, lexical_candidates),
+                )
             
-            results.sort(key=lambda x: x[1], reverse=True)
-            return results[:top_k]
+            return self._fetch_documents(vector_hits, lexical_hits)
         
         except Exception as e:
-            logger.error(f"Vector search failed: {e}")
-            return []
-        finally:
-            db.close()
+            logger.error(f"Search failed: {e}")
+            return empty, empty
+    
+    async def _vector_hits(self, queries: List[str], top_k: int, candidates) -> List[List[Tuple[str, float]]]:
+        """Embed queries in one call and search the vector index, off the event loop."""
+        query_embeddings = await embeddings_service.embed_async(queries)
+        return await asyncio.to_thread(
+            vector_index.search_batch, query_embeddings, top_k, candidates
+        )
+    
+    def _fetch_documents(self, *rankings_sets):
+        """Replace doc ids with Documents, loading every hit in one query."""
+        doc_ids = {
+            doc_id for rankings in rankings_sets for hits in rankings for doc_id, _ in hits
+        }
+        docs_by_id = {}
+        if doc_ids:
+            db = SessionLocal()
+            try:
+                docs_by_id = {
+                    doc.id: doc for doc in db.query(Document).filter(Document.id.in_(doc_ids)).all()
+                }
+            finally:
+                db.close()
+        return tuple(
+            [
+                [(docs_by_id[doc_id], score) for doc_id, score in hits if doc_id in docs_by_id]
+                for hits in rankings
+            ]
+            for rankings in rankings_sets
+        )
     
     async def run_audit(self, job_id: str) -> Dict[str, Any]:
         """Run audit and generate report."""
@@ -70,26 +144,38 @@ class AuditorPlanner:
             subqueries = self.decompose_goal()
             logger.info(f"Decomposed goal into {len(subqueries)} subqueries")
             
-            all_evidence = []
-            for query in subqueries:
-                results = await self.vector_search(query, top_k=5)
-                for doc, score in results:
-                    all_evidence.append({
-                        "doc_id": doc.id,
-                        "title": doc.title,
-                        "snippet": doc.content[:200],
-                        "score": float(score),
-                        "metadata": doc.doc_metadata,
-                    })
+            vector_results, lexical_results = await self.batch_hybrid_search(subqueries, top_k=5)
             
-            seen = set()
-            unique_evidence = []
-            for item in all_evidence:
-                if item["doc_id"] not in seen:
-                    unique_evidence.append(item)
-                    seen.add(item["doc_id"])
+            # Fuse vector and lexical rankings of every subquery; keep each
+            # document's best cosine and BM25 scores
+            docs: Dict[str, Document] = {}
+            best_scores: Dict[str, float] = {}
+            best_lexical: Dict[str, float] = {}
+            for results_per_query, best in ((vector_results, best_scores), (lexical_results, best_lexical)):
+                for results in results_per_query:
+                    for doc, score in results:
+                        docs[doc.id] = doc
+                        best[doc.id] = max(score, best.get(doc.id, score))
+            
+            fused = reciprocal_rank_fusion([
+                [(doc.id, score) for doc, score in results]
+                for results in vector_results + lexical_results
+            ])
             
-            unique_evidence.sort(key=lambda x: x["score"], reverse=True)
+            unique_evidence = []
+            for doc_id, fused_score in fused:
+                doc = docs[doc_id]
+                item = {
+                    "doc_id": doc.id,
+                    "title": doc.title,
+                    "snippet": doc.content[:200],
+                    "score": float(best_scores.get(doc_id, 0.0)),
+                    "fused_score": float(fused_score),
+                    "metadata": doc.doc_metadata,
+                }
+                if doc_id in best_lexical:
+                    item["lexical_score"] = float(best_lexical[doc_id])
+                unique_evidence.append(item)
             
             prompt = self._build_synthesis_prompt(self.goal, unique_evidence)
             summary = llm_service.generate(prompt, max_tokens=500)
@@ -0,0 +1,305 @@
+"""Two-tier embedding cache keyed by model name and text hash."""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+import redis
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying Redis after a connection failure
+REDIS_RETRY_INTERVAL = 30.0
+# Keys per SQLite IN (...) lookup, below the default variable limit
+SQLITE_LOOKUP_CHUNK = 500
+
+
+def cache_key(model: str, text: str) -> str:
+    """Cache key for `text` embedded by `model`."""
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+class LRUEmbeddingCache:
+    """In-process LRU of float32 vectors, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        """Initialize empty cache holding at most `max_bytes` of vectors."""
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        if vector.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[key] = vector
+            self.nbytes += vector.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+class SQLiteEmbeddingStore:
+    """Embedding blobs in a local SQLite file (shared by processes on one host).
+
+    The file holds at most `max_rows` vectors: each write gets the next
+    rowid, so once the table is over the cap the oldest writes are deleted.
+    """
+
+    def __init__(self, path: str, max_rows: int = None):
+        """Initialize store; the file is opened on first use."""
+        self.path = path
+        self.max_rows = settings.EMBEDDING_CACHE_MAX_ROWS if max_rows is None else max_rows
+        self.evicted = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), SQLITE_LOOKUP_CHUNK):
+                chunk = keys[start:start + SQLITE_LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.execute(
+                    f"SELECT key, value FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+        return [found.get(key) for key in keys]
+
+    def put_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, value) VALUES (?, ?)", items.items())
+                if self.max_rows > 0:
+                    # A replaced key is re-inserted with a new rowid, so rowids follow write order
+                    evicted = conn.execute(
+                        "DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?",
+                        (self.max_rows,),
+                    ).rowcount
+                    self.evicted += evicted
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RedisEmbeddingStore:
+    """Embedding blobs in Redis, shared by the backend and workers.
+
+    While Redis is unreachable, reads and writes go to `fallback` (if any)
+    and the connection is retried every REDIS_RETRY_INTERVAL seconds.
+    """
+
+    def __init__(self, redis_url: str, ttl: int = 0, fallback: SQLiteEmbeddingStore = None):
+        """Initialize store; Redis is connected lazily."""
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.fallback = fallback
+        self._redis = None
+        self._redis_failed_at = None
+        self._lock = threading.Lock()
+
+    def client(self) -> Optional[redis.Redis]:
+        """Connected Redis client, or None while Redis is unavailable."""
+        if not self.redis_url:
+            return None
+        with self._lock:
+            if self._redis is not None:
+                return self._redis
+            if self._redis_failed_at and time.monotonic() - self._redis_failed_at < REDIS_RETRY_INTERVAL:
+                return None
+            try:
+                client = redis.from_url(self.redis_url)
+                client.ping()
+                self._redis = client
+                self._redis_failed_at = None
+            except Exception as e:
+                logger.warning(f"Redis not available for embedding cache: {e}")
+                self._redis_failed_at = time.monotonic()
+            return self._redis
+
+    def _mark_unavailable(self, error: Exception):
+        logger.warning(f"Embedding cache Redis error: {error}")
+        with self._lock:
+            self._redis = None
+            self._redis_failed_at = time.monotonic()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        client = self.client()
+        if client is not None:
+            try:
+                return client.mget(["emb:" + key for key in keys])
+            except redis.RedisError as e:
+                self._mark_unavailable(e)
+        if self.fallback is not None:
+            return self.fallback.get_many(keys)
+        return [None] * len(keys)
+
+    def put_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+        client = self.client()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key, value in items.items():
+                    pipe.set("emb:" + key, value, ex=self.ttl or None)
+                pipe.execute()
+                return
+            except redis.RedisError as e:
+                self._mark_unavailable(e)
+        if self.fallback is not None:
+            self.fallback.put_many(items)
+
+
+def create_embedding_store(kind: str = None):
+    """Shared store selected by EMBEDDING_CACHE_STORE, or None to cache in memory only."""
+    kind = (kind or settings.EMBEDDING_CACHE_STORE).lower()
+    sqlite_store = SQLiteEmbeddingStore(settings.EMBEDDING_CACHE_PATH) if settings.EMBEDDING_CACHE_PATH else None
+    if kind == "auto":
+        return RedisEmbeddingStore(settings.REDIS_URL, settings.EMBEDDING_CACHE_TTL, fallback=sqlite_store)
+    if kind == "redis":
+        return RedisEmbeddingStore(settings.REDIS_URL, settings.EMBEDDING_CACHE_TTL)
+    if kind == "sqlite":
+        return sqlite_store
+    if kind != "none":
+        logger.warning(f"Unknown EMBEDDING_CACHE_STORE '{kind}', caching embeddings in memory only")
+    return None
+
+
+class EmbeddingCache:
+    """In-process LRU in front of a shared store, keyed by (model, text hash).
+
+    Lookups check the LRU, then fetch all remaining keys from the shared
+    store in one round trip; only texts missing from both are embedded, once
+    per distinct text, and written back to both tiers.
+    """
+
+    def __init__(self, model: str, dimension: int, max_bytes: int = None, store=None):
+        """Initialize cache for vectors of `dimension` produced by `model`."""
+        self.model = model
+        self.dimension = dimension
+        max_bytes = settings.EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self.memory = LRUEmbeddingCache(max_bytes)
+        self.store = store
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.store_errors = 0
+        self._counter_lock = threading.Lock()
+
+    def _decode(self, raw: Optional[bytes]) -> Optional[np.ndarray]:
+        if raw is None or len(raw) != self.dimension * 4:
+            return None
+        return np.frombuffer(raw, dtype="<f4")
+
+    def embed(self, texts: Sequence[str], compute: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings for `texts`, calling `compute` only for texts not cached."""
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        keys = [cache_key(self.model, text) for text in texts]
+
+        # Distinct missing keys -> positions in `texts`
+        missing: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                out[i] = vector
+            else:
+                missing.setdefault(key, []).append(i)
+        memory_hits = len(texts) - sum(len(rows) for rows in missing.values())
+
+        shared_hits = 0
+        if missing and self.store is not None:
+            lookup = list(missing)
+            try:
+                values = self.store.get_many(lookup)
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {e}")
+                values = [None] * len(lookup)
+                with self._counter_lock:
+                    self.store_errors += 1
+            for key, raw in zip(lookup, values):
+                vector = self._decode(raw)
+                if vector is None:
+                    continue
+                rows = missing.pop(key)
+                out[rows] = vector
+                self.memory.put(key, vector)
+                shared_hits += len(rows)
+
+        if missing:
+            pending = list(missing)
+            computed = np.asarray(compute([texts[missing[key][0]] for key in pending]), dtype=np.float32)
+            blobs = {}
+            for key, vector in zip(pending, computed):
+                out[missing[key]] = vector
+                self.memory.put(key, vector.copy())
+                blobs[key] = vector.astype("<f4").tobytes()
+            if self.store is not None:
+                try:
+                    self.store.put_many(blobs)
+                except Exception as e:
+                    logger.warning(f"Embedding cache write failed: {e}")
+                    with self._counter_lock:
+                        self.store_errors += 1
+
+        with self._counter_lock:
+            self.memory_hits += memory_hits
+            self.shared_hits += shared_hits
+            self.misses += len(texts) - memory_hits - shared_hits
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss counters and memory tier size."""
+        lookups = self.memory_hits + self.shared_hits + self.misses
+        return {
+            "model": self.model,
+            "store": type(self.store).__name__ if self.store is not None else None,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.shared_hits) / lookups if lookups else 0.0,
+            "store_errors": self.store_errors,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.nbytes,
+        }
@@ -0,0 +1,192 @@
+"""Append-only, memory-mapped embedding segments shared between processes."""
+import ast
+import logging
+import os
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Fixed-size .npy v1.0 header so the row count can be rewritten in place
+HEADER_LEN = 128
+ID_WIDTH = 64
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def _write_header(f, dtype: np.dtype, shape: Tuple[int, ...]):
+    """Write a padded .npy header describing `shape` at the start of the file."""
+    header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape})
+    body_len = HEADER_LEN - len(_MAGIC) - 2
+    header = header.ljust(body_len - 1) + "\n"
+    f.seek(0)
+    f.write(_MAGIC + body_len.to_bytes(2, "little") + header.encode("latin1"))
+
+
+def _read_row_count(path: str) -> int:
+    """Read the committed row count from a segment file header."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_LEN)
+    if len(raw) < HEADER_LEN or not raw.startswith(_MAGIC):
+        return 0
+    return int(ast.literal_eval(raw[len(_MAGIC) + 2:].decode("latin1").strip())["shape"][0])
+
+
+class EmbeddingSegment:
+    """One append-only segment: `<name>.npy` float32 rows plus `<name>.ids.npy`.
+
+    Both files are valid .npy arrays (np.load(..., mmap_mode="r") works).
+    Writers append under an exclusive file lock and publish new rows by
+    rewriting the row count in the vectors header last, so readers never
+    observe half-written rows. Readers map the files read-only; all
+    processes on a host share the same page cache copy.
+    """
+
+    def __init__(self, directory: str, name: str = "embeddings", dimension: int = None):
+        """Open (or create) a segment in `directory`."""
+        self.directory = directory
+        self.name = name
+        self.dimension = dimension or settings.EMBEDDING_DIMENSION
+        self.vectors_path = os.path.join(directory, f"{name}.npy")
+        self.ids_path = os.path.join(directory, f"{name}.ids.npy")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self._vector_dtype = np.dtype("<f4")
+        self._id_dtype = np.dtype(f"S{ID_WIDTH}")
+        self._local_lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+
+        # Reader state
+        self._count = 0
+        self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        with self._file_lock():
+            if not os.path.exists(self.vectors_path):
+                self._create()
+
+    def _create(self):
+        """Create empty segment files."""
+        with open(self.ids_path, "wb") as f:
+            _write_header(f, self._id_dtype, (0,))
+        with open(self.vectors_path, "wb") as f:
+            _write_header(f, self._vector_dtype, (0, self.dimension))
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive cross-process lock for writers."""
+        with self._local_lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_row
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read-only mapped view of the committed rows (as of the last refresh)."""
+        return self._matrix
+
+    @property
+    def ids(self) -> List[str]:
+        """Document ids aligned with `matrix` rows."""
+        return self._ids
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Row of a document id (as of the last refresh), or None."""
+        return self._id_to_row.get(doc_id)
+
+    def get_vectors(self, doc_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Look up stored rows by document id (ids not in the segment are skipped)."""
+        self.refresh()
+        return {
+            doc_id: self._matrix[self._id_to_row[doc_id]]
+            for doc_id in doc_ids
+            if doc_id in self._id_to_row
+        }
+
+    def refresh(self) -> int:
+        """Map rows committed by other processes since the last refresh."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        count = _read_row_count(self.vectors_path)
+        if count <= self._count:
+            return 0
+
+        new_ids = np.memmap(
+            self.ids_path, dtype=self._id_dtype, mode="r", offset=HEADER_LEN, shape=(count,)
+        )[self._count:count]
+        decoded = [raw.decode("ascii") for raw in new_ids]
+        matrix = np.memmap(
+            self.vectors_path, dtype=self._vector_dtype, mode="r",
+            offset=HEADER_LEN, shape=(count, self.dimension),
+        )
+
+        added = count - self._count
+        for offset, doc_id in enumerate(decoded):
+            self._id_to_row[doc_id] = self._count + offset
+        self._ids.extend(decoded)
+        self._matrix = matrix
+        self._count = count
+        return added
+
+    def append(self, doc_ids: Sequence[str], vectors) -> int:
+        """Append rows for ids not already stored; vectors are stored as given."""
+        vectors = np.asarray(vectors, dtype=self._vector_dtype)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            raise ValueError(
+                f"Expected embeddings of shape (n, {self.dimension}), got {vectors.shape}"
+            )
+
+        with self._file_lock():
+            self.refresh()
+            keep, seen = [], set()
+            for i, doc_id in enumerate(doc_ids):
+                if doc_id in self._id_to_row or doc_id in seen:
+                    continue
+                if len(doc_id.encode("ascii")) > ID_WIDTH:
+                    raise ValueError(f"Document id longer than {ID_WIDTH} bytes: {doc_id}")
+                seen.add(doc_id)
+                keep.append(i)
+            if not keep:
+                return 0
+
+            start = self._count
+            total = start + len(keep)
+            ids_array = np.array([doc_ids[i] for i in keep], dtype=self._id_dtype)
+
+            # Rows beyond the committed count (e.g. from a crashed writer) are overwritten
+            with open(self.ids_path, "r+b") as f:
+                f.seek(HEADER_LEN + start * self._id_dtype.itemsize)
+                f.write(ids_array.tobytes())
+                _write_header(f, self._id_dtype, (total,))
+            with open(self.vectors_path, "r+b") as f:
+                f.seek(HEADER_LEN + start * self.dimension * self._vector_dtype.itemsize)
+                f.write(vectors[keep].tobytes())
+                f.flush()
+                _write_header(f, self._vector_dtype, (total, self.dimension))
+
+            self.refresh()
+            return len(keep)
+
+
+def open_embedding_store(name: str = "embeddings") -> Optional[EmbeddingSegment]:
+    """Open a segment in EMBEDDING_STORE_DIR, or None if the store is disabled."""
+    if not settings.EMBEDDING_STORE_DIR:
+        return None
+    return EmbeddingSegment(settings.EMBEDDING_STORE_DIR, name)
+
+
+embedding_store = open_embedding_store()
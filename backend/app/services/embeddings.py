@@ -1,32 +1,359 @@
 """Embeddings service with LLM abstraction."""
+import asyncio
+import hashlib
 import logging
+import math
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
 from app.config import settings
+from app.services.embedding_cache import EmbeddingCache, create_embedding_store
 
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Offline embedder: signed feature hashing of word and character n-grams.
+    
+    Words, word bigrams and character trigrams are hashed with blake2b
+    (unlike hash(), stable across processes and restarts) into `n_hashes`
+    signed buckets each, a sparse random projection of the bag of features.
+    Texts sharing words or word pieces get similar vectors, so search has
+    real (lexical) signal without downloading a model. A batch is assembled
+    with one bincount over all feature contributions.
+    """
+    
+    # Relative weight of each feature type
+    FEATURE_WEIGHTS = {"w": 1.0, "b": 0.5, "c": 0.25}
+    
+    def __init__(self, dimension: int, n_hashes: int = 2, cache_size: int = 200000):
+        """Initialize embedder for `dimension`-wide vectors."""
+        self.dimension = dimension
+        self.n_hashes = n_hashes
+        self.cache_size = cache_size
+        self._cache: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    
+    def _features(self, text: str) -> Dict[str, float]:
+        """Weighted feature counts (sublinear tf) for one text."""
+        words = _WORD_RE.findall(text.lower())
+        counts: Dict[str, int] = {}
+        for word in words:
+            counts["w:" + word] = counts.get("w:" + word, 0) + 1
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                key = "c:" + padded[i:i + 3]
+                counts[key] = counts.get(key, 0) + 1
+        for first, second in zip(words, words[1:]):
+            key = f"b:{first} {second}"
+            counts[key] = counts.get(key, 0) + 1
+        return {
+            key: self.FEATURE_WEIGHTS[key[0]] * (1.0 + math.log(count))
+            for key, count in counts.items()
+        }
+    
+    def _hash(self, feature: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Buckets and signs of a feature (cached)."""
+        cached = self._cache.get(feature)
+        if cached is None:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=4 * self.n_hashes).digest()
+            values = np.frombuffer(digest, dtype="<u4").astype(np.int64)
+            cached = (values % self.dimension, np.where(values >> 31, 1.0, -1.0).astype(np.float32))
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[feature] = cached
+        return cached
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts as L2-normalized float32 rows."""
+        feature_ids: Dict[str, int] = {}
+        rows, columns, weights = [], [], []
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text or "").items():
+                rows.append(row)
+                columns.append(feature_ids.setdefault(feature, len(feature_ids)))
+                weights.append(weight)
+        
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if feature_ids:
+            hashed = [self._hash(feature) for feature in feature_ids]
+            buckets = np.stack([bucket for bucket, _ in hashed])[columns]
+            signs = np.stack([sign for _, sign in hashed])[columns]
+            flat = np.asarray(rows, dtype=np.int64)[:, None] * self.dimension + buckets
+            values = signs * np.asarray(weights, dtype=np.float32)[:, None]
+            out = np.bincount(
+                flat.ravel(), weights=values.ravel(), minlength=len(texts) * self.dimension
+            ).astype(np.float32).reshape(len(texts), self.dimension)
+        
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+def plan_batches(lengths: Sequence[int], token_budget: int, max_batch: int) -> List[List[int]]:
+    """Group text indices into length-sorted batches under a padded token budget.
+    
+    Sorting by length keeps padding low; a batch is closed when adding the
+    next text would make batch_size * longest_length exceed `token_budget`
+    (a single over-long text still gets its own batch).
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches, current, longest = [], [], 0
+    for i in order:
+        longest_if_added = max(longest, lengths[i])
+        if current and (
+            len(current) >= max_batch or (len(current) + 1) * longest_if_added > token_budget
+        ):
+            batches.append(current)
+            current, longest_if_added = [], lengths[i]
+        current.append(i)
+        longest = longest_if_added
+    if current:
+        batches.append(current)
+    return batches
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers model with length-sorted, token-budgeted batching."""
+    
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str = None,
+        device: str = None,
+        token_budget: int = None,
+        max_batch: int = None,
+    ):
+        """Load `model_name` from `cache_dir` (downloaded there on first use)."""
+        from sentence_transformers import SentenceTransformer
+        
+        self.model = SentenceTransformer(model_name, cache_folder=cache_dir or None, device=device or None)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.token_budget = token_budget or settings.EMBEDDING_BATCH_TOKENS
+        self.max_batch = max_batch or settings.EMBEDDING_MAX_BATCH
+        self.max_length = self.model.max_seq_length
+        # Concurrent encode calls on one model contend for the same cores
+        self._lock = threading.Lock()
+    
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Token count per text, capped at the model's max sequence length."""
+        encoded = self.model.tokenizer(
+            texts, add_special_tokens=True, truncation=True, max_length=self.max_length
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as L2-normalized float32 rows, in input order."""
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return out
+        batches = plan_batches(self._token_lengths(texts), self.token_budget, self.max_batch)
+        with self._lock:
+            for batch in batches:
+                out[batch] = self.model.encode(
+                    [texts[i] for i in batch],
+                    batch_size=len(batch),
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False,
+                )
+        return out
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-text embedding requests into batched calls.
+    
+    Each request is queued with its own future. A collector task takes the
+    first waiting request, gathers more for up to `max_wait_ms` or until
+    `max_items` are queued, runs one batched embed and resolves every
+    caller's future. While a batch is in flight new requests keep queueing,
+    so batches grow with load; at most `max_inflight` batches run at once.
+    """
+    
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_items: int = None,
+        max_wait_ms: float = None,
+        max_inflight: int = None,
+    ):
+        """Initialize batcher around an async batch embedding function."""
+        self.embed_batch = embed_batch
+        self.max_items = max_items or settings.EMBEDDING_BATCH_MAX_ITEMS
+        self.max_wait = (settings.EMBEDDING_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.max_inflight = max_inflight or settings.EMBEDDING_THREADS
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self._task = None
+        
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self._recent_sizes = deque(maxlen=1000)
+        self._recent_waits = deque(maxlen=1000)
+    
+    def _ensure_running(self):
+        """Start the collector on the running loop (restarting it for a new loop)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._task = loop.create_task(self._collect())
+    
+    async def submit(self, text: str) -> np.ndarray:
+        """Embed one text as part of the next batch."""
+        self._ensure_running()
+        future = self._loop.create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        return await future
+    
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            await self._slots.acquire()
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_items:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._loop.create_task(self._dispatch(batch))
+    
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        try:
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                self._recent_waits.append(started - queued_at)
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self._recent_sizes.append(len(batch))
+            
+            try:
+                vectors = await self.embed_batch([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        finally:
+            self._slots.release()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, batch size and queue wait metrics."""
+        waits = np.asarray(self._recent_waits, dtype=np.float64) * 1000
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": float(np.mean(self._recent_sizes)) if self._recent_sizes else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "wait_ms_p50": float(np.percentile(waits, 50)) if waits.size else 0.0,
+            "wait_ms_p99": float(np.percentile(waits, 99)) if waits.size else 0.0,
+        }
+    
+    async def aclose(self):
+        """Stop the collector task (a collector on another, finished loop is just dropped)."""
+        task, self._task = self._task, None
+        if task is None or task.done() or self._loop is not asyncio.get_running_loop():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
 
 class EmbeddingsService:
-    """Service for computing embeddings - using mock for fast testing."""
+    """Service for computing embeddings with a model or the offline hashing fallback."""
     
     def __init__(self):
         """Initialize embeddings service."""
         self.model = None
-        logger.info(f"Using mock embeddings (dimension={settings.EMBEDDING_DIMENSION})")
+        self.backend = settings.EMBEDDING_BACKEND.lower().replace("_", "-")
+        self.embedder = None
+        
+        if self.backend == "sentence-transformers":
+            try:
+                self.embedder = SentenceTransformerEmbedder(
+                    settings.EMBEDDING_MODEL, settings.EMBEDDING_CACHE_DIR, settings.EMBEDDING_DEVICE
+                )
+                if self.embedder.dimension != settings.EMBEDDING_DIMENSION:
+                    raise ValueError(
+                        f"model dimension {self.embedder.dimension} != EMBEDDING_DIMENSION "
+                        f"{settings.EMBEDDING_DIMENSION}"
+                    )
+                self.model = self.embedder.model
+                logger.info(f"Loaded embedding model {settings.EMBEDDING_MODEL}")
+            except Exception as e:
+                logger.warning(f"Failed to load embedding model: {e}, falling back to hashing embeddings")
+                self.embedder = None
+        
+        if self.embedder is None:
+            self.backend = "hashing"
+            self.embedder = HashingEmbedder(settings.EMBEDDING_DIMENSION)
+            logger.info(f"Using hashing embeddings (dimension={settings.EMBEDDING_DIMENSION})")
+        
+        self.cache = None
+        if settings.EMBEDDING_CACHE:
+            # Backend and workers share cached vectors through the store
+            model = settings.EMBEDDING_MODEL if self.backend == "sentence-transformers" else "hashing"
+            self.cache = EmbeddingCache(
+                f"{model}@{settings.EMBEDDING_DIMENSION}", settings.EMBEDDING_DIMENSION,
+                store=create_embedding_store(),
+            )
+        
+        # Inference runs here so the event loop never blocks on encoding
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.EMBEDDING_THREADS, thread_name_prefix="embeddings"
+        )
+        self.batcher = MicroBatcher(self.embed_async) if settings.EMBEDDING_MICRO_BATCHING else None
     
     def embed(self, texts: List[str]) -> np.ndarray:
-        """Compute embeddings for texts - returns mock embeddings."""
-        # For MVP testing, use deterministic mock embeddings based on text hash
-        embeddings = []
-        for text in texts:
-            # Create deterministic embedding based on text
-            hash_val = hash(text) % 10000
-            np.random.seed(hash_val)
-            embedding = np.random.randn(settings.EMBEDDING_DIMENSION).astype(np.float32)
-            embeddings.append(embedding)
-        
-        return np.array(embeddings, dtype=np.float32)
+        """Compute embeddings for texts (blocking; use embed_async from async code).
+        
+        Cached texts are served from the embedding cache without inference.
+        """
+        if self.cache is None:
+            return self.embedder.embed(list(texts))
+        return self.cache.embed(list(texts), self.embedder.embed)
+    
+    async def embed_async(self, texts: List[str]) -> np.ndarray:
+        """Compute embeddings on the embedding executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed, list(texts))
+    
+    async def embed_single_async(self, text: str) -> List[float]:
+        """Compute embedding for single text, batched with concurrent callers."""
+        if self.batcher is not None:
+            return (await self.batcher.submit(text)).tolist()
+        embeddings = await self.embed_async([text])
+        return embeddings[0].tolist()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Embedding backend, cache and micro-batching metrics."""
+        return {
+            "backend": self.backend,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "micro_batching": self.batcher.stats() if self.batcher is not None else None,
+        }
     
     def embed_single(self, text: str) -> List[float]:
         """Compute embedding for single text."""
@@ -0,0 +1,128 @@
+"""Process-pool PDF text extraction by page range."""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Times a document is extracted again after the pool it was using was restarted
+RESTART_RETRIES = 2
+
+
+class ExtractionTimeout(TimeoutError):
+    """Raised when a document takes longer than PDF_EXTRACT_TIMEOUT to extract."""
+
+
+class ExtractionInterrupted(RuntimeError):
+    """Raised when the pool was restarted on every attempt to extract a document."""
+
+
+def page_ranges(n_pages: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    """Split pages [0, n_pages) into consecutive [start, end) ranges."""
+    return [(start, min(start + pages_per_task, n_pages)) for start in range(0, n_pages, pages_per_task)]
+
+
+def pdf_page_count(path: str) -> int:
+    """Number of pages in a PDF (runs in a pool process)."""
+    import PyPDF2
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end) of a PDF (runs in a pool process)."""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+class PDFExtractor:
+    """Extracts PDF text on a process pool, one task per page range.
+
+    Parsing is CPU-bound and holds the GIL, so it runs in worker processes
+    and never on the event loop. Large documents are split into ranges of
+    PDF_PAGES_PER_TASK pages that are extracted in parallel. Only the first
+    PDF_MAX_PAGES pages are read, and a document that takes longer than
+    PDF_EXTRACT_TIMEOUT fails; the pool is then restarted so a pathological
+    file cannot keep its processes busy. Documents that were running on the
+    restarted pool are extracted again on the new one.
+    """
+
+    def __init__(
+        self, max_workers: int = None, pages_per_task: int = None, max_pages: int = None, timeout: float = None
+    ):
+        """Initialize extractor; the pool is started on first use."""
+        self.max_workers = max_workers or settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task or settings.PDF_PAGES_PER_TASK
+        self.max_pages = max_pages or settings.PDF_MAX_PAGES
+        self.timeout = settings.PDF_EXTRACT_TIMEOUT if timeout is None else timeout
+        self._pool = None
+        # Bumped on every restart, so interrupted extractions can tell they should retry
+        self._generation = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    async def extract(self, path: str) -> str:
+        """Text of a PDF, pages joined by newlines."""
+        name = os.path.basename(path)
+        for _ in range(RESTART_RETRIES + 1):
+            generation = self._generation
+            try:
+                return await asyncio.wait_for(self._extract(path), self.timeout or None)
+            except asyncio.TimeoutError:
+                self.restart()
+                raise ExtractionTimeout(f"Extracting {name} took longer than {self.timeout}s")
+            except asyncio.CancelledError:
+                # A restart cancels the pool's queued tasks; only our own cancellation propagates
+                if asyncio.current_task().cancelling():
+                    raise
+            except BrokenProcessPool:
+                # A process died; the pool runs nothing more until it is replaced
+                if self._generation == generation:
+                    self.restart()
+            except RuntimeError:
+                # Submitted to a pool that was shut down meanwhile
+                if self._generation == generation:
+                    raise
+            logger.warning(f"⚠️ Extraction pool restarted while extracting {name}, retrying")
+        raise ExtractionInterrupted(f"Extraction pool restarted {RESTART_RETRIES + 1} times while extracting {name}")
+
+    async def _extract(self, path: str) -> str:
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        n_pages = await loop.run_in_executor(pool, pdf_page_count, path)
+        if n_pages > self.max_pages:
+            logger.warning(f"{os.path.basename(path)} has {n_pages} pages, extracting the first {self.max_pages}")
+            n_pages = self.max_pages
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(pool, extract_pdf_pages, path, start, end)
+            for start, end in page_ranges(n_pages, self.pages_per_task)
+        ))
+        return "\n".join(page for chunk in chunks for page in chunk)
+
+    def restart(self):
+        """Stop the pool, killing busy processes; a new pool starts on next use."""
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        self._generation += 1
+        # Running tasks cannot be cancelled, only their processes terminated
+        for process in list(getattr(pool, "_processes", {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stop the pool after running tasks finish."""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            self._generation += 1
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+pdf_extractor = PDFExtractor()
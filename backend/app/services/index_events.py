@@ -0,0 +1,270 @@
+"""Document index events published by ingest and applied to the live vector index."""
+import asyncio
+import base64
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import redis
+from app.config import settings
+from app.db import decode_embedding, encode_embedding
+from app.services.lexical_index import BM25Index, lexical_index
+from app.services.vector_index import LiveVectorIndex, vector_index
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_ADDED = "added"
+DOCUMENT_REMOVED = "removed"
+
+# Seconds to wait before retrying Redis after a connection failure
+REDIS_RETRY_INTERVAL = 30.0
+
+
+class LocalEventLog:
+    """Bounded in-process event log, used when Redis is unavailable."""
+
+    def __init__(self, maxlen: int = 10000):
+        """Initialize empty log."""
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def append(self, events: Sequence[Dict[str, Any]]):
+        with self._cond:
+            for event in events:
+                self._seq += 1
+                self._events.append((self._seq, event))
+            self._cond.notify_all()
+
+    def read(self, after: int, count: int = 500, timeout: float = 0.0) -> Tuple[int, List[Dict[str, Any]]]:
+        """Events with sequence > `after`; waits up to `timeout` seconds for one."""
+        with self._cond:
+            if self._seq <= after and timeout > 0:
+                self._cond.wait(timeout)
+            events = [(seq, event) for seq, event in self._events if seq > after][:count]
+        if not events:
+            return after, []
+        return events[-1][0], [event for _, event in events]
+
+
+class IndexEventBus:
+    """Publishes compact document events to a Redis stream, or a local log.
+
+    Events carry the document id, its metadata and its embedding (float32,
+    base64), so subscribers can index a document without reading the
+    database. The stream is capped at roughly INDEX_EVENTS_MAXLEN entries.
+    """
+
+    def __init__(self, redis_url: str = None, stream: str = None, maxlen: int = None):
+        """Initialize bus; Redis is connected lazily."""
+        self.redis_url = settings.REDIS_URL if redis_url is None else redis_url
+        self.stream = stream or settings.INDEX_EVENTS_STREAM
+        self.maxlen = maxlen or settings.INDEX_EVENTS_MAXLEN
+        self.local = LocalEventLog()
+        self._redis = None
+        self._redis_failed_at = None
+        self._lock = threading.Lock()
+
+    def client(self) -> Optional[redis.Redis]:
+        """Connected Redis client, or None while Redis is unavailable."""
+        if not self.redis_url:
+            return None
+        with self._lock:
+            if self._redis is not None:
+                return self._redis
+            if self._redis_failed_at and time.monotonic() - self._redis_failed_at < REDIS_RETRY_INTERVAL:
+                return None
+            try:
+                client = redis.from_url(self.redis_url, decode_responses=True)
+                client.ping()
+                self._redis = client
+                self._redis_failed_at = None
+            except Exception as e:
+                logger.warning(f"Redis not available for index events: {e}. Using local event log.")
+                self._redis_failed_at = time.monotonic()
+            return self._redis
+
+    def mark_unavailable(self, error: Exception):
+        """Drop the Redis client after an error; it is retried later."""
+        logger.warning(f"Index event stream error: {error}")
+        with self._lock:
+            self._redis = None
+            self._redis_failed_at = time.monotonic()
+
+    def publish(self, events: Sequence[Dict[str, Any]]):
+        """Publish events; never raises (index events are best-effort)."""
+        if not events:
+            return
+        client = self.client()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for event in events:
+                    pipe.xadd(self.stream, {"event": json.dumps(event)}, maxlen=self.maxlen, approximate=True)
+                pipe.execute()
+                return
+            except redis.RedisError as e:
+                self.mark_unavailable(e)
+        self.local.append(events)
+
+    def publish_added(
+        self, doc_ids: Sequence[str], embeddings: Sequence[Sequence[float]], metadatas: Sequence[Dict] = None
+    ):
+        """Publish one `added` event per document."""
+        self.publish([
+            {
+                "type": DOCUMENT_ADDED,
+                "doc_id": doc_id,
+                "metadata": metadatas[i] if metadatas is not None else None,
+                "embedding": base64.b64encode(encode_embedding(embeddings[i])).decode("ascii"),
+            }
+            for i, doc_id in enumerate(doc_ids)
+        ])
+
+    def publish_removed(self, doc_ids: Sequence[str]):
+        """Publish one `removed` event per document."""
+        self.publish([{"type": DOCUMENT_REMOVED, "doc_id": doc_id} for doc_id in doc_ids])
+
+    def latest_stream_id(self) -> str:
+        """Id of the newest stream entry ("0-0" when empty or unavailable)."""
+        client = self.client()
+        if client is None:
+            return "0-0"
+        try:
+            entries = client.xrevrange(self.stream, count=1)
+            return entries[0][0] if entries else "0-0"
+        except redis.RedisError as e:
+            self.mark_unavailable(e)
+            return "0-0"
+
+    def read_stream(self, last_id: str, count: int = 500, block_ms: int = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Stream events after `last_id`; blocks up to `block_ms` when given."""
+        client = self.client()
+        if client is None:
+            return last_id, []
+        try:
+            response = client.xread({self.stream: last_id}, count=count, block=block_ms)
+        except redis.RedisError as e:
+            self.mark_unavailable(e)
+            return last_id, []
+        events = []
+        for _stream, entries in response or []:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                try:
+                    events.append(json.loads(fields["event"]))
+                except (KeyError, ValueError):
+                    logger.warning(f"Skipping malformed index event {entry_id}")
+        return last_id, events
+
+
+class IndexEventConsumer:
+    """Applies index events to a live vector index and merges its delta.
+
+    Runs in the backend as a background task. Added documents go to the
+    index's delta segment right away, also while the main index is still
+    loading from the database; the delta is merged into the main
+    index off the event loop once it reaches INDEX_DELTA_MERGE_ROWS rows or
+    has been pending for INDEX_DELTA_MERGE_INTERVAL seconds.
+    """
+
+    def __init__(
+        self,
+        index: LiveVectorIndex = None,
+        bus: IndexEventBus = None,
+        block_ms: int = 1000,
+        lexical: BM25Index = None,
+    ):
+        """Initialize consumer for `index` (defaults to the shared vector and lexical indexes)."""
+        self.index = index if index is not None else vector_index
+        self.lexical = lexical if lexical is not None else lexical_index
+        self.bus = bus or index_event_bus
+        self.block_ms = block_ms
+        self.merge_rows = settings.INDEX_DELTA_MERGE_ROWS
+        self.merge_interval = settings.INDEX_DELTA_MERGE_INTERVAL
+        self._stream_id = None
+        self._local_seq = 0
+        self._last_merge = time.monotonic()
+        self.running = False
+
+    def apply(self, events: Sequence[Dict[str, Any]]) -> int:
+        """Apply events in order; returns the number of documents added to the vector index."""
+        added = 0
+        pending: List[Tuple[str, np.ndarray, Optional[Dict]]] = []
+        for event in events:
+            event_type = event.get("type")
+            if event_type == DOCUMENT_ADDED:
+                try:
+                    vector = decode_embedding(base64.b64decode(event["embedding"]))
+                except Exception as e:
+                    logger.warning(f"Skipping index event for {event.get('doc_id')}: {e}")
+                    continue
+                pending.append((event["doc_id"], vector, event.get("metadata")))
+            elif event_type == DOCUMENT_REMOVED:
+                # Keep ordering: adds seen before a removal are applied first
+                added += self._add(pending)
+                pending = []
+                self.index.remove([event["doc_id"]])
+                self.lexical.remove([event["doc_id"]])
+            else:
+                logger.warning(f"Unknown index event type: {event_type}")
+        return added + self._add(pending)
+
+    def _add(self, pending: List[Tuple[str, np.ndarray, Optional[Dict]]]) -> int:
+        if not pending:
+            return 0
+        doc_ids, vectors, metadatas = zip(*pending)
+        # Applied even while the indexes load: a document committed after the
+        # load read its ids would otherwise be missing until restart. Both
+        # indexes skip ids the load has already added.
+        # Events carry no text; titles and content are read in one query
+        self.lexical.add_from_db(doc_ids)
+        return self.index.add(list(doc_ids), np.stack(vectors), list(metadatas))
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Collect pending events from the local log and the Redis stream (blocking briefly)."""
+        self._local_seq, events = self.bus.local.read(self._local_seq)
+        if self.bus.client() is not None:
+            if self._stream_id is None:
+                self._stream_id = self.bus.latest_stream_id()
+            self._stream_id, stream_events = self.bus.read_stream(
+                self._stream_id, block_ms=None if events else self.block_ms
+            )
+            events.extend(stream_events)
+        elif not events:
+            self._local_seq, events = self.bus.local.read(self._local_seq, timeout=self.block_ms / 1000)
+        return events
+
+    def should_merge(self) -> bool:
+        pending = len(self.index.delta)
+        if self.index.needs_compaction():
+            return True
+        if pending == 0:
+            self._last_merge = time.monotonic()
+            return False
+        return pending >= self.merge_rows or time.monotonic() - self._last_merge >= self.merge_interval
+
+    async def start(self):
+        """Consume events until stopped."""
+        self.running = True
+        logger.info(f"Index event consumer started on '{self.bus.stream}'")
+        while self.running:
+            try:
+                events = await asyncio.to_thread(self.poll)
+                if events:
+                    await asyncio.to_thread(self.apply, events)
+                if self.should_merge():
+                    await asyncio.to_thread(self.index.merge)
+                    self._last_merge = time.monotonic()
+            except Exception as e:
+                logger.error(f"Index event consumer error: {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    def stop(self):
+        self.running = False
+
+
+index_event_bus = IndexEventBus()
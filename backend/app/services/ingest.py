@@ -1,15 +1,23 @@
 """Document ingestion service."""
 import logging
 import hashlib
-import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Sequence
 from datetime import datetime
-from app.db import SessionLocal, Document
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app.db import SessionLocal, Document, encode_embedding, EMBEDDING_DTYPE
 from app.services.embeddings import embeddings_service
+from app.services.embedding_store import embedding_store
+from app.services.vector_index import vector_index, normalize_rows
+from app.services.index_events import index_event_bus
+from app.services.lexical_index import lexical_index, document_text
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Ids per existence query, below SQLite's bound-parameter limit
+EXISTENCE_CHUNK = 500
+
 
 def compute_shard_id(metadata: Dict[str, Any], title_embedding: List[float]) -> str:
     """Compute shard ID from metadata and title embedding."""
@@ -40,29 +48,23 @@ async def ingest_document(payload: Dict[str, Any]) -> Dict[str, Any]:
             logger.info(f"Document already exists: {idempotency_key}")
             return {"doc_id": idempotency_key, "status": "duplicate"}
         
-        embedding = embeddings_service.embed_single(f"{title} {content[:500]}")
+        embedding = await embeddings_service.embed_single_async(f"{title} {content[:500]}")
         shard_id = compute_shard_id(metadata, embedding)
+        doc_metadata = {**metadata, "shard_id": shard_id}
         
-        doc = Document(
-            id=idempotency_key,
-            title=title,
-            content=content[:5000],
-            embedding=json.dumps(embedding),
-            doc_metadata={**metadata, "shard_id": shard_id},
-            source=metadata.get("source", "unknown"),
-        )
-        
-        db.add(doc)
+        db.add(Document(**_document_row(idempotency_key, title, content, doc_metadata, embedding)))
         db.commit()
         
-        logger.info(f"Ingested document: {idempotency_key}")
-        
-        return {
+        result = {
             "doc_id": idempotency_key,
             "status": "success",
             "shard_id": shard_id,
             "title": title,
         }
+        logger.info(f"Ingested document: {idempotency_key}")
+        
+        _index_documents([idempotency_key], [embedding], [doc_metadata], [document_text(title, content[:5000])])
+        return result
     
     except Exception as e:
         logger.error(f"Failed to ingest document: {e}")
@@ -71,13 +73,157 @@ async def ingest_document(payload: Dict[str, Any]) -> Dict[str, Any]:
         db.close()
 
 
+def _document_row(
+    doc_id: str, title: str, content: str, doc_metadata: Dict[str, Any], embedding: Sequence[float]
+) -> Dict[str, Any]:
+    """Column values for a new document."""
+    return {
+        "id": doc_id,
+        "title": title,
+        "content": content[:5000],
+        "embedding": encode_embedding(embedding),
+        "embedding_dtype": EMBEDDING_DTYPE,
+        "embedding_dim": len(embedding),
+        "doc_metadata": doc_metadata,
+        "source": doc_metadata.get("source", "unknown"),
+    }
+
+
+def _index_documents(
+    doc_ids: List[str], embeddings: Sequence[Sequence[float]], metadatas: List[Dict[str, Any]], texts: List[str]
+):
+    """Make committed documents searchable.
+    
+    The documents are stored whatever happens here, so failures are logged
+    rather than raised; the indexes pick them up again on the next rebuild.
+    """
+    try:
+        if embedding_store is not None:
+            embedding_store.append(doc_ids, normalize_rows(embeddings))
+        
+        # Processes that never searched (e.g. the worker) don't hold an index;
+        # the backend picks their documents up from the index event stream,
+        # also while its own index is still loading
+        if vector_index.loaded:
+            vector_index.add(doc_ids, embeddings, metadatas)
+        if lexical_index.loaded:
+            lexical_index.add(doc_ids, texts, metadatas)
+        index_event_bus.publish_added(doc_ids, embeddings, metadatas)
+    except Exception as e:
+        logger.error(f"❌ Stored {len(doc_ids)} documents but failed to index them: {e}", exc_info=True)
+
+
+def delete_documents(doc_ids: Sequence[str]) -> List[str]:
+    """Delete stored documents and drop them from the search indexes; returns the ids deleted."""
+    db = SessionLocal()
+    try:
+        deleted = [doc_id for (doc_id,) in db.query(Document.id).filter(Document.id.in_(list(doc_ids)))]
+        if deleted:
+            db.query(Document).filter(Document.id.in_(deleted)).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+    
+    if deleted:
+        vector_index.remove(deleted)
+        lexical_index.remove(deleted)
+        index_event_bus.publish_removed(deleted)
+        logger.info(f"Deleted {len(deleted)} documents")
+    return deleted
+
+
+def _existing_ids(db, doc_ids: Sequence[str]) -> set:
+    """Ids among `doc_ids` that are already stored."""
+    existing = set()
+    for start in range(0, len(doc_ids), EXISTENCE_CHUNK):
+        chunk = list(doc_ids[start:start + EXISTENCE_CHUNK])
+        existing.update(doc_id for (doc_id,) in db.query(Document.id).filter(Document.id.in_(chunk)))
+    return existing
+
+
 async def ingest_batch(documents: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Ingest batch of documents."""
-    results = []
+    """Ingest batch of documents in one transaction.
+    
+    Existing ids are found with one IN query, new texts are embedded in one
+    batched call and all rows are inserted with a single bulk insert and
+    commit. Results are reported per document, in input order.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+    pending: Dict[str, int] = {}
+    for i, payload in enumerate(documents):
+        try:
+            doc_id = compute_idempotency_key(
+                payload.get("title", "Unknown"), payload.get("metadata", {}).get("source", "")
+            )
+        except Exception as e:
+            results[i] = {"status": "failed", "error": str(e)}
+            continue
+        if doc_id in pending:
+            # Same document twice in one batch
+            results[i] = {"doc_id": doc_id, "status": "duplicate"}
+        else:
+            pending[doc_id] = i
+    
+    indexed = None
+    db = SessionLocal()
+    try:
+        for doc_id in _existing_ids(db, list(pending)):
+            results[pending.pop(doc_id)] = {"doc_id": doc_id, "status": "duplicate"}
+        
+        if pending:
+            doc_ids = list(pending)
+            payloads = [documents[pending[doc_id]] for doc_id in doc_ids]
+            titles = [payload.get("title", "Unknown") for payload in payloads]
+            contents = [payload.get("content", "") for payload in payloads]
+            embeddings = (await embeddings_service.embed_async(
+                [f"{title} {content[:500]}" for title, content in zip(titles, contents)]
+            )).tolist()
+            
+            rows, metadatas, shard_ids = [], [], []
+            for i, doc_id in enumerate(doc_ids):
+                metadata = payloads[i].get("metadata", {})
+                shard_id = compute_shard_id(metadata, embeddings[i])
+                doc_metadata = {**metadata, "shard_id": shard_id}
+                rows.append(_document_row(doc_id, titles[i], contents[i], doc_metadata, embeddings[i]))
+                metadatas.append(doc_metadata)
+                shard_ids.append(shard_id)
+            
+            try:
+                db.execute(insert(Document), rows)
+                db.commit()
+            except IntegrityError:
+                # A concurrent ingest stored some of these ids; settle them one by one
+                db.rollback()
+                logger.warning("Bulk insert conflicted with concurrent ingest, retrying per document")
+                for doc_id in doc_ids:
+                    results[pending[doc_id]] = await ingest_document(documents[pending[doc_id]])
+                pending = {}
+            
+            if pending:
+                for i, doc_id in enumerate(doc_ids):
+                    results[pending[doc_id]] = {
+                        "doc_id": doc_id,
+                        "status": "success",
+                        "shard_id": shard_ids[i],
+                        "title": titles[i],
+                    }
+                logger.info(f"Ingested {len(doc_ids)} documents in one batch")
+                indexed = (
+                    doc_ids, embeddings, metadatas,
+                    [document_text(row["title"], row["content"]) for row in rows],
+                )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to ingest batch: {e}")
+        for i in pending.values():
+            if results[i] is None:
+                results[i] = {"status": "failed", "error": str(e)}
+    finally:
+        db.close()
     
-    for doc_payload in documents:
-        result = await ingest_document(doc_payload)
-        results.append(result)
+    # The rows are committed, so indexing errors no longer affect the results
+    if indexed is not None:
+        _index_documents(*indexed)
     
     successful = sum(1 for r in results if r.get("status") == "success")
     return {
@@ -0,0 +1,148 @@
+"""Batched ingest pipeline shared by the Redis workers and the in-process pool."""
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.ingest import ingest_batch
+from app.services.uploads import discard_upload, resolve_payload_async
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELD_PATTERNS = {
+    "total": r"total[:\s]+(\d+\.?\d*)",
+    "sum": r"sum[:\s]+(\d+\.?\d*)",
+    "amount": r"amount[:\s]+(\d+\.?\d*)",
+    "count": r"count[:\s]+(\d+\.?\d*)",
+}
+
+
+def extract_numeric_fields(content: str) -> Dict[str, float]:
+    """Extract numeric fields from content."""
+    fields = {}
+    for field_name, pattern in NUMERIC_FIELD_PATTERNS.items():
+        matches = re.findall(pattern, content, re.IGNORECASE)
+        if matches:
+            try:
+                fields[field_name] = float(matches[0])
+            except (ValueError, IndexError):
+                pass
+    return fields
+
+
+def validate_numeric_fields(fields: Dict[str, float]) -> Dict[str, Any]:
+    """Validate numeric fields consistency."""
+    errors = []
+    for field_name, value in fields.items():
+        if value < 0:
+            errors.append(f"{field_name} is negative: {value}")
+
+    return {
+        "valid": len(errors) == 0,
+        "errors": errors,
+    }
+
+
+def check_numeric_fields(title: str, content: str):
+    """Log documents whose numeric fields fail validation."""
+    validation_result = validate_numeric_fields(extract_numeric_fields(content))
+    if not validation_result["valid"]:
+        logger.warning(
+            f"⚠️ Document {title} failed validation: {validation_result['errors']}"
+        )
+
+
+async def process_documents(doc_payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Process a micro-batch of documents:
+    1. Load and parse spooled uploads concurrently
+    2. Validate numeric fields of each document
+    3. Embed all documents in one batched call and store them in one bulk write
+
+    Returns one result per payload, in order. Spooled uploads of stored
+    documents are deleted; those of failed ones are left to the caller,
+    which knows whether the task will be retried.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(doc_payloads)
+    resolved = await asyncio.gather(
+        *(resolve_payload_async(payload) for payload in doc_payloads), return_exceptions=True
+    )
+
+    ready, positions = [], []
+    for i, payload in enumerate(resolved):
+        if isinstance(payload, Exception):
+            logger.error(f"❌ Failed to load document {i} of batch: {payload}")
+            results[i] = {"status": "failed", "error": str(payload)}
+            continue
+        check_numeric_fields(payload.get("title", "Unknown"), payload.get("content", ""))
+        ready.append(payload)
+        positions.append(i)
+
+    if ready:
+        batch = await ingest_batch(ready)
+        for i, result in zip(positions, batch["results"]):
+            results[i] = result
+            if result.get("status") in ("success", "duplicate"):
+                discard_upload(doc_payloads[i])
+
+    logger.info(f"✅ Processed micro-batch of {len(doc_payloads)} documents")
+    return results
+
+
+class InProcessIngestPool:
+    """Async ingest consumers for the in-process task queue (no Redis).
+
+    Each consumer blocks on the "ingest" queue, gathers further tasks into a
+    micro-batch of up to WORKER_BATCH_SIZE for at most WORKER_BATCH_WAIT_MS,
+    and runs it through process_documents like the Redis workers do.
+    """
+
+    def __init__(self, task_queue, consumers: int = None, batch_size: int = None, batch_wait_ms: float = None):
+        """Initialize pool; consumers start with start()."""
+        self.task_queue = task_queue
+        self.consumers = settings.INGEST_INPROCESS_CONSUMERS if consumers is None else consumers
+        self.batch_size = batch_size or settings.WORKER_BATCH_SIZE
+        self.batch_wait = (settings.WORKER_BATCH_WAIT_MS if batch_wait_ms is None else batch_wait_ms) / 1000
+        self.processed = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the consumers on the running loop."""
+        self._tasks = [asyncio.create_task(self._consume(i)) for i in range(self.consumers)]
+        if self._tasks:
+            logger.info(f"🟢 In-process ingest pool started with {self.consumers} consumers")
+
+    async def stop(self):
+        """Cancel the consumers; batches being written are abandoned."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _next_batch(self) -> List[Tuple[str, Dict[str, Any]]]:
+        batch = [await self.task_queue.dequeue("ingest")]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            task = await self.task_queue.dequeue("ingest", timeout=deadline - loop.time())
+            if task is None:
+                break
+            batch.append(task)
+        return batch
+
+    async def _consume(self, index: int):
+        while True:
+            batch = await self._next_batch()
+            logger.info(f"🔄 Ingest consumer {index} processing {len(batch)} tasks")
+            try:
+                results = await process_documents([payload for _, payload in batch])
+            except Exception as e:
+                logger.error(f"Error processing batch: {e}", exc_info=True)
+                results = [{"status": "failed", "error": str(e)}] * len(batch)
+
+            for (task_id, payload), result in zip(batch, results):
+                status = "completed" if result.get("status") in ("success", "duplicate") else "failed"
+                self.task_queue.update_task_status(task_id, status, result)
+                # Failed tasks are not retried, so their uploads go too
+                discard_upload(payload)
+            self.processed += len(batch)
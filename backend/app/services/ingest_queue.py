@@ -0,0 +1,65 @@
+"""Ingest task transport: a Redis list, or a Redis stream read by consumer groups."""
+import json
+import logging
+from typing import Any, Dict, List
+import redis
+from app.config import settings
+from app.services.ingest import compute_idempotency_key
+
+logger = logging.getLogger(__name__)
+
+# Redis list used by the "list" transport
+INGEST_LIST = "ingest_tasks"
+
+
+def stream_transport() -> bool:
+    """Whether ingest tasks go through the Redis stream (INGEST_TRANSPORT=stream)."""
+    return settings.INGEST_TRANSPORT.lower() == "stream"
+
+
+def shard_queue(shard_id: str) -> str:
+    """List holding ingest tasks routed to `shard_id` (e.g. "ingest_tasks:shard_2")."""
+    return f"{INGEST_LIST}:{shard_id}"
+
+
+def shard_queues(shard_index: int, n_shards: int = None) -> List[str]:
+    """Lists read by a shard's worker, in priority order.
+
+    Its own queue comes first, then the neighbouring shards' queues in ring
+    order (work stealing when its own runs dry), then the unsharded list.
+    """
+    n_shards = n_shards or settings.MAX_WORKERS
+    return [
+        shard_queue(f"shard_{(shard_index + offset) % n_shards}") for offset in range(n_shards)
+    ] + [INGEST_LIST]
+
+
+def task_shard_id(payload: Dict[str, Any], n_shards: int = None) -> str:
+    """Shard whose queue takes an ingest task, by a hash of the document's id.
+
+    Uploads all share one source, so hashing per document spreads them
+    evenly, while a resent document still lands on the same shard.
+    """
+    metadata = payload.get("metadata") or {}
+    doc_id = compute_idempotency_key(payload.get("title", "Unknown"), metadata.get("source", ""))
+    return f"shard_{int(doc_id, 16) % (n_shards or settings.MAX_WORKERS)}"
+
+
+def publish_ingest_task(client: redis.Redis, task_id: str, payload: Dict[str, Any]) -> str:
+    """Queue an ingest task for the workers; returns the list or stream it went to.
+
+    With INGEST_SHARDED_QUEUES, list tasks go to the queue of their shard
+    (task_shard_id), so one worker process handles each shard.
+    """
+    task_json = json.dumps({
+        "task_id": task_id,
+        "payload": payload,
+    })
+    if stream_transport():
+        client.xadd(settings.INGEST_STREAM, {"task": task_json})
+        return settings.INGEST_STREAM
+    queue = INGEST_LIST
+    if settings.INGEST_SHARDED_QUEUES:
+        queue = shard_queue(task_shard_id(payload))
+    client.rpush(queue, task_json)
+    return queue
@@ -0,0 +1,260 @@
+"""BM25 inverted index over document titles and content."""
+import logging
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.db import SessionLocal, Document
+from app.services.metadata_index import MetadataIndex
+from app.services.vector_index import top_k_indices
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Identifiers such as "DOC-2024-017" or "v1.2" are kept whole and also split into parts
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or that the this to was were with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; compound identifiers also yield their parts."""
+    tokens = []
+    for match in _TOKEN_RE.finditer((text or "").lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in _PART_RE.findall(token) if part not in STOPWORDS)
+    return tokens
+
+
+def document_text(title: str, content: str) -> str:
+    """Text indexed for a document."""
+    return f"{title or ''} {content or ''}"
+
+
+class BM25Index:
+    """In-memory inverted index scored with Okapi BM25.
+
+    Each term keeps parallel row / term-frequency posting lists, so a query
+    touches only the postings of its own terms. Rows carry the same
+    metadata postings as the vector index, so audit scopes apply to lexical
+    hits too. Removed documents are hidden until INDEX_COMPACT_TOMBSTONES
+    of them accumulate; `compact` then drops their postings.
+    """
+
+    def __init__(self, k1: float = None, b: float = None):
+        """Initialize empty index."""
+        self.k1 = settings.BM25_K1 if k1 is None else k1
+        self.b = settings.BM25_B if b is None else b
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._total_length = 0
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.metadata = MetadataIndex()
+        self.removed = set()
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_row and doc_id not in self.removed
+
+    def add(self, doc_ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict] = None) -> int:
+        """Index documents, skipping ids already present."""
+        with self._lock:
+            added = 0
+            for i, doc_id in enumerate(doc_ids):
+                self.removed.discard(doc_id)
+                if doc_id in self._id_to_row:
+                    continue
+                row = len(self._ids)
+                tokens = tokenize(texts[i])
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    rows, freqs = self._postings.setdefault(term, ([], []))
+                    rows.append(row)
+                    freqs.append(tf)
+                    self._arrays.pop(term, None)
+
+                if row >= self._lengths.shape[0]:
+                    grown = np.zeros(self._lengths.shape[0] * 2, dtype=np.float32)
+                    grown[:row] = self._lengths[:row]
+                    self._lengths = grown
+                self._lengths[row] = len(tokens)
+                self._total_length += len(tokens)
+                self.metadata.add(row, metadatas[i] if metadatas is not None else None)
+                self._id_to_row[doc_id] = row
+                self._ids.append(doc_id)
+                added += 1
+            return added
+
+    def remove(self, doc_ids: Sequence[str]) -> int:
+        """Hide documents from results, compacting once enough are removed."""
+        with self._lock:
+            before = len(self.removed)
+            self.removed.update(doc_id for doc_id in doc_ids if doc_id in self._id_to_row)
+            removed = len(self.removed) - before
+            if len(self.removed) >= settings.INDEX_COMPACT_TOMBSTONES:
+                self.compact()
+            return removed
+
+    def compact(self) -> int:
+        """Drop the rows and postings of removed documents, renumbering the rest.
+
+        Searches already running keep their snapshot of the old rows.
+        Returns the number of rows dropped.
+        """
+        with self._lock:
+            if not self.removed:
+                return 0
+            n = len(self._ids)
+            keep = np.fromiter((doc_id not in self.removed for doc_id in self._ids), dtype=bool, count=n)
+            new_rows = np.full(n, -1, dtype=np.int64)
+            new_rows[keep] = np.arange(int(keep.sum()))
+
+            postings: Dict[str, Tuple[List[int], List[int]]] = {}
+            for term, (rows, freqs) in self._postings.items():
+                mapped = new_rows[np.asarray(rows, dtype=np.int64)]
+                kept = mapped >= 0
+                if kept.any():
+                    postings[term] = (mapped[kept].tolist(), np.asarray(freqs)[kept].tolist())
+
+            ids = [doc_id for doc_id, k in zip(self._ids, keep) if k]
+            lengths = self._lengths[:n][keep]
+            self._lengths = np.zeros(max(len(ids), 1024), dtype=np.float32)
+            self._lengths[:len(ids)] = lengths
+            self._total_length = int(lengths.sum())
+            self._postings = postings
+            self._arrays = {}
+            self._ids = ids
+            self._id_to_row = {doc_id: row for row, doc_id in enumerate(ids)}
+            self.metadata.remap(new_rows, len(ids))
+            self.removed = set()
+        logger.info(f"Compacted lexical index, dropping {n - len(ids)} removed documents")
+        return n - len(ids)
+
+    def _term_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            rows, freqs = self._postings.get(term, ((), ()))
+            arrays = (np.asarray(rows, dtype=np.int64), np.asarray(freqs, dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
+
+    def resolve_scope(self, scope: Optional[str]) -> Optional[np.ndarray]:
+        """Rows matching a scope expression, or None when unscoped."""
+        if not scope or not scope.strip():
+            return None
+        return self.metadata.filter(scope, universe=len(self))
+
+    def search(self, query: str, top_k: int = 10, candidates: np.ndarray = None) -> List[Tuple[str, float]]:
+        """Return (doc_id, BM25 score) pairs for the best matching documents."""
+        return self.search_batch([query], top_k, candidates)[0]
+
+    def search_batch(
+        self, queries: Sequence[str], top_k: int = 10, candidates: np.ndarray = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Score each query against the postings of its terms."""
+        results = []
+        for query in queries:
+            terms = set(tokenize(query))
+            with self._lock:
+                n = len(self._ids)
+                ids = self._ids
+                lengths = self._lengths[:n]
+                avg_length = self._total_length / n if n else 0.0
+                postings = [self._term_arrays(term) for term in terms]
+                removed = set(self.removed)
+            postings = [(rows, freqs) for rows, freqs in postings if rows.size]
+            if not postings or avg_length == 0:
+                results.append([])
+                continue
+
+            scores = np.zeros(n, dtype=np.float32)
+            for rows, freqs in postings:
+                df = rows.size
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[rows] / avg_length)
+                scores[rows] += idf * freqs * (self.k1 + 1.0) / (freqs + norm)
+
+            matched = np.unique(np.concatenate([rows for rows, _ in postings]))
+            if candidates is not None:
+                matched = np.intersect1d(matched, candidates, assume_unique=True)
+            best = top_k_indices(scores[matched], top_k + len(removed))
+            hits = [(ids[matched[i]], float(scores[matched[i]])) for i in best]
+            results.append([hit for hit in hits if hit[0] not in removed][:top_k])
+        return results
+
+    def load_from_db(self, batch_size: int = 2000) -> int:
+        """Index stored documents that are not yet in the index."""
+        db = SessionLocal()
+        loaded = 0
+        try:
+            missing = [
+                doc_id for (doc_id,) in db.query(Document.id).yield_per(batch_size)
+                if doc_id not in self._id_to_row
+            ]
+            for start in range(0, len(missing), batch_size):
+                loaded += self._add_rows(db, missing[start:start + batch_size])
+        finally:
+            db.close()
+        self.loaded = True
+        logger.info(f"Lexical index loaded {loaded} documents ({len(self)} total)")
+        return loaded
+
+    def add_from_db(self, doc_ids: Sequence[str]) -> int:
+        """Index specific stored documents (e.g. from ingest events)."""
+        missing = [doc_id for doc_id in doc_ids if doc_id not in self._id_to_row]
+        if not missing:
+            return 0
+        db = SessionLocal()
+        try:
+            return self._add_rows(db, missing)
+        finally:
+            db.close()
+
+    def _add_rows(self, db, doc_ids: Sequence[str]) -> int:
+        rows = db.query(
+            Document.id, Document.title, Document.content, Document.doc_metadata
+        ).filter(Document.id.in_(doc_ids)).all()
+        return self.add(
+            [doc_id for doc_id, _, _, _ in rows],
+            [document_text(title, content) for _, title, content, _ in rows],
+            [metadata for _, _, _, metadata in rows],
+        )
+
+    def ensure_loaded(self):
+        """Build the index from the database on first use."""
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                self.load_from_db()
+
+    def clear(self):
+        """Drop all documents."""
+        with self._lock:
+            self._ids = []
+            self._id_to_row = {}
+            self._lengths = np.zeros(1024, dtype=np.float32)
+            self._total_length = 0
+            self._postings = {}
+            self._arrays = {}
+            self.metadata.clear()
+            self.removed = set()
+            self.loaded = False
+
+
+lexical_index = BM25Index()
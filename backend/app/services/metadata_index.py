@@ -0,0 +1,260 @@
+"""Metadata posting-list index for scoping audit search."""
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Metadata keys that get posting lists; list-valued fields index every element
+INDEXED_FIELDS = ("department", "source", "tags", "shard_id")
+FIELD_ALIASES = {"tag": "tags", "dept": "department", "shard": "shard_id"}
+# Fields a bare term (no "field:") is matched against
+BARE_TERM_FIELDS = ("department", "tags")
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+
+
+class ScopeSyntaxError(ValueError):
+    """Raised when a scope expression cannot be parsed."""
+
+
+def _tokenize(scope: str) -> List[Tuple[str, str]]:
+    """Split a scope expression into (kind, text) tokens."""
+    tokens = []
+    pos = 0
+    scope = scope.strip()
+    while pos < len(scope):
+        match = _TOKEN_RE.match(scope, pos)
+        if not match or match.end() == pos:
+            raise ScopeSyntaxError(f"Unexpected input at position {pos}: {scope[pos:]!r}")
+        pos = match.end()
+        lparen, rparen, quoted, word = match.groups()
+        if lparen:
+            tokens.append(("(", lparen))
+        elif rparen:
+            tokens.append((")", rparen))
+        elif quoted is not None:
+            tokens.append(("term", quoted))
+        elif word.upper() in ("AND", "OR", "NOT"):
+            tokens.append((word.upper(), word))
+        elif word.endswith(":") and pos < len(scope) and scope[pos] == '"':
+            # field:"quoted value"
+            quoted_match = _TOKEN_RE.match(scope, pos)
+            pos = quoted_match.end()
+            tokens.append(("term", word + quoted_match.group(3)))
+        else:
+            tokens.append(("term", word))
+    return tokens
+
+
+class _ScopeParser:
+    """Recursive-descent parser: OR binds loosest, then AND (or adjacency), then NOT."""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def _take(self) -> Tuple[str, str]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self._or()
+        if self._peek() is not None:
+            raise ScopeSyntaxError(f"Unexpected token {self.tokens[self.pos][1]!r}")
+        return node
+
+    def _or(self):
+        nodes = [self._and()]
+        while self._peek() == "OR":
+            self._take()
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _and(self):
+        nodes = [self._not()]
+        while self._peek() in ("AND", "NOT", "(", "term"):
+            if self._peek() == "AND":
+                self._take()
+            nodes.append(self._not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _not(self):
+        if self._peek() == "NOT":
+            self._take()
+            return ("not", self._not())
+        return self._atom()
+
+    def _atom(self):
+        kind = self._peek()
+        if kind == "(":
+            self._take()
+            node = self._or()
+            if self._peek() != ")":
+                raise ScopeSyntaxError("Missing closing parenthesis")
+            self._take()
+            return node
+        if kind == "term":
+            text = self._take()[1]
+            field, sep, value = text.partition(":")
+            if sep and field:
+                field = FIELD_ALIASES.get(field.lower(), field.lower())
+                return ("term", field, value)
+            return ("bare", text)
+        raise ScopeSyntaxError("Expected a term, NOT or '('")
+
+
+def parse_scope(scope: str):
+    """Parse a scope such as `department:finance AND tag:2024 AND NOT source:email`.
+
+    A scope without any field prefix or operator is one bare value, e.g.
+    "Finance" or "Legal Ops", matched against department or tags.
+    """
+    tokens = _tokenize(scope)
+    if tokens and all(kind == "term" and ":" not in text for kind, text in tokens):
+        return ("bare", " ".join(text for _, text in tokens))
+    if not tokens:
+        raise ScopeSyntaxError("Empty scope")
+    return _ScopeParser(tokens).parse()
+
+
+def _normalize(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+class MetadataIndex:
+    """Sorted row-id posting lists per (field, value).
+
+    Rows are appended in increasing order, so every posting list is sorted
+    and boolean combinations are merges whose cost is proportional to the
+    lists involved, not to the corpus.
+    """
+
+    def __init__(self, fields: Sequence[str] = INDEXED_FIELDS):
+        """Initialize empty index."""
+        self.fields = tuple(fields)
+        self._postings: Dict[Tuple[str, str], List[int]] = {}
+        self._arrays: Dict[Tuple[str, str], np.ndarray] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, row: int, metadata: Optional[Dict[str, Any]]):
+        """Index `metadata` for `row` (rows must be added in increasing order)."""
+        with self._lock:
+            for field in self.fields:
+                value = (metadata or {}).get(field)
+                if value is None:
+                    continue
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                for item in {_normalize(v) for v in values}:
+                    key = (field, item)
+                    self._postings.setdefault(key, []).append(row)
+                    self._arrays.pop(key, None)
+            self._size = max(self._size, row + 1)
+
+    def rows(self, field: str, value: Any) -> np.ndarray:
+        """Sorted rows whose `field` equals (or, for lists, contains) `value`."""
+        key = (field, _normalize(value))
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is None:
+                array = np.asarray(self._postings.get(key, ()), dtype=np.int64)
+                self._arrays[key] = array
+        return array
+
+    def values(self, field: str) -> Dict[str, int]:
+        """Known values of `field` with their document counts."""
+        with self._lock:
+            return {value: len(rows) for (f, value), rows in self._postings.items() if f == field}
+
+    def evaluate(self, node, universe: int = None) -> np.ndarray:
+        """Evaluate a parsed scope to a sorted array of matching rows."""
+        universe = self._size if universe is None else universe
+        kind = node[0]
+        if kind == "term":
+            _, field, value = node
+            if field not in self.fields:
+                raise ScopeSyntaxError(
+                    f"Field '{field}' is not indexed; expected one of {', '.join(self.fields)}"
+                )
+            return self.rows(field, value)
+        if kind == "bare":
+            arrays = [self.rows(field, node[1]) for field in BARE_TERM_FIELDS]
+            return np.unique(np.concatenate(arrays))
+        if kind == "or":
+            return np.unique(np.concatenate([self.evaluate(child, universe) for child in node[1]]))
+        if kind == "and":
+            positives = [child for child in node[1] if child[0] != "not"]
+            negatives = [child[1] for child in node[1] if child[0] == "not"]
+            if positives:
+                result = self.evaluate(positives[0], universe)
+                for child in positives[1:]:
+                    result = np.intersect1d(result, self.evaluate(child, universe), assume_unique=True)
+            else:
+                result = np.arange(universe, dtype=np.int64)
+            for child in negatives:
+                result = np.setdiff1d(result, self.evaluate(child, universe), assume_unique=True)
+            return result
+        if kind == "not":
+            return np.setdiff1d(
+                np.arange(universe, dtype=np.int64), self.evaluate(node[1], universe), assume_unique=True
+            )
+        raise ScopeSyntaxError(f"Unknown scope node {kind!r}")
+
+    def filter(self, scope: str, universe: int = None) -> np.ndarray:
+        """Parse and evaluate a scope expression."""
+        return self.evaluate(parse_scope(scope), universe)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Posting lists as flat arrays for persistence."""
+        with self._lock:
+            keys = sorted(self._postings)
+            lengths = [len(self._postings[key]) for key in keys]
+            return {
+                "meta_keys": np.array([f"{field}\x1f{value}" for field, value in keys], dtype=str),
+                "meta_offsets": np.cumsum([0] + lengths).astype(np.int64),
+                "meta_rows": np.concatenate(
+                    [np.asarray(self._postings[key], dtype=np.int64) for key in keys]
+                ) if keys else np.empty(0, dtype=np.int64),
+                "meta_size": np.array(self._size),
+            }
+
+    def restore(self, state: Dict[str, np.ndarray]):
+        """Rebuild posting lists saved by `state`."""
+        with self._lock:
+            self._postings = {}
+            self._arrays = {}
+            offsets = state["meta_offsets"]
+            for i, key in enumerate(state["meta_keys"]):
+                field, _, value = str(key).partition("\x1f")
+                self._postings[(field, value)] = state["meta_rows"][offsets[i]:offsets[i + 1]].tolist()
+            self._size = int(state["meta_size"])
+
+    def remap(self, new_rows: np.ndarray, size: int):
+        """Renumber rows after a compaction; `new_rows[old]` is the new row, or -1 if dropped."""
+        with self._lock:
+            postings = {}
+            for key, rows in self._postings.items():
+                mapped = new_rows[np.asarray(rows, dtype=np.int64)]
+                mapped = mapped[mapped >= 0]
+                if mapped.size:
+                    postings[key] = mapped.tolist()
+            self._postings = postings
+            self._arrays = {}
+            self._size = size
+
+    def clear(self):
+        """Drop all postings."""
+        with self._lock:
+            self._postings = {}
+            self._arrays = {}
+            self._size = 0
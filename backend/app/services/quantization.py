@@ -0,0 +1,266 @@
+"""Compressed embedding codecs for memory-bounded vector search."""
+import logging
+import time
+from typing import Any, Dict, List, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per chunk, bounding the float32 temporaries created while decoding
+SCORE_CHUNK_ROWS = 65536
+
+
+class EmbeddingCodec:
+    """Base class: encode normalized float32 rows and score queries against codes."""
+
+    name = "base"
+    requires_training = False
+
+    def __init__(self, dimension: int):
+        """Initialize codec for `dimension`-wide vectors."""
+        self.dimension = dimension
+
+    @property
+    def trained(self) -> bool:
+        return True
+
+    def train(self, vectors: np.ndarray):
+        """Fit codec parameters (no-op for codecs that need none)."""
+
+    def encode(self, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+        """Encode rows; returns named code arrays with one leading row each."""
+        raise NotImplementedError
+
+    def score(self, codes: Dict[str, np.ndarray], queries: np.ndarray) -> np.ndarray:
+        """Approximate inner products, shape (rows, queries)."""
+        raise NotImplementedError
+
+    def bytes_per_vector(self) -> float:
+        """Code size per stored vector."""
+        raise NotImplementedError
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Trained parameters to persist alongside the codes."""
+        return {}
+
+    def restore(self, state: Dict[str, np.ndarray]):
+        """Load trained parameters saved by `state`."""
+
+
+def _chunked_scores(rows: int, queries: np.ndarray, score_chunk) -> np.ndarray:
+    """Fill a (rows, queries) score matrix chunk by chunk."""
+    scores = np.empty((rows, queries.shape[0]), dtype=np.float32)
+    for start in range(0, rows, SCORE_CHUNK_ROWS):
+        stop = min(start + SCORE_CHUNK_ROWS, rows)
+        scores[start:stop] = score_chunk(start, stop)
+    return scores
+
+
+class Float16Codec(EmbeddingCodec):
+    """Half-precision storage: 2 bytes per dimension."""
+
+    name = "float16"
+
+    def encode(self, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+        return {"codes": np.asarray(vectors, dtype=np.float16)}
+
+    def score(self, codes: Dict[str, np.ndarray], queries: np.ndarray) -> np.ndarray:
+        matrix = codes["codes"]
+        return _chunked_scores(
+            matrix.shape[0], queries,
+            lambda start, stop: matrix[start:stop].astype(np.float32) @ queries.T,
+        )
+
+    def bytes_per_vector(self) -> float:
+        return 2.0 * self.dimension
+
+
+class Int8Codec(EmbeddingCodec):
+    """Symmetric int8 with one float32 scale per vector: ~1 byte per dimension."""
+
+    name = "int8"
+
+    def encode(self, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return {"codes": codes, "scales": scales.astype(np.float32)}
+
+    def score(self, codes: Dict[str, np.ndarray], queries: np.ndarray) -> np.ndarray:
+        matrix, scales = codes["codes"], codes["scales"]
+        return _chunked_scores(
+            matrix.shape[0], queries,
+            lambda start, stop: (matrix[start:stop].astype(np.float32) @ queries.T)
+            * scales[start:stop, None],
+        )
+
+    def bytes_per_vector(self) -> float:
+        return self.dimension + 4.0
+
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int, rng) -> np.ndarray:
+    """Plain (euclidean) k-means returning centroids."""
+    n_clusters = min(n_clusters, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        distances = (
+            (vectors ** 2).sum(axis=1, keepdims=True)
+            - 2.0 * vectors @ centroids.T
+            + (centroids ** 2).sum(axis=1)
+        )
+        assignments = np.argmin(distances, axis=1)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        if (~filled).any():
+            centroids[~filled] = vectors[rng.choice(vectors.shape[0], int((~filled).sum()))]
+    return centroids
+
+
+class ProductQuantizer(EmbeddingCodec):
+    """Product quantization: one byte per sub-vector, scored with lookup tables."""
+
+    name = "pq"
+    requires_training = True
+
+    def __init__(self, dimension: int, n_subvectors: int = 48, n_centroids: int = 256):
+        """Initialize untrained PQ codec."""
+        super().__init__(dimension)
+        if dimension % n_subvectors != 0:
+            raise ValueError(
+                f"Dimension {dimension} is not divisible into {n_subvectors} sub-vectors"
+            )
+        if n_centroids > 256:
+            raise ValueError("PQ codes are stored as uint8; n_centroids must be <= 256")
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.sub_dim = dimension // n_subvectors
+        self.codebooks = None  # (n_subvectors, n_centroids, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def train(self, vectors: np.ndarray, n_iter: int = 15, seed: int = 0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        codebooks = np.zeros((self.n_subvectors, self.n_centroids, self.sub_dim), dtype=np.float32)
+        for m in range(self.n_subvectors):
+            sub = vectors[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            centroids = _kmeans(sub, self.n_centroids, n_iter, rng)
+            codebooks[m, :centroids.shape[0]] = centroids
+        self.codebooks = codebooks
+        logger.info(f"Trained PQ codebooks: {self.n_subvectors}x{self.n_centroids} on {len(vectors)} vectors")
+
+    def encode(self, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+        if not self.trained:
+            raise RuntimeError("ProductQuantizer must be trained before encoding")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty((vectors.shape[0], self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            sub = vectors[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            book = self.codebooks[m]
+            distances = -2.0 * sub @ book.T + (book ** 2).sum(axis=1)
+            codes[:, m] = np.argmin(distances, axis=1)
+        return {"codes": codes}
+
+    def score(self, codes: Dict[str, np.ndarray], queries: np.ndarray) -> np.ndarray:
+        matrix = codes["codes"]
+        sub_queries = queries.reshape(queries.shape[0], self.n_subvectors, self.sub_dim)
+        # tables[q, m, c] = <query q sub-vector m, centroid c of sub-space m>
+        tables = np.einsum("qmd,mcd->qmc", sub_queries, self.codebooks)
+        subspaces = np.arange(self.n_subvectors)
+
+        def score_chunk(start, stop):
+            chunk = matrix[start:stop]
+            return np.stack(
+                [table[subspaces, chunk].sum(axis=1) for table in tables], axis=1
+            )
+
+        return _chunked_scores(matrix.shape[0], queries, score_chunk)
+
+    def bytes_per_vector(self) -> float:
+        return float(self.n_subvectors)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks} if self.trained else {}
+
+    def restore(self, state: Dict[str, np.ndarray]):
+        if "codebooks" in state:
+            self.codebooks = np.asarray(state["codebooks"], dtype=np.float32)
+
+
+def create_codec(mode: str, dimension: int, pq_subvectors: int = 48) -> EmbeddingCodec:
+    """Build a codec by name (float16, int8 or pq)."""
+    mode = mode.lower()
+    if mode == Float16Codec.name:
+        return Float16Codec(dimension)
+    if mode == Int8Codec.name:
+        return Int8Codec(dimension)
+    if mode == ProductQuantizer.name:
+        return ProductQuantizer(dimension, n_subvectors=pq_subvectors)
+    raise ValueError(f"Unknown embedding quantization '{mode}', expected float16, int8 or pq")
+
+
+def quantization_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    top_k: int = 10,
+    modes: Sequence[str] = ("float16", "int8", "pq"),
+    rerank_factor: int = 4,
+    pq_subvectors: int = 48,
+) -> List[Dict[str, Any]]:
+    """Compare recall@k and memory of each codec against exact float32 search.
+
+    `vectors` and `queries` must be L2-normalized. Recall is reported both
+    for the compressed scores alone and after exact re-ranking of a
+    `rerank_factor * top_k` shortlist.
+    """
+    from app.services.vector_index import top_k_indices
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    exact_scores = vectors @ queries.T
+    truth = [set(top_k_indices(exact_scores[:, q], top_k).tolist()) for q in range(len(queries))]
+
+    report = [{
+        "mode": "float32",
+        "bytes_per_vector": 4.0 * vectors.shape[1],
+        "memory_mb": vectors.nbytes / 1e6,
+        "recall": 1.0,
+        "recall_reranked": 1.0,
+        "score_ms": 0.0,
+    }]
+
+    for mode in modes:
+        codec = create_codec(mode, vectors.shape[1], pq_subvectors)
+        if codec.requires_training:
+            codec.train(vectors)
+        codes = codec.encode(vectors)
+
+        started = time.perf_counter()
+        approx = codec.score(codes, queries)
+        score_ms = (time.perf_counter() - started) * 1000
+
+        hits = hits_reranked = 0
+        for q in range(len(queries)):
+            found = top_k_indices(approx[:, q], top_k)
+            hits += len(truth[q] & set(found.tolist()))
+            shortlist = top_k_indices(approx[:, q], top_k * rerank_factor)
+            reranked = shortlist[top_k_indices(exact_scores[shortlist, q], top_k)]
+            hits_reranked += len(truth[q] & set(reranked.tolist()))
+
+        total = top_k * len(queries)
+        report.append({
+            "mode": mode,
+            "bytes_per_vector": codec.bytes_per_vector(),
+            "memory_mb": sum(arr.nbytes for arr in codes.values()) / 1e6,
+            "recall": hits / total,
+            "recall_reranked": hits_reranked / total,
+            "score_ms": score_ms,
+        })
+
+    return report
@@ -1,70 +1,100 @@
 """Task queue service with Celery fallback."""
 import logging
 import asyncio
-from typing import Dict, Any
+import itertools
+import time
+from typing import Dict, Any, Optional, Tuple
+from app.models import JobStatus
+from app.services.task_status import TaskStatusStore
 
 logger = logging.getLogger(__name__)
 
 
 class TaskQueueService:
-    """Abstract task queue service."""
+    """In-process task queue used when Redis is unavailable.
+    
+    Each task type has its own priority queue, so consumers block on the
+    type they handle instead of polling and re-queuing other types. Tasks
+    are served by priority (higher first), then in enqueue order.
+    """
     
     def __init__(self):
         """Initialize task queue."""
-        self.tasks = {}
-        self.queue = asyncio.Queue()
+        self.tasks = TaskStatusStore()
+        self.queues: Dict[str, asyncio.PriorityQueue] = {}
+        self._sequence = itertools.count()
+        self._loop = None
+    
+    def _queue(self, task_type: str) -> asyncio.PriorityQueue:
+        """Queue for `task_type`, bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Queues cannot be awaited from another loop; move pending tasks over
+            queues = {}
+            for name, old in self.queues.items():
+                queues[name] = asyncio.PriorityQueue()
+                while not old.empty():
+                    queues[name].put_nowait(old.get_nowait())
+            self.queues = queues
+            self._loop = loop
+        if task_type not in self.queues:
+            self.queues[task_type] = asyncio.PriorityQueue()
+        return self.queues[task_type]
     
-    async def enqueue(self, task_type: str, task_id: str, payload: Dict[str, Any]) -> str:
-        """Enqueue a task."""
+    async def enqueue(self, task_type: str, task_id: str, payload: Dict[str, Any], priority: int = 0) -> str:
+        """Enqueue a task; higher `priority` tasks are dequeued first."""
         try:
-            await self.queue.put({
+            enqueued_at = time.time()
+            self.tasks.set(task_id, JobStatus.PENDING, enqueued_at=enqueued_at)
+            self._queue(task_type).put_nowait((-priority, next(self._sequence), {
                 "task_type": task_type,
                 "task_id": task_id,
                 "payload": payload,
-            })
-            self.tasks[task_id] = {"status": "pending", "payload": payload}
+                "enqueued_at": enqueued_at,
+            }))
             logger.info(f"Enqueued task {task_id}: {task_type}")
             return task_id
         except Exception as e:
             logger.error(f"Failed to enqueue task: {e}")
             raise
     
-    async def dequeue(self, task_type: str = None):
-        """Dequeue a task, optionally filtered by type."""
-        try:
-            if self.queue.empty():
-                return None
-            
-            task = await asyncio.wait_for(self.queue.get(), timeout=0.5)
-            
-            # Filter by type if specified
-            if task_type and task.get("task_type") != task_type:
-                # Put it back if type doesn't match
-                await self.queue.put(task)
-                return None
-            
-            task_id = task.get("task_id")
-            if task_id:
-                self.tasks[task_id]["status"] = "processing"
-            
-            return task_id, task.get("payload")
+    async def dequeue(
+        self, task_type: str, timeout: Optional[float] = None
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Wait for the next task of `task_type`.
         
-        except asyncio.TimeoutError:
-            return None
-        except Exception as e:
-            logger.error(f"Failed to dequeue task: {e}")
+        Blocks until a task arrives, or up to `timeout` seconds (0 = don't
+        wait); returns (task_id, payload), or None on timeout.
+        """
+        queue = self._queue(task_type)
+        try:
+            if timeout is None:
+                _, _, task = await queue.get()
+            elif timeout <= 0:
+                _, _, task = queue.get_nowait()
+            else:
+                _, _, task = await asyncio.wait_for(queue.get(), timeout)
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
             return None
+        
+        task_id = task.get("task_id")
+        self.tasks.set(task_id, JobStatus.PROCESSING, enqueued_at=task["enqueued_at"], started_at=time.time())
+        
+        return task_id, task.get("payload")
+    
+    def qsize(self, task_type: str) -> int:
+        """Number of queued tasks of `task_type`."""
+        queue = self.queues.get(task_type)
+        return queue.qsize() if queue is not None else 0
     
     def get_task_status(self, task_id: str) -> Dict[str, Any]:
-        """Get task status."""
-        return self.tasks.get(task_id, {"status": "not_found"})
+        """Get task status (statuses expire after TASK_STATUS_TTL)."""
+        return self.tasks.get(task_id) or {"status": "not_found"}
     
     def update_task_status(self, task_id: str, status: str, result: Dict[str, Any] = None):
-        """Update task status."""
+        """Update task status, keeping a summary of `result`."""
         if task_id in self.tasks:
-            self.tasks[task_id]["status"] = status
-            if result:
-                self.tasks[task_id]["result"] = result
+            self.tasks.set(task_id, status, result, finished_at=time.time())
 
 
 task_queue_service = TaskQueueService()
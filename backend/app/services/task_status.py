@@ -0,0 +1,120 @@
+"""Bounded in-process task status store with TTL expiry."""
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.models import JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Longest string kept in a result summary
+RESULT_MAX_CHARS = 256
+
+
+def summarize_result(result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Scalar fields of a task result, long strings truncated; nested values are dropped."""
+    if not result:
+        return None
+    summary = {}
+    for key, value in result.items():
+        if isinstance(value, str):
+            summary[key] = value[:RESULT_MAX_CHARS]
+        elif value is None or isinstance(value, (bool, int, float)):
+            summary[key] = value
+    return summary
+
+
+def _record_size(task_id: str, record: Dict[str, Any]) -> int:
+    size = sys.getsizeof(task_id) + sys.getsizeof(record)
+    for value in record.values():
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return size
+
+
+class TaskStatusStore:
+    """Compact task statuses that expire, like the workers' task_result keys.
+
+    A record holds the status, its timestamps and a small result summary,
+    never the task payload. Each write renews the record's TTL; expired
+    records are purged on write and on read, and once `max_entries` is
+    reached the least recently written records are evicted.
+    """
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        """Initialize empty store."""
+        self.ttl = ttl or settings.TASK_STATUS_TTL
+        self.max_entries = max_entries or settings.TASK_STATUS_MAX_ENTRIES
+        self.nbytes = 0
+        self.expired = 0
+        self.evicted = 0
+        # task_id -> (expires_at, record), oldest write first
+        self._records: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, task_id: str) -> bool:
+        return self.get(task_id) is not None
+
+    def _pop(self, task_id: str):
+        _, record = self._records.pop(task_id)
+        self.nbytes -= _record_size(task_id, record)
+
+    def _purge(self, now: float):
+        # Every write renews the TTL, so records expire in write order
+        while self._records:
+            task_id, (expires_at, _) = next(iter(self._records.items()))
+            if expires_at > now:
+                break
+            self._pop(task_id)
+            self.expired += 1
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Copy of a task's record, or None if unknown or expired."""
+        with self._lock:
+            entry = self._records.get(task_id)
+            if entry is None:
+                return None
+            expires_at, record = entry
+            if expires_at <= time.time():
+                self._pop(task_id)
+                self.expired += 1
+                return None
+            return dict(record)
+
+    def set(self, task_id: str, status: JobStatus, result: Dict[str, Any] = None, **timestamps: float):
+        """Write a task's status, merging `timestamps` (e.g. enqueued_at) and a result summary."""
+        now = time.time()
+        with self._lock:
+            record = {}
+            if task_id in self._records:
+                record = self._records[task_id][1]
+                self._pop(task_id)
+            record = dict(record, status=JobStatus(status), **timestamps)
+            summary = summarize_result(result)
+            if summary is not None:
+                record["result"] = summary
+            self._records[task_id] = (now + self.ttl, record)
+            self.nbytes += _record_size(task_id, record)
+
+            self._purge(now)
+            while len(self._records) > self.max_entries:
+                self._pop(next(iter(self._records)))
+                self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, approximate memory use and expiry/eviction counters."""
+        return {
+            "entries": len(self._records),
+            "max_entries": self.max_entries,
+            "memory_bytes": self.nbytes,
+            "ttl_seconds": self.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,161 @@
+"""Upload spooling and claim-check payloads for queued ingest."""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict
+import aiofiles
+from fastapi import UploadFile
+from app.config import settings
+from app.services.extraction import ExtractionInterrupted, ExtractionTimeout, pdf_extractor
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds UPLOAD_MAX_BYTES."""
+
+
+def spool_dir() -> str:
+    """Absolute spool directory shared by the API and workers."""
+    return os.path.abspath(settings.UPLOAD_SPOOL_DIR)
+
+
+async def spool_upload(file: UploadFile, directory: str = None) -> Dict[str, Any]:
+    """Stream an upload to the spool directory, hashing it on the way.
+
+    Returns the claim-check reference that is queued instead of the content:
+    path, sha256, size, content type and filename.
+    """
+    directory = directory or spool_dir()
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.basename(file.filename or "upload")
+    extension = os.path.splitext(filename)[1].lower()
+    path = os.path.join(directory, f"{uuid.uuid4().hex}{extension}")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise UploadTooLarge(f"{filename} exceeds {settings.UPLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return {
+        "path": path,
+        "sha256": digest.hexdigest(),
+        "size": size,
+        "content_type": file.content_type or "application/octet-stream",
+        "filename": filename,
+    }
+
+
+def _spooled_path(upload: Dict[str, Any]) -> str:
+    """Path of a spooled upload, refusing anything outside the spool directory."""
+    path = os.path.abspath(upload["path"])
+    if os.path.commonpath([path, spool_dir()]) != spool_dir():
+        raise ValueError(f"Upload path {upload['path']} is outside the spool directory")
+    return path
+
+
+def extract_text(path: str, filename: str) -> str:
+    """Parse a spooled file into text by its extension (PDFs in this process)."""
+    with open(path, "rb") as f:
+        content = f.read()
+
+    if filename.endswith('.pdf'):
+        try:
+            import PyPDF2
+            from io import BytesIO
+            pdf_reader = PyPDF2.PdfReader(BytesIO(content))
+            return '\n'.join(page.extract_text() or '' for page in pdf_reader.pages)
+        except Exception as e:
+            logger.warning(f"PDF parsing failed for {filename}: {e}")
+            return content.decode('utf-8', errors='ignore')
+    if filename.endswith('.txt'):
+        return content.decode('utf-8')
+    if filename.endswith('.json'):
+        try:
+            return json.dumps(json.loads(content.decode('utf-8')))
+        except json.JSONDecodeError:
+            return content.decode('utf-8', errors='ignore')
+    return content.decode('utf-8', errors='ignore')
+
+
+def upload_payload(upload: Dict[str, Any]) -> Dict[str, Any]:
+    """Queue payload for a spooled upload (a reference, not the content)."""
+    return {
+        "title": upload["filename"],
+        "upload": upload,
+        "metadata": {
+            "source": "batch_upload",
+            "filename": upload["filename"],
+            "size": upload["size"],
+            "sha256": upload["sha256"],
+        },
+    }
+
+
+def resolve_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Ingest payload with the text of its spooled upload loaded (blocking I/O).
+
+    Payloads without an upload reference are returned unchanged.
+    """
+    upload = payload.get("upload")
+    if not upload:
+        return payload
+    path = _spooled_path(upload)
+    resolved = {key: value for key, value in payload.items() if key != "upload"}
+    resolved["content"] = extract_text(path, upload["filename"])
+    return resolved
+
+
+async def resolve_payload_async(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Like resolve_payload, with PDFs extracted on the process pool by page range."""
+    upload = payload.get("upload")
+    if not upload:
+        return payload
+    path = _spooled_path(upload)
+    if not upload["filename"].endswith('.pdf'):
+        return await asyncio.to_thread(resolve_payload, payload)
+
+    resolved = {key: value for key, value in payload.items() if key != "upload"}
+    try:
+        resolved["content"] = await pdf_extractor.extract(path)
+    except (ExtractionTimeout, ExtractionInterrupted):
+        # The file may be fine; fail the task rather than store undecoded bytes
+        raise
+    except Exception as e:
+        logger.warning(f"PDF parsing failed for {upload['filename']}: {e}")
+        resolved["content"] = await asyncio.to_thread(_read_lossy, path)
+    return resolved
+
+
+def _read_lossy(path: str) -> str:
+    with open(path, "rb") as f:
+        return f.read().decode('utf-8', errors='ignore')
+
+
+def discard_upload(payload: Dict[str, Any]):
+    """Delete the spooled file of a processed payload."""
+    upload = payload.get("upload") if isinstance(payload, dict) else None
+    if not upload:
+        return
+    try:
+        os.remove(_spooled_path(upload))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to remove spooled upload {upload.get('path')}: {e}")
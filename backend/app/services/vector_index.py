@@ -0,0 +1,1184 @@
+"""In-memory vector index for document embeddings."""
+import heapq
+import logging
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Collection, Dict, Iterable, List, NamedTuple, Optional, Tuple, Sequence
+import numpy as np
+from app.db import SessionLocal, Document, decode_embedding
+from app.services.metadata_index import MetadataIndex
+from app.services.embedding_store import EmbeddingSegment, embedding_store
+from app.services.quantization import create_codec
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows of a float32 matrix (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Return indices of the top_k highest scores, best first."""
+    n = scores.shape[0]
+    if top_k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < n:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[str, float]]], k: int = 60
+) -> List[Tuple[str, float]]:
+    """Fuse several ranked (doc_id, score) lists with reciprocal-rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the lists it appears in,
+    so documents ranked well by several queries rise to the top.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _score) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _clip_candidates(candidates: Optional[np.ndarray], n: int) -> Optional[np.ndarray]:
+    """Drop candidate rows not yet visible in an n-row snapshot."""
+    if candidates is None:
+        return None
+    candidates = np.asarray(candidates, dtype=np.int64)
+    return candidates[:np.searchsorted(candidates, n)]
+
+
+class FlatVectorIndex:
+    """Exact cosine search over a contiguous matrix of normalized embeddings.
+
+    Rows live in a preallocated float32 buffer that grows geometrically, so
+    incremental adds are amortized O(1) and a search is a single
+    matrix-vector product followed by an argpartition top-k.
+    """
+
+    kind = "flat"
+
+    def __init__(self, dimension: int = None, initial_capacity: int = 1024):
+        """Initialize empty index."""
+        self.dimension = dimension or settings.EMBEDDING_DIMENSION
+        self._matrix = np.zeros((initial_capacity, self.dimension), dtype=np.float32)
+        self._ids: List[str] = []
+        self._id_to_row = {}
+        self.metadata = MetadataIndex()
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_row
+
+    def _reserve(self, extra: int):
+        """Grow the backing buffer to fit `extra` more rows."""
+        needed = len(self._ids) + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity = max(capacity * 2, 1)
+        grown = np.zeros((capacity, self.dimension), dtype=np.float32)
+        grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = grown
+
+    def _check_dimension(self, vectors: np.ndarray):
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dimension}"
+            )
+
+    def _claim_new(self, doc_ids: Sequence[str]) -> List[int]:
+        """Reserve ids not yet indexed; returns their positions in `doc_ids`."""
+        keep = []
+        for i, doc_id in enumerate(doc_ids):
+            if doc_id not in self._id_to_row:
+                self._id_to_row[doc_id] = -1  # reserve; also dedups within the batch
+                keep.append(i)
+        return keep
+
+    def _commit_rows(
+        self, doc_ids: Sequence[str], keep: List[int], start: int, metadatas: Sequence[Dict] = None
+    ):
+        """Publish claimed rows; metadata is indexed before the row becomes searchable."""
+        for offset, i in enumerate(keep):
+            row = start + offset
+            self.metadata.add(row, metadatas[i] if metadatas is not None else None)
+            self._id_to_row[doc_ids[i]] = row
+            self._ids.append(doc_ids[i])
+
+    def add(self, doc_ids: Sequence[str], vectors, metadatas: Sequence[Dict] = None) -> int:
+        """Add embeddings (and their doc metadata) to the index, skipping ids already present."""
+        vectors = normalize_rows(vectors)
+        self._check_dimension(vectors)
+
+        with self._lock:
+            keep = self._claim_new(doc_ids)
+            if not keep:
+                return 0
+
+            self._reserve(len(keep))
+            start = len(self._ids)
+            self._matrix[start:start + len(keep)] = vectors[keep]
+            self._commit_rows(doc_ids, keep, start, metadatas)
+            return len(keep)
+
+    def resolve_scope(self, scope: Optional[str]) -> Optional[np.ndarray]:
+        """Rows matching a scope expression, or None when unscoped."""
+        if not scope or not scope.strip():
+            return None
+        return self.metadata.filter(scope, universe=len(self))
+
+    def rows_for(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """Sorted rows of the given documents, usable as search candidates."""
+        with self._lock:
+            rows = [self._id_to_row.get(doc_id, -1) for doc_id in doc_ids]
+        return np.unique(np.asarray([row for row in rows if row >= 0], dtype=np.int64))
+
+    def search(self, query, top_k: int = 10, candidates: np.ndarray = None) -> List[Tuple[str, float]]:
+        """Return (doc_id, cosine score) pairs for the top_k nearest documents."""
+        return self.search_batch(normalize_rows(query)[:1], top_k, candidates=candidates)[0]
+
+    def search_batch(
+        self, queries, top_k: int = 10, candidates: np.ndarray = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Search several queries at once with a single (D x Q) matrix product.
+
+        `candidates` (sorted row ids, e.g. from `resolve_scope`) restricts
+        scoring to those rows, so a scoped search costs O(len(candidates)).
+        """
+        query_matrix = normalize_rows(queries)
+
+        # Snapshot under the lock; growth reallocates, so the view stays valid
+        with self._lock:
+            n = len(self._ids)
+            matrix = self._matrix[:n]
+            ids = self._ids
+
+        rows = _clip_candidates(candidates, n)
+        if n == 0 or (rows is not None and rows.size == 0):
+            return [[] for _ in range(query_matrix.shape[0])]
+
+        scores = (matrix if rows is None else matrix[rows]) @ query_matrix.T
+        results = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            best = top_k_indices(column_scores, top_k)
+            row_ids = best if rows is None else rows[best]
+            results.append([(ids[r], float(column_scores[i])) for r, i in zip(row_ids, best)])
+        return results
+
+    def load_from_db(self, batch_size: int = 5000, exclude: Collection[str] = ()) -> int:
+        """Load stored document embeddings that are not yet in the index (or in `exclude`)."""
+        db = SessionLocal()
+        loaded = 0
+        try:
+            missing = [
+                doc_id for (doc_id,) in db.query(Document.id).yield_per(batch_size)
+                if doc_id not in self and doc_id not in exclude
+            ]
+            for start in range(0, len(missing), batch_size):
+                chunk = missing[start:start + batch_size]
+                rows = db.query(
+                    Document.id, Document.embedding, Document.embedding_dim, Document.doc_metadata
+                ).filter(Document.id.in_(chunk)).all()
+                batch_ids, batch_vecs, batch_meta = [], [], []
+                for doc_id, raw_embedding, dim, doc_metadata in rows:
+                    if not raw_embedding:
+                        continue
+                    try:
+                        batch_vecs.append(decode_embedding(raw_embedding, dim))
+                        batch_ids.append(doc_id)
+                        batch_meta.append(doc_metadata)
+                    except Exception as e:
+                        logger.warning(f"Skipping unreadable embedding for doc {doc_id}: {e}")
+                if batch_ids:
+                    loaded += self.add(batch_ids, np.stack(batch_vecs), batch_meta)
+        finally:
+            db.close()
+
+        self.loaded = True
+        logger.info(f"Vector index loaded {loaded} embeddings ({len(self)} total)")
+        return loaded
+
+    def ensure_loaded(self, path: str = None):
+        """Restore the index from disk if possible, then catch up from the database."""
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            path = path if path is not None else settings.VECTOR_INDEX_PATH
+            restored = False
+            if path and os.path.exists(path):
+                try:
+                    self.load(path)
+                    restored = True
+                except Exception as e:
+                    logger.warning(f"Failed to restore vector index from {path}: {e}")
+                    self.clear()
+            added = self.load_from_db()
+            if path and (added or not restored):
+                self.save(path)
+
+    def clear(self):
+        """Drop all rows from the index."""
+        with self._lock:
+            self._matrix = np.zeros((1024, self.dimension), dtype=np.float32)
+            self._ids = []
+            self._id_to_row = {}
+            self.metadata.clear()
+            self.loaded = False
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        """Arrays that make up the persisted index."""
+        n = len(self._ids)
+        return {
+            "kind": np.array(self.kind),
+            "dimension": np.array(self.dimension),
+            "matrix": self._matrix[:n],
+            "ids": np.array(self._ids, dtype=str),
+            **self.metadata.state(),
+        }
+
+    def _restore(self, state: Dict[str, np.ndarray]):
+        """Rebuild in-memory structures from persisted arrays."""
+        matrix = np.asarray(state["matrix"], dtype=np.float32)
+        ids = [str(doc_id) for doc_id in state["ids"]]
+        self._matrix = np.zeros((max(len(ids), 1024), self.dimension), dtype=np.float32)
+        self._matrix[:len(ids)] = matrix
+        self._ids = ids
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(ids)}
+        self.metadata.restore(state)
+
+    def save(self, path: str = None):
+        """Persist the index to a .npz file (written atomically)."""
+        path = path or settings.VECTOR_INDEX_PATH
+        if not path:
+            return
+        with self._lock:
+            state = self._state()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **state)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {self.kind} vector index ({len(self)} rows) to {path}")
+
+    def load(self, path: str = None):
+        """Load a previously saved index from disk."""
+        path = path or settings.VECTOR_INDEX_PATH
+        with np.load(path, allow_pickle=False) as data:
+            state = {key: data[key] for key in data.files}
+        if str(state["kind"]) != self.kind:
+            raise ValueError(f"Saved index is '{state['kind']}', expected '{self.kind}'")
+        if int(state["dimension"]) != self.dimension:
+            raise ValueError(
+                f"Saved index dimension {int(state['dimension'])} does not match {self.dimension}"
+            )
+        with self._lock:
+            self._restore(state)
+        logger.info(f"Restored {self.kind} vector index ({len(self)} rows) from {path}")
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 0
+) -> np.ndarray:
+    """Cluster normalized vectors by cosine similarity; returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random points
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFFlatIndex(FlatVectorIndex):
+    """Approximate search with an inverted file over k-means centroids.
+
+    Each vector is assigned to its nearest centroid; a query scores only the
+    rows in its `nprobe` closest lists. Until enough vectors exist to train
+    the centroids, search falls back to exact flat search.
+    """
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        dimension: int = None,
+        initial_capacity: int = 1024,
+        nlist: int = None,
+        nprobe: int = None,
+        min_train_size: int = None,
+    ):
+        """Initialize untrained IVF index."""
+        super().__init__(dimension, initial_capacity)
+        self.nlist = nlist or settings.IVF_NLIST
+        self.nprobe = nprobe or settings.IVF_NPROBE
+        # k-means wants a few dozen points per centroid to be meaningful
+        self.min_train_size = min_train_size or self.nlist * 39
+        self._centroids = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[np.ndarray] = []
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def train(self, sample_size: int = None, n_iter: int = 10):
+        """Fit centroids on (a sample of) the indexed vectors and rebuild the lists."""
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return
+            sample_size = sample_size or self.nlist * 256
+            rows = np.arange(n)
+            if n > sample_size:
+                rows = np.random.default_rng(0).choice(n, sample_size, replace=False)
+            self._centroids = spherical_kmeans(self._matrix[rows], self.nlist, n_iter=n_iter)
+            self._lists = [[] for _ in range(self._centroids.shape[0])]
+            self._list_arrays = []
+            self._assign(0, n)
+        logger.info(f"Trained IVF index: {self._centroids.shape[0]} lists over {n} vectors")
+
+    def _assign(self, start: int, stop: int):
+        """Assign rows [start, stop) to their nearest centroid lists."""
+        assignments = np.argmax(self._matrix[start:stop] @ self._centroids.T, axis=1)
+        for row, list_id in zip(range(start, stop), assignments):
+            self._lists[list_id].append(row)
+        # Only touched lists are re-materialized; searches hold the old arrays
+        list_arrays = list(self._list_arrays) or [None] * len(self._lists)
+        for list_id in np.unique(assignments):
+            list_arrays[list_id] = np.asarray(self._lists[list_id], dtype=np.int64)
+        self._list_arrays = [
+            arr if arr is not None else np.empty(0, dtype=np.int64) for arr in list_arrays
+        ]
+
+    def add(self, doc_ids: Sequence[str], vectors, metadatas: Sequence[Dict] = None) -> int:
+        """Add embeddings, assigning them to lists once the index is trained."""
+        with self._lock:
+            start = len(self._ids)
+            added = super().add(doc_ids, vectors, metadatas)
+            if added:
+                if self.trained:
+                    self._assign(start, start + added)
+                elif len(self._ids) >= self.min_train_size:
+                    self.train()
+            return added
+
+    def search(
+        self, query, top_k: int = 10, candidates: np.ndarray = None, nprobe: int = None
+    ) -> List[Tuple[str, float]]:
+        """Return approximate top_k neighbours, probing `nprobe` lists."""
+        return self.search_batch(normalize_rows(query)[:1], top_k, candidates, nprobe)[0]
+
+    def search_batch(
+        self, queries, top_k: int = 10, candidates: np.ndarray = None, nprobe: int = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Search several queries; centroid scoring is shared across the batch.
+
+        A candidate set smaller than what the probed lists would hold is
+        scored exactly; a larger one is intersected with the probed lists.
+        """
+        if not self.trained:
+            return super().search_batch(queries, top_k, candidates=candidates)
+
+        query_matrix = normalize_rows(queries)
+        nprobe = nprobe or self.nprobe
+
+        with self._lock:
+            n = len(self._ids)
+            centroids = self._centroids
+            list_arrays = self._list_arrays
+            matrix = self._matrix
+            ids = self._ids
+
+        rows = _clip_candidates(candidates, n)
+        if rows is not None and rows.size <= nprobe * n / max(len(list_arrays), 1):
+            return super().search_batch(query_matrix, top_k, candidates=rows)
+
+        centroid_scores = query_matrix @ centroids.T
+        results = []
+        for query_vec, row_scores in zip(query_matrix, centroid_scores):
+            probe = top_k_indices(row_scores, nprobe)
+            probed = np.concatenate([list_arrays[i] for i in probe])
+            if rows is not None:
+                probed = np.intersect1d(probed, rows, assume_unique=True)
+            scores = matrix[probed] @ query_vec
+            best = top_k_indices(scores, top_k)
+            results.append([(ids[probed[i]], float(scores[i])) for i in best])
+        return results
+
+    def clear(self):
+        """Drop all rows and centroids."""
+        with self._lock:
+            super().clear()
+            self._centroids = None
+            self._lists = []
+            self._list_arrays = []
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        state = super()._state()
+        state["nlist"] = np.array(self.nlist)
+        if self.trained:
+            n = len(self._ids)
+            assignments = np.full(n, -1, dtype=np.int64)
+            for list_id, rows in enumerate(self._list_arrays):
+                assignments[rows] = list_id
+            state["centroids"] = self._centroids
+            state["assignments"] = assignments
+        return state
+
+    def _restore(self, state: Dict[str, np.ndarray]):
+        super()._restore(state)
+        self._centroids = None
+        self._lists = []
+        self._list_arrays = []
+        if "centroids" in state:
+            self._centroids = np.asarray(state["centroids"], dtype=np.float32)
+            self._lists = [[] for _ in range(self._centroids.shape[0])]
+            for row, list_id in enumerate(state["assignments"]):
+                self._lists[int(list_id)].append(row)
+            self._list_arrays = [np.asarray(rows, dtype=np.int64) for rows in self._lists]
+
+
+class MappedVectorIndex(FlatVectorIndex):
+    """Exact search directly over a shared, memory-mapped embedding segment.
+
+    The matrix is the segment's read-only mapping, so every process on the
+    host shares one copy of the corpus in the page cache, and a restarted
+    backend can search as soon as it maps the file. Rows appended by other
+    processes (e.g. the worker) become visible on the next search.
+    """
+
+    kind = "mmap"
+
+    def __init__(self, dimension: int = None, initial_capacity: int = 1024, store: EmbeddingSegment = None):
+        """Initialize index over `store` (defaults to the configured embedding store)."""
+        super().__init__(dimension, initial_capacity=0)
+        self.store = store if store is not None else embedding_store
+        if self.store is None:
+            raise ValueError("The mmap vector index requires EMBEDDING_STORE_DIR to be set")
+        self.refresh()
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.store
+
+    def refresh(self):
+        """Pick up rows committed to the segment since the last search."""
+        with self._lock:
+            self.store.refresh()
+            self._matrix = self.store.matrix
+            self._ids = self.store.ids
+            if len(self.metadata) < len(self._ids):
+                self._index_metadata(len(self.metadata), len(self._ids))
+
+    def _index_metadata(self, start: int, stop: int, batch_size: int = 5000):
+        """Load doc metadata for segment rows [start, stop) from the database.
+
+        The segment only carries ids and vectors, so rows appended by other
+        processes get their filter postings here; on failure the rows are
+        retried on the next refresh.
+        """
+        db = SessionLocal()
+        try:
+            for chunk_start in range(start, stop, batch_size):
+                chunk = self._ids[chunk_start:min(chunk_start + batch_size, stop)]
+                found = dict(
+                    db.query(Document.id, Document.doc_metadata).filter(Document.id.in_(chunk)).all()
+                )
+                for offset, doc_id in enumerate(chunk):
+                    self.metadata.add(chunk_start + offset, found.get(doc_id))
+        except Exception as e:
+            logger.warning(f"Failed to load metadata for mapped rows {start}-{stop}: {e}")
+        finally:
+            db.close()
+
+    def add(self, doc_ids: Sequence[str], vectors, metadatas: Sequence[Dict] = None) -> int:
+        """Append normalized embeddings to the shared segment.
+
+        Metadata is read back from the database on refresh, like rows
+        appended by any other process.
+        """
+        vectors = normalize_rows(vectors)
+        self._check_dimension(vectors)
+        added = self.store.append(list(doc_ids), vectors)
+        self.refresh()
+        return added
+
+    def search_batch(
+        self, queries, top_k: int = 10, candidates: np.ndarray = None
+    ) -> List[List[Tuple[str, float]]]:
+        self.refresh()
+        return super().search_batch(queries, top_k, candidates=candidates)
+
+    def resolve_scope(self, scope: Optional[str]) -> Optional[np.ndarray]:
+        self.refresh()
+        return super().resolve_scope(scope)
+
+    def rows_for(self, doc_ids: Iterable[str]) -> np.ndarray:
+        self.refresh()
+        rows = [self.store.row_of(doc_id) for doc_id in doc_ids]
+        return np.unique(np.asarray([row for row in rows if row is not None], dtype=np.int64))
+
+    def ensure_loaded(self, path: str = None):
+        """Backfill rows that predate the segment; the segment itself is the persisted form."""
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                self.load_from_db()
+
+    def clear(self):
+        """Forget the mapping; the segment on disk is left untouched."""
+        with self._lock:
+            self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+            self._ids = []
+            self.metadata.clear()
+            self.loaded = False
+
+    def save(self, path: str = None):
+        """Rows are already durable in the segment."""
+
+
+class QuantizedVectorIndex(FlatVectorIndex):
+    """Search over compressed codes, re-ranking a shortlist at full precision.
+
+    Codes (float16, int8 or PQ) are the only per-vector data held in RAM.
+    Each query scores every code, keeps `rerank_factor * top_k` candidates
+    and re-scores them with full-precision vectors read from the shared
+    embedding segment when configured, otherwise from the database. PQ needs
+    trained codebooks, so until `min_train_size` rows arrive the index
+    stores raw vectors and searches exactly.
+    """
+
+    kind = "quantized"
+
+    def __init__(
+        self,
+        dimension: int = None,
+        initial_capacity: int = 1024,
+        quantization: str = None,
+        rerank_factor: int = None,
+        min_train_size: int = None,
+        store: EmbeddingSegment = None,
+    ):
+        """Initialize index with the configured codec."""
+        super().__init__(dimension, initial_capacity)
+        self.codec = create_codec(
+            quantization or settings.EMBEDDING_QUANTIZATION, self.dimension, settings.PQ_SUBVECTORS
+        )
+        self.rerank_factor = rerank_factor or settings.RERANK_FACTOR
+        self.min_train_size = min_train_size or settings.PQ_TRAIN_SIZE
+        self.store = store if store is not None else embedding_store
+        self._codes: Dict[str, np.ndarray] = {}
+        if self.codec.trained:
+            self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+
+    def _append_codes(self, encoded: Dict[str, np.ndarray], start: int):
+        """Write encoded rows at `start`, growing code buffers geometrically."""
+        for name, rows in encoded.items():
+            buffer = self._codes.get(name)
+            needed = start + rows.shape[0]
+            if buffer is None or buffer.shape[0] < needed:
+                capacity = max(needed, 2 * (buffer.shape[0] if buffer is not None else 512))
+                grown = np.zeros((capacity,) + rows.shape[1:], dtype=rows.dtype)
+                if buffer is not None:
+                    grown[:start] = buffer[:start]
+                buffer = grown
+            buffer[start:needed] = rows
+            self._codes[name] = buffer
+
+    def _train(self):
+        """Train the codec on the raw rows collected so far and switch to codes."""
+        n = len(self._ids)
+        self.codec.train(self._matrix[:n])
+        self._codes = {}
+        self._append_codes(self.codec.encode(self._matrix[:n]), 0)
+        self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+
+    def add(self, doc_ids: Sequence[str], vectors, metadatas: Sequence[Dict] = None) -> int:
+        """Encode and add embeddings, skipping ids already present."""
+        with self._lock:
+            if not self.codec.trained:
+                added = super().add(doc_ids, vectors, metadatas)
+                if len(self._ids) >= self.min_train_size:
+                    self._train()
+                return added
+
+            vectors = normalize_rows(vectors)
+            self._check_dimension(vectors)
+            keep = self._claim_new(doc_ids)
+            if not keep:
+                return 0
+
+            start = len(self._ids)
+            self._append_codes(self.codec.encode(vectors[keep]), start)
+            self._commit_rows(doc_ids, keep, start, metadatas)
+            return len(keep)
+
+    def _full_vectors(self, doc_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Fetch full-precision normalized vectors for re-ranking."""
+        found: Dict[str, np.ndarray] = {}
+        if self.store is not None:
+            found.update(self.store.get_vectors(doc_ids))
+        missing = [doc_id for doc_id in doc_ids if doc_id not in found]
+        if missing:
+            db = SessionLocal()
+            try:
+                rows = db.query(
+                    Document.id, Document.embedding, Document.embedding_dim
+                ).filter(Document.id.in_(missing)).all()
+            finally:
+                db.close()
+            for doc_id, raw_embedding, dim in rows:
+                if raw_embedding:
+                    found[doc_id] = normalize_rows(decode_embedding(raw_embedding, dim))[0]
+        return found
+
+    def search_batch(
+        self, queries, top_k: int = 10, candidates: np.ndarray = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Score codes, then re-rank each query's shortlist exactly."""
+        if not self.codec.trained:
+            return super().search_batch(queries, top_k, candidates=candidates)
+
+        query_matrix = normalize_rows(queries)
+        with self._lock:
+            n = len(self._ids)
+            codes = {name: buffer[:n] for name, buffer in self._codes.items()}
+            ids = self._ids
+
+        rows = _clip_candidates(candidates, n)
+        if n == 0 or (rows is not None and rows.size == 0):
+            return [[] for _ in range(query_matrix.shape[0])]
+        if rows is not None:
+            codes = {name: buffer[rows] for name, buffer in codes.items()}
+
+        approx = self.codec.score(codes, query_matrix)
+        shortlists = [
+            top_k_indices(approx[:, q], top_k * self.rerank_factor)
+            for q in range(query_matrix.shape[0])
+        ]
+        candidate_ids = ids if rows is None else [ids[r] for r in rows]
+        full = self._full_vectors(sorted({candidate_ids[i] for short in shortlists for i in short}))
+
+        results = []
+        for q, short in enumerate(shortlists):
+            query_vec = query_matrix[q]
+            scored = []
+            for i in short:
+                doc_id = candidate_ids[i]
+                score = full[doc_id] @ query_vec if doc_id in full else approx[i, q]
+                scored.append((doc_id, float(score)))
+            scored.sort(key=lambda item: item[1], reverse=True)
+            results.append(scored[:top_k])
+        return results
+
+    def memory_bytes(self) -> int:
+        """Bytes held by codes (or raw rows before training)."""
+        n = len(self._ids)
+        if not self.codec.trained:
+            return n * self.dimension * 4
+        return sum(buffer[:n].nbytes for buffer in self._codes.values())
+
+    def clear(self):
+        """Drop all rows; trained codebooks are kept."""
+        with self._lock:
+            super().clear()
+            self._codes = {}
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        n = len(self._ids)
+        state = {
+            "kind": np.array(self.kind),
+            "dimension": np.array(self.dimension),
+            "ids": np.array(self._ids, dtype=str),
+            "codec": np.array(self.codec.name),
+            **self.metadata.state(),
+        }
+        if self.codec.trained:
+            state.update({f"code_{name}": buffer[:n] for name, buffer in self._codes.items()})
+            state.update({f"codec_{name}": value for name, value in self.codec.state().items()})
+        else:
+            state["matrix"] = self._matrix[:n]
+        return state
+
+    def _restore(self, state: Dict[str, np.ndarray]):
+        if str(state["codec"]) != self.codec.name:
+            raise ValueError(f"Saved index uses '{state['codec']}' codes, expected '{self.codec.name}'")
+        self.codec.restore({
+            key[len("codec_"):]: value for key, value in state.items() if key.startswith("codec_")
+        })
+        if "matrix" in state:
+            super()._restore(state)
+            return
+        ids = [str(doc_id) for doc_id in state["ids"]]
+        self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        self._codes = {}
+        self._append_codes(
+            {key[len("code_"):]: value for key, value in state.items() if key.startswith("code_")}, 0
+        )
+        self._ids = ids
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(ids)}
+        self.metadata.restore(state)
+
+
+class ShardedVectorIndex(FlatVectorIndex):
+    """Sub-indexes partitioned by a hash of the document id, searched in parallel.
+
+    Hashing the id keeps the shards balanced even when every document shares
+    one `shard_id` (as batch uploads do); a `shard_id:` scope is applied as
+    a metadata filter like any other field. A query fans out to every
+    non-empty shard on a thread pool (the per-shard matrix products run in
+    BLAS with the GIL released, so shards use separate cores), and the
+    per-shard top-k lists are merged with a heap.
+
+    Candidate rows returned by `resolve_scope` are global row ids encoded as
+    `local_row * n_shards + shard`, which keeps them sorted and lets a scope
+    with no matches in a shard skip it entirely.
+    """
+
+    kind = "sharded"
+
+    def __init__(
+        self,
+        dimension: int = None,
+        initial_capacity: int = 1024,
+        n_shards: int = None,
+        shard_index_type: str = None,
+        threads: int = None,
+    ):
+        """Initialize one empty sub-index per shard."""
+        super().__init__(dimension, initial_capacity=0)
+        self.n_shards = n_shards or settings.MAX_WORKERS
+        shard_index_type = (shard_index_type or settings.SHARD_INDEX_TYPE).lower()
+        if shard_index_type in (MappedVectorIndex.kind, self.kind):
+            raise ValueError(f"'{shard_index_type}' cannot be used as a per-shard index type")
+        self.shards = [
+            create_vector_index(shard_index_type, dimension=self.dimension)
+            for _ in range(self.n_shards)
+        ]
+        self.threads = threads or settings.SEARCH_THREADS or self.n_shards
+        self._executor = None
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return any(doc_id in shard for shard in self.shards)
+
+    def shard_of(self, doc_id: str) -> int:
+        """Shard index for a document, by a hash of its id."""
+        return zlib.crc32(doc_id.encode()) % self.n_shards
+
+    def add(self, doc_ids: Sequence[str], vectors, metadatas: Sequence[Dict] = None) -> int:
+        """Route embeddings to their shards."""
+        vectors = normalize_rows(vectors)
+        self._check_dimension(vectors)
+        routed: Dict[int, List[int]] = {}
+        with self._lock:
+            for i, doc_id in enumerate(doc_ids):
+                if doc_id in self:
+                    continue
+                routed.setdefault(self.shard_of(doc_id), []).append(i)
+            added = 0
+            for shard, rows in routed.items():
+                added += self.shards[shard].add(
+                    [doc_ids[i] for i in rows],
+                    vectors[rows],
+                    [metadatas[i] for i in rows] if metadatas is not None else None,
+                )
+            return added
+
+    def resolve_scope(self, scope: Optional[str]) -> Optional[np.ndarray]:
+        """Global candidate rows matching a scope, or None when unscoped."""
+        if not scope or not scope.strip():
+            return None
+        parts = [
+            shard.resolve_scope(scope) * self.n_shards + i for i, shard in enumerate(self.shards)
+        ]
+        return np.sort(np.concatenate(parts))
+
+    def rows_for(self, doc_ids: Iterable[str]) -> np.ndarray:
+        doc_ids = list(doc_ids)
+        parts = [shard.rows_for(doc_ids) * self.n_shards + i for i, shard in enumerate(self.shards)]
+        return np.sort(np.concatenate(parts))
+
+    def _split_candidates(self, candidates: Optional[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """Per-shard local rows for global candidate rows."""
+        if candidates is None:
+            return [None] * self.n_shards
+        candidates = np.asarray(candidates, dtype=np.int64)
+        shard_of_row = candidates % self.n_shards
+        return [candidates[shard_of_row == i] // self.n_shards for i in range(self.n_shards)]
+
+    def search_batch(
+        self, queries, top_k: int = 10, candidates: np.ndarray = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Search every shard concurrently and merge the per-shard top-k."""
+        query_matrix = normalize_rows(queries)
+        jobs = [
+            (shard, rows)
+            for shard, rows in zip(self.shards, self._split_candidates(candidates))
+            if len(shard) and (rows is None or rows.size)
+        ]
+        if not jobs:
+            return [[] for _ in range(query_matrix.shape[0])]
+
+        if len(jobs) == 1:
+            per_shard = [jobs[0][0].search_batch(query_matrix, top_k, candidates=jobs[0][1])]
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix="vector-shard"
+                )
+            futures = [
+                self._executor.submit(shard.search_batch, query_matrix, top_k, candidates=rows)
+                for shard, rows in jobs
+            ]
+            per_shard = [future.result() for future in futures]
+
+        # Each shard's hits are already sorted best-first
+        return [
+            list(islice(
+                heapq.merge(*(hits[q] for hits in per_shard), key=lambda hit: hit[1], reverse=True),
+                top_k,
+            ))
+            for q in range(query_matrix.shape[0])
+        ]
+
+    def clear(self):
+        """Drop all rows from every shard."""
+        with self._lock:
+            for shard in self.shards:
+                shard.clear()
+            self.loaded = False
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        state = {
+            "kind": np.array(self.kind),
+            "dimension": np.array(self.dimension),
+            "n_shards": np.array(self.n_shards),
+        }
+        for i, shard in enumerate(self.shards):
+            with shard._lock:
+                state.update({f"s{i}_{key}": value for key, value in shard._state().items()})
+        return state
+
+    def _restore(self, state: Dict[str, np.ndarray]):
+        if int(state["n_shards"]) != self.n_shards:
+            raise ValueError(
+                f"Saved index has {int(state['n_shards'])} shards, expected {self.n_shards}"
+            )
+        for i, shard in enumerate(self.shards):
+            prefix = f"s{i}_"
+            shard_state = {
+                key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)
+            }
+            if str(shard_state["kind"]) != shard.kind:
+                raise ValueError(f"Saved shard is '{shard_state['kind']}', expected '{shard.kind}'")
+            with shard._lock:
+                shard._restore(shard_state)
+
+
+class LayeredCandidates(NamedTuple):
+    """Scope matches split between a live index's main index and its delta."""
+
+    base: np.ndarray
+    delta: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return int(self.base.size + self.delta.size)
+
+
+def _merge_hits(
+    ranked_lists: Iterable[List[Tuple[str, float]]], top_k: int, removed: set
+) -> List[Tuple[str, float]]:
+    """Heap-merge best-first hit lists, dropping duplicates and removed ids."""
+    merged, seen = [], set()
+    for doc_id, score in heapq.merge(*ranked_lists, key=lambda hit: hit[1], reverse=True):
+        if doc_id in seen or doc_id in removed:
+            continue
+        seen.add(doc_id)
+        merged.append((doc_id, score))
+        if len(merged) == top_k:
+            break
+    return merged
+
+
+class LiveVectorIndex:
+    """A main index plus a small exact delta segment and tombstones.
+
+    New documents land in the delta (a plain append), so they are
+    searchable immediately whatever the main index type; `merge` folds the
+    delta into the main index in the background, where adds may be costly
+    (IVF assignment, PQ encoding, shard routing). Removed documents are
+    tombstoned and filtered from results. Queries search both layers and
+    merge the results.
+
+    Tombstones last only as long as the rows they hide: a merge drops
+    removed delta rows and their tombstones, and once
+    INDEX_COMPACT_TOMBSTONES main-index rows are removed, `compact`
+    rebuilds the main index without them.
+    """
+
+    def __init__(self, base: FlatVectorIndex):
+        """Wrap `base` as the main index."""
+        self.base = base
+        self.dimension = base.dimension
+        self.delta = FlatVectorIndex(self.dimension, initial_capacity=64)
+        self._delta_metadata: List[Optional[Dict]] = []
+        self.tombstones = set()
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+
+    @property
+    def kind(self) -> str:
+        return self.base.kind
+
+    @property
+    def loaded(self) -> bool:
+        return self.base.loaded
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.delta)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id not in self.tombstones and (doc_id in self.base or doc_id in self.delta)
+
+    def add(self, doc_ids: Sequence[str], vectors, metadatas: Sequence[Dict] = None) -> int:
+        """Append embeddings to the delta segment."""
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            self.tombstones.difference_update(doc_ids)
+            keep = [i for i, doc_id in enumerate(doc_ids) if doc_id not in self.base]
+            if not keep:
+                return 0
+            start = len(self.delta)
+            added = self.delta.add(
+                [doc_ids[i] for i in keep],
+                vectors[keep],
+                [metadatas[i] for i in keep] if metadatas is not None else None,
+            )
+            by_id = {doc_ids[i]: metadatas[i] for i in keep} if metadatas is not None else {}
+            self._delta_metadata.extend(by_id.get(doc_id) for doc_id in self.delta._ids[start:])
+            return added
+
+    def remove(self, doc_ids: Sequence[str]) -> int:
+        """Tombstone indexed documents so searches no longer return them."""
+        with self._lock:
+            before = len(self.tombstones)
+            self.tombstones.update(doc_id for doc_id in doc_ids if doc_id in self.base or doc_id in self.delta)
+            return len(self.tombstones) - before
+
+    def resolve_scope(self, scope: Optional[str]) -> Optional[LayeredCandidates]:
+        """Scope matches in both layers, or None when unscoped."""
+        if not scope or not scope.strip():
+            return None
+        with self._lock:
+            delta = self.delta
+        return LayeredCandidates(self.base.resolve_scope(scope), delta.resolve_scope(scope))
+
+    def rows_for(self, doc_ids: Iterable[str]) -> LayeredCandidates:
+        """Candidates covering the given documents in both layers."""
+        doc_ids = list(doc_ids)
+        with self._lock:
+            delta = self.delta
+        return LayeredCandidates(self.base.rows_for(doc_ids), delta.rows_for(doc_ids))
+
+    @staticmethod
+    def intersect_candidates(
+        first: Optional[LayeredCandidates], second: Optional[LayeredCandidates]
+    ) -> Optional[LayeredCandidates]:
+        """Candidates allowed by both sets (None means unrestricted)."""
+        if first is None:
+            return second
+        if second is None:
+            return first
+        return LayeredCandidates(
+            np.intersect1d(first.base, second.base, assume_unique=True),
+            np.intersect1d(first.delta, second.delta, assume_unique=True),
+        )
+
+    def search(
+        self, query, top_k: int = 10, candidates: LayeredCandidates = None
+    ) -> List[Tuple[str, float]]:
+        """Return (doc_id, cosine score) pairs for the top_k nearest documents."""
+        return self.search_batch(normalize_rows(query)[:1], top_k, candidates=candidates)[0]
+
+    def search_batch(
+        self, queries, top_k: int = 10, candidates: LayeredCandidates = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Search the main index and the delta, merging their top-k lists."""
+        query_matrix = normalize_rows(queries)
+        with self._lock:
+            base = self.base
+            delta = self.delta
+            removed = set(self.tombstones)
+        base_rows, delta_rows = candidates if candidates is not None else (None, None)
+        # Over-fetch each layer by the removed rows it can still return
+        in_delta = sum(1 for doc_id in removed if doc_id in delta)
+        empty = [[] for _ in range(query_matrix.shape[0])]
+
+        base_hits = delta_hits = empty
+        if base_rows is None or base_rows.size:
+            base_hits = base.search_batch(query_matrix, top_k + len(removed) - in_delta, candidates=base_rows)
+        if len(delta) and (delta_rows is None or delta_rows.size):
+            delta_hits = delta.search_batch(query_matrix, top_k + in_delta, candidates=delta_rows)
+        return [_merge_hits((b, d), top_k, removed) for b, d in zip(base_hits, delta_hits)]
+
+    def merge(self) -> int:
+        """Fold the delta segment into the main index, compacting it when tombstones pile up.
+
+        Returns rows merged.
+        """
+        merged = self._merge_delta()
+        if self.needs_compaction():
+            self.compact()
+        return merged
+
+    def needs_compaction(self) -> bool:
+        """Whether enough rows are tombstoned to rebuild the main index without them."""
+        return self.base.kind != MappedVectorIndex.kind and len(self.tombstones) >= settings.INDEX_COMPACT_TOMBSTONES
+
+    def _merge_delta(self) -> int:
+        """Fold the delta segment into the main index; returns rows merged.
+
+        Rows are added to the main index before the delta is swapped, so a
+        concurrent search may see a document in both layers (results are
+        de-duplicated) but never in neither.
+        """
+        with self._merge_lock:
+            with self._lock:
+                delta = self.delta
+                n = len(delta)
+                if n == 0:
+                    return 0
+                ids = delta._ids[:n]
+                vectors = delta._matrix[:n].copy()
+                metadatas = self._delta_metadata[:n]
+                removed = set(self.tombstones)
+
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in removed]
+            if keep:
+                self.base.add([ids[i] for i in keep], vectors[keep], [metadatas[i] for i in keep])
+
+            with self._lock:
+                # Carry over rows that arrived while the main index was updating
+                fresh = FlatVectorIndex(self.dimension, initial_capacity=64)
+                tail = len(self.delta) - n
+                if tail:
+                    fresh.add(self.delta._ids[n:], self.delta._matrix[n:n + tail], self._delta_metadata[n:])
+                self.delta = fresh
+                self._delta_metadata = self._delta_metadata[n:]
+                # Removed delta rows are gone now; keep tombstones only for rows still indexed
+                self.tombstones.difference_update(
+                    doc_id for doc_id in removed.intersection(ids) if doc_id not in self.base and doc_id not in fresh
+                )
+        logger.info(f"Merged {len(keep)} delta rows into {self.kind} vector index")
+        return len(keep)
+
+    def compact(self) -> int:
+        """Rebuild the main index from the database without tombstoned rows.
+
+        The replacement is built to the side and swapped in, so searches
+        keep using the old index meanwhile. Returns the tombstones cleared.
+        The mmap index cannot drop rows from its shared segment and keeps
+        its tombstones.
+        """
+        if self.base.kind == MappedVectorIndex.kind:
+            return 0
+        with self._merge_lock:
+            with self._lock:
+                removed = {doc_id for doc_id in self.tombstones if doc_id in self.base}
+            if not removed:
+                return 0
+            fresh = create_vector_index(self.base.kind, dimension=self.dimension)
+            fresh.load_from_db(exclude=removed)
+            with self._lock:
+                # Documents re-added while the replacement loaded are no longer tombstoned
+                revived = removed - self.tombstones
+            if revived:
+                fresh.load_from_db(exclude=removed - revived)
+            with self._lock:
+                self.base = fresh
+                self.tombstones.difference_update(removed - revived)
+        logger.info(f"Compacted {self.kind} vector index, dropping {len(removed - revived)} removed rows")
+        return len(removed - revived)
+
+    def load_from_db(self, batch_size: int = 5000) -> int:
+        return self.base.load_from_db(batch_size)
+
+    def ensure_loaded(self, path: str = None):
+        self.base.ensure_loaded(path)
+
+    def save(self, path: str = None):
+        """Merge pending delta rows, then persist the main index."""
+        self.merge()
+        self.base.save(path)
+
+    def load(self, path: str = None):
+        self.base.load(path)
+
+    def clear(self):
+        """Drop all rows from both layers and forget tombstones."""
+        with self._lock:
+            self.base.clear()
+            self.delta = FlatVectorIndex(self.dimension, initial_capacity=64)
+            self._delta_metadata = []
+            self.tombstones = set()
+
+
+VECTOR_INDEX_TYPES = {
+    FlatVectorIndex.kind: FlatVectorIndex,
+    IVFFlatIndex.kind: IVFFlatIndex,
+    MappedVectorIndex.kind: MappedVectorIndex,
+    QuantizedVectorIndex.kind: QuantizedVectorIndex,
+    ShardedVectorIndex.kind: ShardedVectorIndex,
+}
+
+
+def create_vector_index(index_type: str = None, **kwargs) -> FlatVectorIndex:
+    """Create a vector index of the configured type."""
+    index_type = (index_type or settings.VECTOR_INDEX_TYPE).lower()
+    if index_type == FlatVectorIndex.kind and settings.EMBEDDING_QUANTIZATION.lower() != "none":
+        index_type = QuantizedVectorIndex.kind
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(
+            f"Unknown vector index type '{index_type}', expected one of {sorted(VECTOR_INDEX_TYPES)}"
+        )
+    return VECTOR_INDEX_TYPES[index_type](**kwargs)
+
+
+vector_index = LiveVectorIndex(create_vector_index())
@@ -0,0 +1,15 @@
+"""Shared test fixtures."""
+import asyncio
+import os
+import pytest
+
+# Cached vectors must not outlive a test run; tests that need a store pass their own
+os.environ.setdefault("EMBEDDING_CACHE_STORE", "none")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Create the tables once, so tests do not depend on a database left by an earlier run."""
+    from app.db import init_db  # imported late so the environment above is read by app.config
+
+    asyncio.run(init_db())
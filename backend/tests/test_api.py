@@ -1,7 +1,9 @@
 """Tests for API endpoints."""
+import os
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.api import ingest as ingest_api
 from app.config import settings
 
 client = TestClient(app)
@@ -18,6 +20,15 @@ def test_health_endpoint():
     assert "task_queue" in data
 
 
+def test_health_metrics_endpoint():
+    """Test runtime metrics endpoint."""
+    response = client.get("/health/metrics")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["embeddings"]["backend"] in ["hashing", "sentence-transformers"]
+    assert data["audits"]["max_concurrent"] >= 1
+
+
 def test_root_endpoint():
     """Test root endpoint."""
     response = client.get("/")
@@ -78,3 +89,29 @@ def test_audit_status():
     data = response.json()
     assert data["job_id"] == job_id
     assert "status" in data
+
+
+def test_delete_unknown_document():
+    """Test deleting a document that is not stored returns 404."""
+    response = client.delete(
+        "/ingest/documents/does-not-exist",
+        headers={"X-API-Key": settings.API_KEY},
+    )
+    assert response.status_code == 404
+
+
+def test_batch_upload_that_cannot_be_queued_leaves_no_spool_file(monkeypatch, tmp_path):
+    """Test a spooled upload is deleted when queueing its task fails."""
+    async def broken_enqueue(*args, **kwargs):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest_api, "redis_client", None)
+    monkeypatch.setattr(ingest_api.task_queue_service, "enqueue", broken_enqueue)
+    response = client.post(
+        "/ingest/batch",
+        files=[("files", ("notes.txt", b"Some text", "text/plain"))],
+        headers={"X-API-Key": settings.API_KEY},
+    )
+    assert response.status_code == 500
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,344 @@
+"""Tests for the durable audit queue and recovery of unfinished jobs."""
+import asyncio
+import time
+import uuid
+import pytest
+import redis.asyncio as aioredis
+from app.config import settings
+from app.db import SessionLocal, AuditJob
+from app.services.audit_queue import LEASE_SCRIPT, MemoryAuditQueue, RedisAuditQueue
+from app.services.audit_scheduler import AuditScheduler, execute_audit_job, recover_orphaned_jobs
+from app.services.auditor import AuditorPlanner
+from app.services.task_queue import TaskQueueService
+
+
+class FakeRedis:
+    """In-memory stand-in for the asyncio Redis commands and Lua scripts the audit queue uses."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+        self.lists = {}
+
+    async def hset(self, name, key=None, value=None, mapping=None):
+        fields = dict(mapping or {})
+        if key is not None:
+            fields[key] = value
+        self.hashes.setdefault(name, {}).update({k: str(v) for k, v in fields.items()})
+
+    async def hincrby(self, name, key, amount=1):
+        fields = self.hashes.setdefault(name, {})
+        fields[key] = str(int(fields.get(key, 0)) + amount)
+        return int(fields[key])
+
+    async def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    async def expire(self, name, seconds):
+        return name in self.hashes
+
+    async def zadd(self, name, mapping, xx=False):
+        zset = self.zsets.setdefault(name, {})
+        for member, score in mapping.items():
+            if not xx or member in zset:
+                zset[member] = float(score)
+
+    async def zrem(self, name, member):
+        return 1 if self.zsets.get(name, {}).pop(member, None) is not None else 0
+
+    async def zscore(self, name, member):
+        return self.zsets.get(name, {}).get(member)
+
+    async def zcard(self, name):
+        return len(self.zsets.get(name, {}))
+
+    async def zrangebyscore(self, name, min, max):
+        return [m for m, score in sorted(self.zsets.get(name, {}).items(), key=lambda i: i[1]) if score <= max]
+
+    async def lpush(self, name, *values):
+        self.lists.setdefault(name, [])[:0] = reversed(values)
+
+    async def ltrim(self, name, start, end):
+        self.lists[name] = self.lists.get(name, [])[start:end + 1]
+
+    async def blpop(self, keys, timeout=0):
+        for key in keys:
+            if self.lists.get(key):
+                return key, self.lists[key].pop(0)
+        await asyncio.sleep(timeout)
+        return None
+
+    def register_script(self, script):
+        async def lease(keys, args):
+            # Same steps as LEASE_SCRIPT, which Redis runs atomically
+            queue_key, leases_key = keys
+            deadline, now, job_prefix = args
+            zset = self.zsets.get(queue_key)
+            if not zset:
+                return None
+            job_id = min(zset, key=zset.get)
+            del zset[job_id]
+            job_key = job_prefix + job_id
+            if job_key not in self.hashes:
+                return [job_id]
+            await self.zadd(leases_key, {job_id: deadline})
+            await self.hset(job_key, mapping={"status": "processing", "started_at": now})
+            await self.hincrby(job_key, "attempts")
+            return [job_id, self.hashes[job_key]["payload"], self.hashes[job_key]["enqueued_at"]]
+
+        async def recover(keys, args):
+            # Same steps as RECOVER_SCRIPT
+            leases_key, queue_key, wake_key, job_key = keys
+            job_id, now, max_attempts, failure, ttl, backlog = args
+            deadline = await self.zscore(leases_key, job_id)
+            if deadline is None or deadline > now:
+                return None
+            await self.zrem(leases_key, job_id)
+            job = self.hashes.get(job_key, {})
+            if "payload" not in job:
+                return None
+            if int(job.get("attempts", 0)) >= max_attempts:
+                await self.hset(job_key, mapping={"status": "failed", "result": failure})
+                return "failed"
+            await self.hset(job_key, "status", "pending")
+            score = -int(job["priority"]) * 1e13 + int(float(job["enqueued_at"]) * 1000)
+            await self.zadd(queue_key, {job_id: score})
+            await self.lpush(wake_key, job_id)
+            await self.ltrim(wake_key, 0, backlog - 1)
+            return "requeued"
+
+        return lease if script == LEASE_SCRIPT else recover
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute()."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+@pytest.mark.asyncio
+async def test_redis_queue_leases_jobs_by_priority():
+    """Test jobs are leased most urgent first and released on completion."""
+    client = FakeRedis()
+    queue = RedisAuditQueue(client, prefix="test", visibility_timeout=30)
+    await queue.enqueue("low", {"goal": "l"}, priority=1)
+    await queue.enqueue("high", {"goal": "h"}, priority=9)
+
+    job_id, payload, enqueued_at = await queue.dequeue()
+
+    assert (job_id, payload) == ("high", {"goal": "h"})
+    assert enqueued_at <= time.time()
+    assert await queue.tracked("high") and await queue.depth() == 1
+    assert (await queue.status("high"))["status"] == "processing"
+
+    await queue.complete("high", "completed", {"exec_ms": 1.0})
+
+    assert not await queue.tracked("high")
+    assert await queue.status("high") == {
+        "status": "completed", "enqueued_at": enqueued_at, "result": {"exec_ms": 1.0},
+    }
+
+
+@pytest.mark.asyncio
+async def test_redis_queue_recovers_expired_leases():
+    """Test a job whose runner died is requeued, and failed once it exhausts its attempts."""
+    client = FakeRedis()
+    queue = RedisAuditQueue(client, prefix="test", visibility_timeout=0.05, max_attempts=2)
+    await queue.enqueue("job", {"goal": "g"}, priority=5)
+
+    assert (await queue.dequeue())[0] == "job"
+    assert await queue.recover_expired() == 0
+    time.sleep(0.06)
+    assert await queue.recover_expired() == 1
+    assert (await queue.status("job"))["status"] == "pending"
+
+    assert (await queue.dequeue())[0] == "job"
+    time.sleep(0.06)
+    assert await queue.recover_expired() == 0
+    assert (await queue.status("job"))["status"] == "failed"
+    assert await queue.depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_consumer_killed_while_dequeuing_does_not_lose_the_job():
+    """Test a consumer dying before or after the lease leaves the job queued or recoverable."""
+    client = FakeRedis()
+    queue = RedisAuditQueue(client, prefix="test", visibility_timeout=0.05)
+    lease = queue._lease
+
+    async def killed_before_lease(keys, args):
+        raise ConnectionError("consumer killed")
+
+    async def killed_after_lease(keys, args):
+        await lease(keys, args)
+        raise ConnectionError("consumer killed")
+
+    waiting = asyncio.create_task(queue.dequeue())
+    await asyncio.sleep(0.01)
+    await queue.enqueue("job", {"goal": "g"}, priority=5)
+    queue._lease = killed_before_lease
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(waiting, 2)
+    assert await queue.depth() == 1
+
+    queue._lease = killed_after_lease
+    with pytest.raises(ConnectionError):
+        await queue.dequeue(timeout=0.1)
+    assert await queue.tracked("job") and await queue.depth() == 0
+
+    time.sleep(0.06)
+    assert await queue.recover_expired() == 1
+    queue._lease = lease
+    assert (await queue.dequeue(timeout=0.1))[:2] == ("job", {"goal": "g"})
+    assert await queue.dequeue(timeout=0.05) is None
+
+
+@pytest.fixture
+async def redis_server():
+    """A Redis server at REDIS_URL, or fakeredis with Lua support, to run the queue's scripts on."""
+    client = aioredis.from_url(settings.REDIS_URL, decode_responses=True, socket_connect_timeout=1)
+    try:
+        await client.ping()
+    except Exception:
+        await client.aclose()
+        try:
+            import fakeredis
+            import lupa  # noqa: F401 (fakeredis needs it to run scripts)
+        except ImportError:
+            pytest.skip("needs a Redis server at REDIS_URL or fakeredis[lua]")
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_lua_scripts_lease_and_recover_on_redis(redis_server):
+    """Test the lease and recovery scripts on Redis itself, as the fake only copies them."""
+    prefix = f"test_audit_{uuid.uuid4().hex[:8]}"
+    queue = RedisAuditQueue(redis_server, prefix=prefix, visibility_timeout=0.05, max_attempts=2)
+    try:
+        await queue.enqueue("low", {"goal": "l"}, priority=1)
+        await queue.enqueue("high", {"goal": "h"}, priority=9)
+        assert (await queue.dequeue(timeout=1))[:2] == ("high", {"goal": "h"})
+        assert await queue.recover_expired() == 0
+
+        await asyncio.sleep(0.06)
+        assert await queue.recover_expired() == 1
+        status = await queue.status("high")
+        assert status["status"] == "pending"
+        assert await redis_server.zscore(queue.queue_key, "high") == queue._score(9, status["enqueued_at"])
+        assert (await queue.dequeue(timeout=1))[0] == "high"
+
+        await asyncio.sleep(0.06)
+        assert await queue.recover_expired() == 0
+        status = await queue.status("high")
+        assert (status["status"], status["result"]) == ("failed", {"error": "lease expired too many times"})
+        assert (await queue.dequeue(timeout=1))[0] == "low"
+        assert await queue.depth() == 0
+    finally:
+        keys = [key async for key in redis_server.scan_iter(f"{prefix}:*")]
+        if keys:
+            await redis_server.delete(*keys)
+
+
+@pytest.mark.asyncio
+async def test_unfinished_database_jobs_are_requeued():
+    """Test pending and processing jobs of a stopped backend go back in the queue."""
+    run = uuid.uuid4().hex[:8]
+    ids = {status: f"job_{run}_{status}" for status in ("pending", "processing", "completed")}
+    db = SessionLocal()
+    for status, job_id in ids.items():
+        db.add(AuditJob(id=job_id, goal=f"Goal {run}", scope="", status=status, progress=0.0))
+    db.commit()
+    db.close()
+
+    task_queue = TaskQueueService()
+    queue = MemoryAuditQueue(task_queue)
+    await queue.enqueue(ids["processing"], {"goal": "already queued"})
+    await recover_orphaned_jobs(queue)
+
+    queued = {}
+    while True:
+        task = await queue.dequeue(timeout=0)
+        if task is None:
+            break
+        queued[task[0]] = task[1]
+    assert queued[ids["pending"]]["goal"] == f"Goal {run}"
+    assert queued[ids["processing"]] == {"goal": "already queued"}
+    assert ids["completed"] not in queued
+
+
+@pytest.mark.asyncio
+async def test_scheduler_recovery_leaves_recent_jobs_a_grace_period(monkeypatch):
+    """Test a job created just before the scheduler starts is requeued only after the grace period."""
+    monkeypatch.setattr(settings, "AUDIT_VISIBILITY_TIMEOUT", 0.3)
+    job_id = f"job_{uuid.uuid4().hex[:8]}_fresh"
+    db = SessionLocal()
+    db.add(AuditJob(id=job_id, goal="Goal", scope="", status="pending", progress=0.0))
+    db.commit()
+    db.close()
+    started = []
+
+    async def run_job(job_id, payload):
+        started.append(job_id)
+        return True
+
+    scheduler = AuditScheduler(MemoryAuditQueue(TaskQueueService()), run_job=run_job, max_concurrent=4)
+    scheduler.start()
+    try:
+        await asyncio.sleep(0.1)
+        assert job_id not in started
+        for _ in range(100):
+            if job_id in started:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await scheduler.stop()
+
+    assert job_id in started
+
+
+@pytest.mark.asyncio
+async def test_failed_audit_is_not_recorded_as_completed(monkeypatch):
+    """Test an audit whose planner returns an error stays failed and counts as a failure."""
+    def broken_decompose(self):
+        raise RuntimeError("planner broke")
+
+    monkeypatch.setattr(AuditorPlanner, "decompose_goal", broken_decompose)
+    job_id = f"job_{uuid.uuid4().hex[:8]}_broken"
+    db = SessionLocal()
+    db.add(AuditJob(id=job_id, goal="Goal", scope="", status="pending", progress=0.0))
+    db.commit()
+    db.close()
+
+    task_queue = TaskQueueService()
+    scheduler = AuditScheduler(MemoryAuditQueue(task_queue), run_job=execute_audit_job, recover_on_start=False)
+    await task_queue.enqueue("audit", job_id, {"goal": "Goal", "scope": ""})
+    scheduler.start()
+    try:
+        for _ in range(100):
+            if scheduler.failed:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await scheduler.stop()
+
+    assert (scheduler.completed, scheduler.failed) == (0, 1)
+    assert task_queue.get_task_status(job_id)["status"] == "failed"
+    db = SessionLocal()
+    try:
+        job = db.query(AuditJob).filter(AuditJob.id == job_id).first()
+        assert (job.status, job.results) == ("failed", None)
+    finally:
+        db.close()
@@ -35,6 +35,28 @@ async def test_vector_search():
     assert isinstance(results, list)
 
 
+@pytest.mark.asyncio
+async def test_batch_vector_search():
+    """Test batched vector search returns one result list per query."""
+    planner = AuditorPlanner("Test goal")
+    queries = planner.decompose_goal()
+    results = await planner.batch_vector_search(queries, top_k=5)
+    
+    assert len(results) == len(queries)
+    assert all(isinstance(r, list) and len(r) <= 5 for r in results)
+
+
+@pytest.mark.asyncio
+async def test_batch_hybrid_search():
+    """Test hybrid search returns vector and lexical results per query."""
+    planner = AuditorPlanner("Test goal")
+    queries = planner.decompose_goal()
+    vector_results, lexical_results = await planner.batch_hybrid_search(queries, top_k=5)
+    
+    assert len(vector_results) == len(lexical_results) == len(queries)
+    assert all(isinstance(r, list) and len(r) <= 5 for r in vector_results + lexical_results)
+
+
 def test_synthesis_prompt_building():
     """Test synthesis prompt building."""
     planner = AuditorPlanner("Test goal")
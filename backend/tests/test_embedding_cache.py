@@ -0,0 +1,95 @@
+"""Tests for the two-tier embedding cache."""
+import numpy as np
+from app.services.embedding_cache import (
+    EmbeddingCache, LRUEmbeddingCache, RedisEmbeddingStore, SQLiteEmbeddingStore, cache_key
+)
+from app.services.embeddings import HashingEmbedder
+
+
+class CountingEmbedder:
+    """Hashing embedder that records which texts it was asked to embed."""
+
+    def __init__(self, dimension=32):
+        self.embedder = HashingEmbedder(dimension)
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return self.embedder.embed(texts)
+
+
+def test_cache_key_depends_on_model_and_text():
+    """Test keys differ by model and by text."""
+    assert cache_key("m1", "text") == cache_key("m1", "text")
+    assert cache_key("m1", "text") != cache_key("m2", "text")
+    assert cache_key("m1", "text") != cache_key("m1", "text ")
+
+
+def test_lru_evicts_least_recently_used_by_size():
+    """Test the memory tier stays under its byte budget."""
+    lru = LRUEmbeddingCache(max_bytes=3 * 32 * 4)
+    for key in "abc":
+        lru.put(key, np.zeros(32, dtype=np.float32))
+    lru.get("a")
+    lru.put("d", np.zeros(32, dtype=np.float32))
+
+    assert lru.get("b") is None
+    assert lru.get("a") is not None
+    assert len(lru) == 3
+    assert lru.nbytes == 3 * 32 * 4
+
+
+def test_cache_skips_inference_for_cached_texts(tmp_path):
+    """Test repeated and duplicate texts are embedded once."""
+    compute = CountingEmbedder()
+    cache = EmbeddingCache("hashing@32", 32, store=SQLiteEmbeddingStore(str(tmp_path / "cache.db")))
+    texts = ["verify invoice totals", "evidence for invoice totals", "verify invoice totals"]
+
+    first = cache.embed(texts, compute)
+    second = cache.embed(texts, compute)
+
+    assert compute.calls == [["verify invoice totals", "evidence for invoice totals"]]
+    assert np.allclose(first, compute.embedder.embed(texts))
+    assert np.array_equal(first, second)
+    stats = cache.stats()
+    assert stats["misses"] == 3
+    assert stats["memory_hits"] == 3
+
+
+def test_shared_store_serves_other_processes(tmp_path):
+    """Test a fresh cache (e.g. a worker) reads vectors written by another."""
+    path = str(tmp_path / "cache.db")
+    EmbeddingCache("hashing@32", 32, store=SQLiteEmbeddingStore(path)).embed(["quarterly report"], CountingEmbedder())
+
+    compute = CountingEmbedder()
+    cache = EmbeddingCache("hashing@32", 32, store=SQLiteEmbeddingStore(path))
+    vectors = cache.embed(["quarterly report"], compute)
+
+    assert compute.calls == []
+    assert cache.stats()["shared_hits"] == 1
+    assert np.allclose(vectors[0], compute.embedder.embed(["quarterly report"])[0])
+
+    other_model = EmbeddingCache("other@32", 32, store=SQLiteEmbeddingStore(path))
+    other_model.embed(["quarterly report"], compute)
+    assert compute.calls == [["quarterly report"]]
+
+
+def test_redis_store_falls_back_to_sqlite(tmp_path):
+    """Test an unreachable Redis uses the local SQLite store."""
+    fallback = SQLiteEmbeddingStore(str(tmp_path / "cache.db"))
+    store = RedisEmbeddingStore("redis://localhost:1/0", fallback=fallback)
+    store.put_many({"k": b"\x00" * 8})
+
+    assert store.get_many(["k", "missing"]) == [b"\x00" * 8, None]
+    assert fallback.get_many(["k"]) == [b"\x00" * 8]
+
+
+def test_sqlite_store_evicts_oldest_rows(tmp_path):
+    """Test the SQLite tier keeps at most max_rows vectors, dropping the oldest writes."""
+    store = SQLiteEmbeddingStore(str(tmp_path / "cache.db"), max_rows=3)
+    store.put_many({"a": b"1", "b": b"2"})
+    store.put_many({"c": b"3", "a": b"4"})
+    store.put_many({"d": b"5"})
+
+    assert store.get_many(["a", "b", "c", "d"]) == [b"4", None, b"3", b"5"]
+    assert store.evicted == 1
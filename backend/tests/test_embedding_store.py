@@ -0,0 +1,70 @@
+"""Tests for the memory-mapped embedding store."""
+import pytest
+import numpy as np
+from app.services.embedding_store import EmbeddingSegment
+from app.services.vector_index import MappedVectorIndex, normalize_rows
+
+
+def _vectors(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.standard_normal((n, dim)))
+
+
+def test_segment_append_visible_to_other_reader(tmp_path):
+    """Test rows appended by one handle are mapped by another."""
+    writer = EmbeddingSegment(str(tmp_path), dimension=8)
+    reader = EmbeddingSegment(str(tmp_path), dimension=8)
+    vectors = _vectors(5)
+
+    assert writer.append([f"doc_{i}" for i in range(5)], vectors) == 5
+    assert len(reader) == 0
+
+    assert reader.refresh() == 5
+    assert reader.ids == [f"doc_{i}" for i in range(5)]
+    np.testing.assert_allclose(reader.matrix, vectors)
+    assert isinstance(reader.matrix, np.memmap)
+
+
+def test_segment_skips_known_ids(tmp_path):
+    """Test appending duplicate ids is a no-op, even across handles."""
+    first = EmbeddingSegment(str(tmp_path), dimension=8)
+    second = EmbeddingSegment(str(tmp_path), dimension=8)
+    vectors = _vectors(3)
+
+    first.append(["a", "b"], vectors[:2])
+    assert second.append(["b", "c", "c"], vectors[1:]) == 1
+    assert second.ids == ["a", "b", "c"]
+
+
+def test_segment_files_are_valid_npy(tmp_path):
+    """Test segment files load with numpy's own reader."""
+    segment = EmbeddingSegment(str(tmp_path), name="shard_0", dimension=8)
+    vectors = _vectors(4)
+    segment.append(["w", "x", "y", "z"], vectors)
+
+    loaded = np.load(segment.vectors_path, mmap_mode="r")
+    ids = np.load(segment.ids_path)
+    assert loaded.shape == (4, 8)
+    np.testing.assert_allclose(loaded, vectors)
+    assert [raw.decode() for raw in ids] == ["w", "x", "y", "z"]
+
+
+def test_segment_rejects_wrong_dimension(tmp_path):
+    """Test dimension mismatch raises."""
+    segment = EmbeddingSegment(str(tmp_path), dimension=8)
+    with pytest.raises(ValueError):
+        segment.append(["a"], np.zeros((1, 4), dtype=np.float32))
+
+
+def test_mapped_index_sees_rows_from_other_process(tmp_path):
+    """Test mapped index picks up rows another writer appended."""
+    index = MappedVectorIndex(dimension=8, store=EmbeddingSegment(str(tmp_path), dimension=8))
+    worker_segment = EmbeddingSegment(str(tmp_path), dimension=8)
+    vectors = _vectors(20)
+
+    worker_segment.append([f"doc_{i}" for i in range(20)], vectors)
+
+    hits = index.search(vectors[11], top_k=3)
+    assert hits[0][0] == "doc_11"
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert "doc_3" in index
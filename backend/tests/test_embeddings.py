@@ -1,6 +1,13 @@
 """Tests for embeddings service."""
+import asyncio
+import os
+import subprocess
+import sys
 import pytest
-from app.services.embeddings import EmbeddingsService, LLMService
+import numpy as np
+from app.services.embeddings import (
+    EmbeddingsService, HashingEmbedder, LLMService, MicroBatcher, plan_batches
+)
 
 
 def test_embeddings_service_initialization():
@@ -29,6 +36,125 @@ def test_embed_batch():
     assert embeddings.shape[1] > 0
 
 
+def test_hashing_embedder_is_deterministic_and_normalized():
+    """Test the same text always maps to the same unit vector."""
+    embedder = HashingEmbedder(64)
+    first = embedder.embed(["invoice overpayment", "", "invoice overpayment"])
+    
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(first[0], HashingEmbedder(64).embed(["invoice overpayment"])[0])
+    assert np.linalg.norm(first[0]) == pytest.approx(1.0, abs=1e-5)
+    assert not first[1].any()
+
+
+def test_hashing_embedder_stable_across_processes():
+    """Test vectors do not depend on the per-process hash() salt."""
+    script = (
+        "from app.services.embeddings import HashingEmbedder;"
+        "print(HashingEmbedder(32).embed(['fee waiver approved'])[0].tolist())"
+    )
+    outputs = set()
+    for seed in ("1", "2"):
+        env = {**os.environ, "PYTHONHASHSEED": seed}
+        result = subprocess.run(
+            [sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        outputs.add(result.stdout.strip())
+    assert len(outputs) == 1
+
+
+def test_hashing_embedder_has_semantic_signal():
+    """Test texts sharing words and word pieces score higher than unrelated texts."""
+    a, b, c = HashingEmbedder(384).embed([
+        "Overpayment to vendor on invoice 2024",
+        "Vendor invoice overpaid in 2024",
+        "Quarterly travel policy memo",
+    ])
+    assert a @ b > 0.3
+    assert a @ b > abs(a @ c) + 0.2
+
+
+def test_plan_batches_sorts_by_length_under_token_budget():
+    """Test batches are length-sorted and padded size stays within budget."""
+    lengths = [120, 5, 300, 8, 7, 128, 6, 512]
+    batches = plan_batches(lengths, token_budget=512, max_batch=3)
+    
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    flat = [lengths[i] for batch in batches for i in batch]
+    assert flat == sorted(flat)
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= 512
+    assert batches[-1] == [7]
+
+
+@pytest.mark.asyncio
+async def test_embed_async_matches_embed():
+    """Test executor-offloaded embedding returns the same vectors."""
+    service = EmbeddingsService()
+    texts = ["fee waiver", "invoice overpayment"]
+    
+    np.testing.assert_array_equal(await service.embed_async(texts), service.embed(texts))
+    assert await service.embed_single_async("fee waiver") == service.embed_single("fee waiver")
+
+
+def test_unavailable_model_falls_back_to_hashing(monkeypatch):
+    """Test a model that cannot load falls back to the hashing embedder."""
+    monkeypatch.setattr("app.services.embeddings.settings.EMBEDDING_BACKEND", "sentence-transformers")
+    monkeypatch.setattr("app.services.embeddings.settings.EMBEDDING_MODEL", "/nonexistent/model")
+    service = EmbeddingsService()
+    
+    assert service.backend == "hashing"
+    assert isinstance(service.embedder, HashingEmbedder)
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_coalesces_concurrent_requests():
+    """Test concurrent single embeds share batched calls and match direct embeds."""
+    service = EmbeddingsService()
+    calls = []
+    
+    async def embed_batch(texts):
+        calls.append(len(texts))
+        return await service.embed_async(texts)
+    
+    batcher = MicroBatcher(embed_batch, max_items=16, max_wait_ms=20)
+    texts = [f"invoice {i} approved by finance" for i in range(50)]
+    try:
+        results = await asyncio.gather(*(batcher.submit(text) for text in texts))
+    finally:
+        await batcher.aclose()
+    
+    assert sum(calls) == 50
+    assert len(calls) < 50
+    assert max(calls) <= 16
+    assert np.allclose(np.stack(results), service.embed(texts), atol=1e-6)
+    
+    stats = batcher.stats()
+    assert stats["batches"] == len(calls)
+    assert stats["items"] == 50
+    assert stats["queue_depth"] == 0
+    assert stats["max_batch_size"] == max(calls)
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_propagates_errors():
+    """Test a failed batch fails every request in it."""
+    async def embed_batch(texts):
+        raise RuntimeError("model unavailable")
+    
+    batcher = MicroBatcher(embed_batch, max_items=8, max_wait_ms=5)
+    try:
+        results = await asyncio.gather(
+            *(batcher.submit(f"text {i}") for i in range(4)), return_exceptions=True
+        )
+    finally:
+        await batcher.aclose()
+    
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
 def test_cosine_similarity():
     """Test cosine similarity computation."""
     service = EmbeddingsService()
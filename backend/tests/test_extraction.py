@@ -0,0 +1,123 @@
+"""Tests for process-pool PDF extraction."""
+import asyncio
+import pytest
+from app.config import settings
+from app.services import extraction
+from app.services.extraction import ExtractionInterrupted, ExtractionTimeout, PDFExtractor, page_ranges
+from app.services.uploads import resolve_payload_async, upload_payload
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one line of Helvetica text per page."""
+    n = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(n)), n
+        )).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {5 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return str(path)
+
+
+def test_page_ranges_cover_all_pages():
+    """Test page ranges are consecutive and bounded by the task size."""
+    assert page_ranges(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert page_ranges(0, 4) == []
+
+
+@pytest.mark.asyncio
+async def test_extract_pdf_in_page_ranges(tmp_path):
+    """Test pages extracted in parallel ranges are joined in order, up to the page limit."""
+    path = write_pdf(tmp_path / "audit.pdf", [f"Page {i} total {i * 100}" for i in range(7)])
+    extractor = PDFExtractor(max_workers=2, pages_per_task=2, max_pages=5, timeout=60)
+    try:
+        text = await extractor.extract(path)
+    finally:
+        extractor.shutdown()
+
+    lines = text.split("\n")
+    assert [line.strip() for line in lines] == [f"Page {i} total {i * 100}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_extract_timeout_restarts_pool(tmp_path):
+    """Test a document over the time limit fails and the pool is replaced."""
+    path = write_pdf(tmp_path / "slow.pdf", ["slow"] * 3)
+    extractor = PDFExtractor(max_workers=1, pages_per_task=1, max_pages=10, timeout=1e-6)
+    try:
+        with pytest.raises(ExtractionTimeout):
+            await extractor.extract(path)
+        assert extractor._pool is None
+
+        extractor.timeout = 60
+        assert "slow" in await extractor.extract(path)
+    finally:
+        extractor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extraction_retries_after_restart_by_another_document(tmp_path):
+    """Test a document running when the pool is restarted is extracted again on the new pool."""
+    path = write_pdf(tmp_path / "bystander.pdf", [f"Page {i}" for i in range(6)])
+    extractor = PDFExtractor(max_workers=1, pages_per_task=1, max_pages=10, timeout=60)
+    try:
+        running = asyncio.create_task(extractor.extract(path))
+        for _ in range(500):
+            if extractor._pool is not None:
+                break
+            await asyncio.sleep(0.001)
+        extractor.restart()
+
+        text = await running
+    finally:
+        extractor.shutdown()
+
+    assert [line.strip() for line in text.split("\n")] == [f"Page {i}" for i in range(6)]
+
+
+@pytest.mark.asyncio
+async def test_interrupted_pdf_upload_fails_instead_of_reading_bytes(tmp_path, monkeypatch):
+    """Test a PDF whose extraction keeps being interrupted is not ingested as raw bytes."""
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    path = write_pdf(tmp_path / "report.pdf", ["Quarterly total 900"])
+
+    async def interrupted(path):
+        raise ExtractionInterrupted("restarted")
+
+    monkeypatch.setattr(extraction.pdf_extractor, "extract", interrupted)
+
+    with pytest.raises(ExtractionInterrupted):
+        await resolve_payload_async(upload_payload({"path": path, "sha256": "", "size": 0, "filename": "report.pdf"}))
+
+
+@pytest.mark.asyncio
+async def test_resolve_pdf_upload_uses_extractor(tmp_path, monkeypatch):
+    """Test spooled PDF uploads are resolved through the process-pool extractor."""
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    path = write_pdf(tmp_path / "report.pdf", ["Quarterly total 900", "Signed off"])
+    payload = upload_payload({"path": path, "sha256": "", "size": 0, "filename": "report.pdf"})
+
+    resolved = await resolve_payload_async(payload)
+
+    assert "upload" not in resolved
+    assert "Quarterly total 900" in resolved["content"]
+    assert "Signed off" in resolved["content"]
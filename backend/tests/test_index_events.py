@@ -0,0 +1,148 @@
+"""Tests for index events and the live vector index."""
+import uuid
+import pytest
+import numpy as np
+from app.config import settings
+from app.services.ingest import delete_documents, ingest_batch
+from app.services.index_events import IndexEventBus, IndexEventConsumer, index_event_bus
+from app.services.lexical_index import BM25Index
+from app.services.vector_index import FlatVectorIndex, IVFFlatIndex, LiveVectorIndex, normalize_rows
+
+
+def _vectors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.standard_normal((n, dim)))
+
+
+def _live_index(base=None):
+    index = LiveVectorIndex(base or FlatVectorIndex(dimension=16))
+    index.base.loaded = True
+    return index
+
+
+def test_live_index_searches_delta_before_merge():
+    """Test rows added to the delta are searchable and merge into the base."""
+    vectors = _vectors(300)
+    index = _live_index(IVFFlatIndex(dimension=16, nlist=4, nprobe=4, min_train_size=100))
+    index.base.add([f"doc_{i}" for i in range(200)], vectors[:200])
+    index.add([f"doc_{i}" for i in range(200, 300)], vectors[200:], [{"source": "erp"}] * 100)
+
+    assert len(index.delta) == 100
+    assert index.search(vectors[250], top_k=1)[0][0] == "doc_250"
+    assert index.search(vectors[10], top_k=1)[0][0] == "doc_10"
+
+    assert index.merge() == 100
+    assert len(index.delta) == 0
+    assert len(index.base) == 300
+    assert index.search(vectors[250], top_k=1)[0][0] == "doc_250"
+    assert index.resolve_scope("source:erp").base.size == 100
+
+
+def test_live_index_tombstones_hide_documents():
+    """Test removed documents disappear from results and are not merged."""
+    vectors = _vectors(20)
+    index = _live_index()
+    index.base.add(["a"], vectors[:1])
+    index.add(["b"], vectors[1:2])
+
+    assert index.remove(["a", "b", "never-indexed"]) == 2
+    assert "a" not in index
+    assert all(doc_id not in ("a", "b") for doc_id, _ in index.search(vectors[0], top_k=5))
+    assert index.merge() == 0
+    # The merge dropped "b"; only the main index row still needs a tombstone
+    assert index.tombstones == {"a"}
+
+
+@pytest.mark.asyncio
+async def test_live_index_compaction_drops_removed_rows(monkeypatch):
+    """Test enough tombstones trigger a rebuild of the main index without the removed rows."""
+    source = f"compact-{uuid.uuid4().hex}"
+    result = await ingest_batch([
+        {"title": f"Doc {i}", "content": f"Compaction {source} {i}", "metadata": {"source": source}}
+        for i in range(3)
+    ])
+    doc_ids = [r["doc_id"] for r in result["results"]]
+    index = LiveVectorIndex(FlatVectorIndex())
+    index.base.load_from_db()
+    size = len(index.base)
+    monkeypatch.setattr(settings, "INDEX_COMPACT_TOMBSTONES", 2)
+
+    index.remove(doc_ids[:1])
+    assert not index.needs_compaction()
+    index.remove(doc_ids[1:2])
+    assert index.needs_compaction()
+    index.merge()
+
+    assert index.tombstones == set()
+    assert len(index.base) == size - 2
+    assert doc_ids[0] not in index.base and doc_ids[1] not in index.base and doc_ids[2] in index.base
+
+
+def test_live_index_scoped_search_spans_layers():
+    """Test scope candidates cover both the base and the delta."""
+    vectors = _vectors(10)
+    index = _live_index()
+    index.base.add(["a", "b"], vectors[:2], [{"department": "Finance"}, {"department": "Legal"}])
+    index.add(["c"], vectors[2:3], [{"department": "Finance"}])
+
+    candidates = index.resolve_scope("department:finance")
+    assert candidates.size == 2
+    hits = index.search(vectors[1], top_k=5, candidates=candidates)
+    assert sorted(doc_id for doc_id, _ in hits) == ["a", "c"]
+
+
+def test_consumer_applies_events_from_local_log():
+    """Test published events reach the live index through the local fallback."""
+    vectors = _vectors(5)
+    bus = IndexEventBus(redis_url="")
+    index = _live_index()
+    consumer = IndexEventConsumer(index, bus=bus, block_ms=10, lexical=BM25Index())
+
+    bus.publish_added(["x", "y"], vectors[:2], [{"shard_id": "shard_1"}, None])
+    bus.publish_removed(["y"])
+    events = consumer.poll()
+
+    assert [event["type"] for event in events] == ["added", "added", "removed"]
+    assert consumer.apply(events) == 2
+    assert "x" in index and "y" not in index
+    assert index.search(vectors[0], top_k=1)[0] == ("x", pytest.approx(1.0, abs=1e-5))
+    assert consumer.poll() == []
+
+
+def test_consumer_indexes_events_published_during_load():
+    """Test a document committed while the index loads from the database is still searchable."""
+    vectors = _vectors(1, dim=settings.EMBEDDING_DIMENSION)
+    index = LiveVectorIndex(FlatVectorIndex())
+    consumer = IndexEventConsumer(index, bus=IndexEventBus(redis_url=""), block_ms=10, lexical=BM25Index())
+    load_from_db = index.base.load_from_db
+
+    def load_with_late_commit(*args, **kwargs):
+        # The load has read the stored ids; a worker then commits and publishes a document
+        consumer.bus.publish_added(["late"], vectors)
+        consumer.apply(consumer.poll())
+        return load_from_db(*args, **kwargs)
+
+    index.base.load_from_db = load_with_late_commit
+    index.ensure_loaded(path="")
+
+    assert index.loaded and "late" in index
+    assert index.search(vectors[0], top_k=1)[0][0] == "late"
+
+
+@pytest.mark.asyncio
+async def test_deleted_documents_leave_the_live_index():
+    """Test deleting a document publishes a removed event that hides it from search."""
+    source = f"delete-{uuid.uuid4().hex}"
+    result = await ingest_batch([{"title": "Doomed", "content": f"Delete {source}", "metadata": {"source": source}}])
+    doc_id = result["results"][0]["doc_id"]
+    index = LiveVectorIndex(FlatVectorIndex())
+    index.base.load_from_db()
+    consumer = IndexEventConsumer(index, bus=index_event_bus, block_ms=10, lexical=BM25Index())
+    consumer.poll()
+    assert doc_id in index
+
+    assert delete_documents([doc_id, "never-stored"]) == [doc_id]
+
+    consumer.apply(consumer.poll())
+    assert doc_id not in index
+    assert delete_documents([doc_id]) == []
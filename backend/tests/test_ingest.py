@@ -1,7 +1,13 @@
 """Tests for ingest service."""
 import pytest
 import asyncio
-from app.services.ingest import ingest_document, compute_idempotency_key
+import uuid
+from app.services.ingest import ingest_document, ingest_batch, compute_idempotency_key
+import json
+from sqlalchemy import text
+from app.db import (
+    SessionLocal, Document, encode_embedding, decode_embedding, engine, migrate_embeddings_to_binary, EMBEDDING_DTYPE
+)
 
 
 @pytest.mark.asyncio
@@ -19,6 +25,60 @@ async def test_ingest_document():
     assert "doc_id" in result
 
 
+@pytest.mark.asyncio
+async def test_ingest_batch_reports_each_document():
+    """Test bulk ingest stores new documents and reports duplicates per document."""
+    source = f"batch-{uuid.uuid4().hex}"
+    existing = await ingest_document({"title": "Doc 0", "content": "already stored", "metadata": {"source": source}})
+    payloads = [
+        {"title": f"Doc {i}", "content": f"Invoice {i} Total: {i * 10}", "metadata": {"source": source}}
+        for i in range(5)
+    ]
+    payloads.append(dict(payloads[1]))
+    
+    result = await ingest_batch(payloads)
+    
+    statuses = [r["status"] for r in result["results"]]
+    assert statuses == ["duplicate", "success", "success", "success", "success", "duplicate"]
+    assert result["results"][0]["doc_id"] == existing["doc_id"]
+    assert result["successful"] == 4
+    
+    db = SessionLocal()
+    try:
+        stored = db.query(Document).filter(Document.source == source).all()
+    finally:
+        db.close()
+    assert len(stored) == 5
+    stored_1 = next(doc for doc in stored if doc.title == "Doc 1")
+    assert stored_1.doc_metadata["shard_id"] == result["results"][1]["shard_id"]
+    assert decode_embedding(stored_1.embedding, dim=stored_1.embedding_dim).shape[0] == stored_1.embedding_dim
+
+
+@pytest.mark.asyncio
+async def test_indexing_failure_does_not_fail_stored_documents(monkeypatch):
+    """Test documents committed before an indexing error are still reported as stored."""
+    from app.services import ingest
+    
+    def broken_append(doc_ids, embeddings):
+        raise RuntimeError("embedding store unavailable")
+    
+    monkeypatch.setattr(ingest, "embedding_store", type("BrokenStore", (), {"append": staticmethod(broken_append)})())
+    source = f"index-failure-{uuid.uuid4().hex}"
+    
+    single = await ingest_document({"title": "Single", "content": "Total: 5", "metadata": {"source": source}})
+    batch = await ingest_batch([
+        {"title": f"Doc {i}", "content": f"Total: {i}", "metadata": {"source": source}} for i in range(3)
+    ])
+    
+    assert single["status"] == "success"
+    assert [r["status"] for r in batch["results"]] == ["success"] * 3
+    db = SessionLocal()
+    try:
+        assert db.query(Document).filter(Document.source == source).count() == 4
+    finally:
+        db.close()
+
+
 @pytest.mark.asyncio
 async def test_idempotency():
     """Test idempotency key generation."""
@@ -35,3 +95,42 @@ def test_compute_idempotency_key():
     key = compute_idempotency_key("Document Title", "test_source")
     assert len(key) == 16
     assert isinstance(key, str)
+
+
+def test_embedding_binary_roundtrip():
+    """Test embeddings are stored as float32 bytes and read back zero-copy."""
+    embedding = [0.5, -1.25, 3.0]
+    raw = encode_embedding(embedding)
+    
+    assert isinstance(raw, bytes)
+    assert len(raw) == 4 * len(embedding)
+    assert decode_embedding(raw, dim=3).tolist() == embedding
+    # Legacy JSON rows are still readable
+    assert decode_embedding("[0.5, -1.25, 3.0]").tolist() == embedding
+    
+    with pytest.raises(ValueError):
+        decode_embedding(raw, dim=4)
+
+
+def test_migrate_json_embeddings_to_binary():
+    """Test legacy JSON-text embeddings are rewritten as float32 bytes that decode to the same vectors."""
+    run = uuid.uuid4().hex
+    vectors = {f"legacy_{run}_{i}": [0.25 * i, -1.5, 3.0 + i] for i in range(3)}
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO documents (id, title, embedding) VALUES (:id, :title, :embedding)"),
+            [{"id": doc_id, "title": "Legacy", "embedding": json.dumps(vector)} for doc_id, vector in vectors.items()],
+        )
+    
+    assert migrate_embeddings_to_binary(batch_size=2) >= len(vectors)
+    
+    db = SessionLocal()
+    try:
+        rows = db.query(Document).filter(Document.id.in_(list(vectors))).all()
+    finally:
+        db.close()
+    assert len(rows) == len(vectors)
+    for row in rows:
+        assert isinstance(row.embedding, bytes)
+        assert (row.embedding_dtype, row.embedding_dim) == (EMBEDDING_DTYPE, 3)
+        assert decode_embedding(row.embedding, dim=row.embedding_dim).tolist() == vectors[row.id]
@@ -0,0 +1,81 @@
+"""Tests for the BM25 lexical index."""
+from app.config import settings
+from app.services.lexical_index import BM25Index, tokenize
+
+
+DOCS = {
+    "inv": "Invoice DOC-2024-017 overpayment to vendor Acme, refund pending",
+    "waiver": "Fee waiver approved for vendor Globex without second signature",
+    "memo": "Quarterly memo on travel policy and meal allowances",
+    "dup": "Overpayment overpayment overpayment detected in payroll run",
+}
+
+
+def _index():
+    index = BM25Index()
+    index.add(
+        list(DOCS),
+        list(DOCS.values()),
+        [{"department": "Finance"}, {"department": "Legal"}, {"department": "HR"}, {"department": "Finance"}],
+    )
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    """Test compound identifiers are indexed whole and by part."""
+    tokens = tokenize("See DOC-2024-017 for the waiver")
+    assert "doc-2024-017" in tokens
+    assert {"doc", "2024", "017", "waiver", "see"} <= set(tokens)
+    assert "the" not in tokens
+
+
+def test_bm25_ranks_exact_terms():
+    """Test exact rare terms rank their documents first."""
+    index = _index()
+    assert index.search("fee waiver", top_k=2)[0][0] == "waiver"
+    assert index.search("DOC-2024-017", top_k=1)[0][0] == "inv"
+    assert index.search("unrelated words", top_k=3) == []
+
+
+def test_bm25_term_frequency_saturates():
+    """Test repeated terms score higher but with diminishing returns."""
+    index = _index()
+    hits = dict(index.search("overpayment", top_k=5))
+    assert hits["dup"] > hits["inv"]
+    assert hits["dup"] < 3 * hits["inv"]
+
+
+def test_bm25_scope_and_removal():
+    """Test scoped lexical search and tombstoned documents."""
+    index = _index()
+    candidates = index.resolve_scope("department:finance")
+    assert [doc_id for doc_id, _ in index.search("vendor", top_k=5, candidates=candidates)] == ["inv"]
+
+    index.remove(["inv"])
+    assert "inv" not in index
+    assert all(doc_id != "inv" for doc_id, _ in index.search("overpayment", top_k=5))
+
+
+def test_bm25_compaction_drops_removed_postings(monkeypatch):
+    """Test enough removals compact the index and keep search and scopes consistent."""
+    monkeypatch.setattr(settings, "INDEX_COMPACT_TOMBSTONES", 2)
+    index = _index()
+    index.remove(["inv"])
+    assert index.removed == {"inv"}
+
+    index.remove(["waiver"])
+
+    assert index.removed == set() and len(index) == 2
+    assert [doc_id for doc_id, _ in index.search("overpayment", top_k=5)] == ["dup"]
+    candidates = index.resolve_scope("department:finance")
+    assert [doc_id for doc_id, _ in index.search("overpayment", top_k=5, candidates=candidates)] == ["dup"]
+    assert index.resolve_scope("department:legal").size == 0
+    assert index.add(["inv"], [DOCS["inv"]], [{"department": "Finance"}]) == 1
+    assert index.search("DOC-2024-017", top_k=1)[0][0] == "inv"
+
+
+def test_bm25_skips_duplicate_ids():
+    """Test re-adding a document does not double count it."""
+    index = _index()
+    assert index.add(["inv"], ["something else"]) == 0
+    assert len(index) == 4
@@ -0,0 +1,118 @@
+"""Tests for metadata posting-list index and scoped search."""
+import pytest
+import numpy as np
+from app.services.metadata_index import MetadataIndex, ScopeSyntaxError, parse_scope
+from app.services.vector_index import FlatVectorIndex, IVFFlatIndex, QuantizedVectorIndex
+
+
+DOCS = [
+    {"department": "Finance", "source": "email", "tags": ["2024", "invoice"]},
+    {"department": "Finance", "source": "erp", "tags": ["2023"]},
+    {"department": "Legal", "source": "email", "tags": ["2024"]},
+    {"department": "HR", "source": "erp"},
+    None,
+    {"department": "Legal Ops", "source": "sharepoint", "tags": ["finance"]},
+]
+
+
+def _index():
+    index = MetadataIndex()
+    for row, metadata in enumerate(DOCS):
+        index.add(row, metadata)
+    return index
+
+
+def test_parse_scope_precedence():
+    """Test AND binds tighter than OR and NOT applies to one term."""
+    node = parse_scope("dept:finance OR department:legal AND NOT source:email")
+    assert node == ("or", [
+        ("term", "department", "finance"),
+        ("and", [("term", "department", "legal"), ("not", ("term", "source", "email"))]),
+    ])
+
+
+def test_parse_scope_bare_phrase():
+    """Test a scope without fields or operators is a single bare value."""
+    assert parse_scope("Legal Ops") == ("bare", "Legal Ops")
+    assert parse_scope('department:"Legal Ops"') == ("term", "department", "Legal Ops")
+
+
+@pytest.mark.parametrize("scope", ["(department:finance", "AND", "department:finance OR", ""])
+def test_parse_scope_rejects_malformed(scope):
+    """Test malformed scopes raise ScopeSyntaxError."""
+    with pytest.raises(ScopeSyntaxError):
+        parse_scope(scope)
+
+
+@pytest.mark.parametrize("scope,expected", [
+    ("department:finance", [0, 1]),
+    ("department:finance AND tag:2024", [0]),
+    ("tag:2024 AND NOT source:email", []),
+    ("source:erp OR department:legal", [1, 2, 3]),
+    ("NOT source:email", [1, 3, 4, 5]),
+    ("(department:finance OR department:legal) AND tag:2024", [0, 2]),
+    ("Finance", [0, 1, 5]),
+    ("department:marketing", []),
+])
+def test_metadata_filter(scope, expected):
+    """Test boolean scope evaluation against posting lists."""
+    assert _index().filter(scope).tolist() == expected
+
+
+def test_metadata_filter_rejects_unindexed_field():
+    """Test filtering on a field without postings raises."""
+    with pytest.raises(ScopeSyntaxError):
+        _index().filter("author:alice")
+
+
+def test_metadata_state_round_trip():
+    """Test posting lists survive state/restore."""
+    index = _index()
+    restored = MetadataIndex()
+    restored.restore(index.state())
+
+    assert len(restored) == len(DOCS)
+    assert restored.filter("tag:2024").tolist() == [0, 2]
+    assert restored.values("department") == index.values("department")
+
+
+def _vectors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("make_index", [
+    lambda: FlatVectorIndex(dimension=16),
+    lambda: IVFFlatIndex(dimension=16, nlist=4, nprobe=1, min_train_size=100),
+    lambda: QuantizedVectorIndex(dimension=16, quantization="int8"),
+])
+def test_scoped_search_only_returns_in_scope_docs(make_index):
+    """Test scoped search never returns out-of-scope documents."""
+    vectors = _vectors(400)
+    metadatas = [{"department": "Finance" if i % 4 == 0 else "Legal"} for i in range(400)]
+    index = make_index()
+    if isinstance(index, QuantizedVectorIndex):
+        index._full_vectors = lambda doc_ids: {}
+    index.add([f"doc_{i}" for i in range(400)], vectors, metadatas)
+
+    candidates = index.resolve_scope("department:finance")
+    assert candidates.size == 100
+
+    hits = index.search(vectors[8], top_k=10, candidates=candidates)
+    assert len(hits) == 10
+    assert all(int(doc_id[4:]) % 4 == 0 for doc_id, _ in hits)
+    assert hits[0][0] == "doc_8"
+    assert index.resolve_scope(None) is None
+
+
+def test_scoped_index_save_and_load(tmp_path):
+    """Test metadata postings persist with the vector index."""
+    index = FlatVectorIndex(dimension=16)
+    index.add(["a", "b", "c"], _vectors(3), [{"source": "email"}, {"source": "erp"}, {"source": "email"}])
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    restored = FlatVectorIndex(dimension=16)
+    restored.load(path)
+
+    assert restored.resolve_scope("source:email").tolist() == [0, 2]
@@ -0,0 +1,95 @@
+"""Tests for embedding quantization."""
+import pytest
+import numpy as np
+from app.services.quantization import (
+    Float16Codec, Int8Codec, ProductQuantizer, create_codec, quantization_report
+)
+from app.services.vector_index import QuantizedVectorIndex, normalize_rows
+
+
+def _clustered(n, dim=32, clusters=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)) * 3
+    labels = rng.integers(0, clusters, n)
+    return normalize_rows(centers[labels] + rng.standard_normal((n, dim)))
+
+
+@pytest.mark.parametrize("codec", [Float16Codec(32), Int8Codec(32)])
+def test_scalar_codecs_approximate_inner_products(codec):
+    """Test float16/int8 scores stay close to exact scores."""
+    vectors = _clustered(200)
+    queries = vectors[:5]
+    codes = codec.encode(vectors)
+
+    approx = codec.score(codes, queries)
+    np.testing.assert_allclose(approx, vectors @ queries.T, atol=0.05)
+
+
+def test_product_quantizer_requires_training():
+    """Test PQ encode fails before training and compresses after."""
+    pq = ProductQuantizer(32, n_subvectors=8, n_centroids=16)
+    vectors = _clustered(500)
+    with pytest.raises(RuntimeError):
+        pq.encode(vectors)
+
+    pq.train(vectors)
+    codes = pq.encode(vectors)
+    assert codes["codes"].shape == (500, 8)
+    assert codes["codes"].dtype == np.uint8
+    assert pq.bytes_per_vector() == 8
+
+
+def test_create_codec_validation():
+    """Test codec factory rejects bad settings."""
+    with pytest.raises(ValueError):
+        create_codec("int4", 32)
+    with pytest.raises(ValueError):
+        create_codec("pq", 30, pq_subvectors=8)
+
+
+@pytest.mark.parametrize("mode", ["float16", "int8", "pq"])
+def test_quantized_index_reranks_to_exact_top_hit(mode, monkeypatch):
+    """Test quantized index finds the query's own document after re-ranking."""
+    monkeypatch.setattr("app.services.vector_index.settings.PQ_SUBVECTORS", 8)
+    vectors = _clustered(600)
+    ids = [f"doc_{i}" for i in range(600)]
+    index = QuantizedVectorIndex(
+        dimension=32, quantization=mode, rerank_factor=8, min_train_size=300
+    )
+    index._full_vectors = lambda doc_ids: {d: vectors[int(d[4:])] for d in doc_ids}
+    index.add(ids, vectors)
+
+    assert index.codec.trained
+    assert index.memory_bytes() < vectors.nbytes
+    for q in (3, 150, 599):
+        hits = index.search(vectors[q], top_k=3)
+        assert hits[0][0] == f"doc_{q}"
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_quantized_index_save_and_load(tmp_path, monkeypatch):
+    """Test PQ codes and codebooks round-trip through disk."""
+    monkeypatch.setattr("app.services.vector_index.settings.PQ_SUBVECTORS", 8)
+    vectors = _clustered(400)
+    index = QuantizedVectorIndex(dimension=32, quantization="pq", min_train_size=200)
+    index.add([f"doc_{i}" for i in range(400)], vectors)
+
+    path = str(tmp_path / "pq.npz")
+    index.save(path)
+    restored = QuantizedVectorIndex(dimension=32, quantization="pq")
+    restored.load(path)
+
+    assert len(restored) == 400
+    np.testing.assert_array_equal(restored._codes["codes"][:400], index._codes["codes"][:400])
+    np.testing.assert_allclose(restored.codec.codebooks, index.codec.codebooks)
+
+
+def test_quantization_report():
+    """Test report covers every mode and re-ranking never hurts recall."""
+    vectors = _clustered(1000)
+    report = quantization_report(vectors, vectors[:20], top_k=5, pq_subvectors=8)
+
+    assert [row["mode"] for row in report] == ["float32", "float16", "int8", "pq"]
+    for row in report[1:]:
+        assert row["memory_mb"] < report[0]["memory_mb"]
+        assert row["recall_reranked"] >= row["recall"] - 1e-9
@@ -0,0 +1,149 @@
+"""Tests for the in-process task queue, status store and ingest pool."""
+import asyncio
+import time
+import uuid
+import pytest
+from app.services.audit_queue import MemoryAuditQueue
+from app.services.audit_scheduler import AuditScheduler
+from app.services.ingest_pipeline import InProcessIngestPool
+from app.services.task_queue import TaskQueueService
+from app.services.task_status import RESULT_MAX_CHARS, TaskStatusStore
+
+
+@pytest.mark.asyncio
+async def test_dequeue_blocks_per_task_type():
+    """Test a consumer waits for its own type and never sees other types."""
+    queue = TaskQueueService()
+    await queue.enqueue("ingest", "ingest_1", {"title": "doc"})
+
+    waiter = asyncio.create_task(queue.dequeue("audit"))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    await queue.enqueue("audit", "audit_1", {"goal": "g"})
+    assert await asyncio.wait_for(waiter, 1) == ("audit_1", {"goal": "g"})
+    assert queue.get_task_status("audit_1")["status"] == "processing"
+    assert queue.qsize("ingest") == 1
+
+    assert await queue.dequeue("audit", timeout=0.01) is None
+    assert await queue.dequeue("ingest", timeout=0) == ("ingest_1", {"title": "doc"})
+
+
+@pytest.mark.asyncio
+async def test_dequeue_orders_by_priority_then_age():
+    """Test higher priority tasks come first and equal priorities stay FIFO."""
+    queue = TaskQueueService()
+    for job_id, priority in [("a", 5), ("b", 1), ("c", 9), ("d", 5)]:
+        await queue.enqueue("audit", job_id, {}, priority=priority)
+
+    order = [(await queue.dequeue("audit", timeout=0))[0] for _ in range(4)]
+
+    assert order == ["c", "a", "d", "b"]
+
+
+@pytest.mark.asyncio
+async def test_audit_scheduler_runs_jobs_concurrently_by_priority():
+    """Test a long audit does not block others and freed slots go to urgent jobs."""
+    queue = TaskQueueService()
+    started = []
+    release_long = asyncio.Event()
+
+    async def run_job(job_id, payload):
+        started.append(job_id)
+        if job_id == "long":
+            await release_long.wait()
+        else:
+            await asyncio.sleep(0.01)
+        return job_id != "broken"
+
+    scheduler = AuditScheduler(MemoryAuditQueue(queue), run_job=run_job, max_concurrent=2, recover_on_start=False)
+    await queue.enqueue("audit", "long", {}, priority=5)
+    for job_id, priority in [("low", 1), ("broken", 5), ("urgent", 10)]:
+        await queue.enqueue("audit", job_id, {}, priority=priority)
+
+    scheduler.start()
+    try:
+        for _ in range(100):
+            if scheduler.completed + scheduler.failed == 3:
+                break
+            await asyncio.sleep(0.01)
+        assert started == ["urgent", "long", "broken", "low"]
+        assert (await scheduler.stats())["running"] == 1
+        release_long.set()
+        for _ in range(100):
+            if scheduler.completed == 3:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await scheduler.stop()
+
+    stats = await scheduler.stats()
+    assert (stats["completed"], stats["failed"], stats["queued"]) == (3, 1, 0)
+    assert stats["exec_ms_p99"] >= stats["exec_ms_p50"] > 0
+    assert queue.get_task_status("broken")["status"] == "failed"
+    assert set(queue.get_task_status("low")["result"]) == {"wait_ms", "exec_ms"}
+
+
+@pytest.mark.asyncio
+async def test_ingest_pool_processes_queued_documents_in_batches():
+    """Test pool consumers ingest queued tasks and record their results."""
+    queue = TaskQueueService()
+    pool = InProcessIngestPool(queue, consumers=2, batch_size=8, batch_wait_ms=20)
+    run = uuid.uuid4().hex
+    task_ids = [f"ingest_{run}_{i}" for i in range(10)]
+    for i, task_id in enumerate(task_ids):
+        await queue.enqueue("ingest", task_id, {"title": f"Doc {run} {i}", "content": f"Pool {run} document {i}"})
+
+    pool.start()
+    try:
+        for _ in range(200):
+            if pool.processed == len(task_ids):
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await pool.stop()
+
+    assert pool.processed == len(task_ids)
+    for task_id in task_ids:
+        status = queue.get_task_status(task_id)
+        assert status["status"] == "completed"
+        assert status["result"]["status"] == "success"
+
+
+def test_task_status_store_expires_and_bounds_entries():
+    """Test statuses keep no payload, expire after the TTL and are evicted oldest first."""
+    store = TaskStatusStore(ttl=0.05, max_entries=3)
+    store.set("a", "pending", enqueued_at=1.0)
+    store.set("a", "completed", {"status": "success", "doc_id": "d1", "error": "x" * 1000, "nested": {"k": 1}})
+
+    record = store.get("a")
+    assert record["status"] == "completed" and record["enqueued_at"] == 1.0
+    assert record["result"] == {"status": "success", "doc_id": "d1", "error": "x" * RESULT_MAX_CHARS}
+
+    for task_id in "bcd":
+        store.set(task_id, "pending")
+    assert store.get("a") is None
+    assert len(store) == 3 and store.stats()["evicted"] == 1
+    assert store.stats()["memory_bytes"] > 0
+
+    time.sleep(0.06)
+    store.set("e", "pending")
+    assert len(store) == 1
+    assert store.stats()["expired"] == 3
+
+
+@pytest.mark.asyncio
+async def test_task_queue_statuses_do_not_keep_payloads():
+    """Test queued task statuses hold timestamps but not the document content."""
+    queue = TaskQueueService()
+    await queue.enqueue("ingest", "ingest_big", {"title": "doc", "content": "x" * 10000})
+
+    assert "payload" not in queue.get_task_status("ingest_big")
+    task_id, payload = await queue.dequeue("ingest", timeout=0)
+    assert len(payload["content"]) == 10000
+
+    queue.update_task_status(task_id, "completed", {"status": "success"})
+    status = queue.get_task_status(task_id)
+    assert status["status"] == "completed"
+    assert status["finished_at"] >= status["started_at"] >= status["enqueued_at"]
+    assert queue.tasks.stats()["memory_bytes"] < 2000
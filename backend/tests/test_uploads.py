@@ -0,0 +1,114 @@
+"""Tests for streamed uploads and claim-check ingest payloads."""
+import hashlib
+import io
+import json
+import os
+import time
+import uuid
+import pytest
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+from app.services.task_queue import task_queue_service
+from app.services.uploads import UploadTooLarge, resolve_payload, spool_upload, upload_payload
+from workers.processor import DocumentProcessor
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 1024)
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_spool_upload_streams_and_hashes(spool):
+    """Test uploads are written in chunks with their hash and size."""
+    data = b"Invoice total: 1200\n" * 500
+    upload = await spool_upload(UploadFile(file=io.BytesIO(data), filename="../invoice.txt"))
+
+    assert upload["sha256"] == hashlib.sha256(data).hexdigest()
+    assert upload["size"] == len(data)
+    assert upload["filename"] == "invoice.txt"
+    assert os.path.dirname(upload["path"]) == str(spool)
+    with open(upload["path"], "rb") as f:
+        assert f.read() == data
+
+
+@pytest.mark.asyncio
+async def test_spool_upload_rejects_oversized_files(spool, monkeypatch):
+    """Test an upload over the limit fails and leaves no partial file."""
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 2048)
+
+    with pytest.raises(UploadTooLarge):
+        await spool_upload(UploadFile(file=io.BytesIO(b"x" * 5000), filename="big.txt"))
+    assert os.listdir(spool) == []
+
+
+@pytest.mark.asyncio
+async def test_resolve_payload_loads_spooled_text(spool):
+    """Test the claim-check payload carries no content until resolved."""
+    upload = await spool_upload(UploadFile(file=io.BytesIO(b'{"total": 5}'), filename="data.json"))
+    payload = upload_payload(upload)
+
+    assert "content" not in payload
+    assert json.loads(resolve_payload(payload)["content"]) == {"total": 5}
+    assert resolve_payload({"title": "t", "content": "c"}) == {"title": "t", "content": "c"}
+
+
+def test_resolve_payload_rejects_paths_outside_spool(spool):
+    """Test queued references cannot point outside the spool directory."""
+    payload = upload_payload({"path": "/etc/passwd", "sha256": "", "size": 0, "filename": "passwd"})
+    with pytest.raises(ValueError):
+        resolve_payload(payload)
+
+
+@pytest.mark.asyncio
+async def test_batch_upload_queues_references_for_worker(spool, monkeypatch):
+    """Test /ingest/batch queues a reference that the worker ingests and cleans up."""
+    monkeypatch.setattr(settings, "INGEST_INPROCESS_CONSUMERS", 0)
+    text = f"Upload {uuid.uuid4().hex} Total: 300".encode()
+    with TestClient(app) as client:
+        response = client.post(
+            "/ingest/batch",
+            files=[("files", ("report.txt", text, "text/plain"))],
+            headers={"X-API-Key": settings.API_KEY},
+        )
+    assert response.status_code == 200
+    queued = response.json()["results"][0]
+    assert queued["sha256"] == hashlib.sha256(text).hexdigest()
+
+    # Tasks queued by other tests may be ahead of this one
+    task_id = None
+    while task_id != queued["task_id"]:
+        task_id, payload = await task_queue_service.dequeue("ingest", timeout=0)
+    assert "content" not in payload
+    assert payload["upload"]["size"] == len(text)
+
+    result = await DocumentProcessor().process_document(payload)
+
+    assert result["status"] in ["success", "duplicate"]
+    assert os.listdir(spool) == []
+
+
+def test_batch_upload_ingested_in_process_without_redis(spool):
+    """Test the backend's ingest pool consumes uploads queued without Redis."""
+    text = f"Upload {uuid.uuid4().hex} Total: 120".encode()
+    with TestClient(app) as client:
+        response = client.post(
+            "/ingest/batch",
+            files=[("files", ("memo.txt", text, "text/plain"))],
+            headers={"X-API-Key": settings.API_KEY},
+        )
+        task_id = response.json()["results"][0]["task_id"]
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            status = client.get(f"/ingest/status/{task_id}").json()
+            if status["status"] not in ("pending", "processing"):
+                break
+            time.sleep(0.05)
+
+    assert status["status"] == "completed"
+    assert status["result"]["status"] in ["success", "duplicate"]
+    assert os.listdir(spool) == []
@@ -0,0 +1,220 @@
+"""Tests for vector index."""
+import pytest
+import numpy as np
+from app.services.vector_index import (
+    FlatVectorIndex, IVFFlatIndex, ShardedVectorIndex, create_vector_index,
+    reciprocal_rank_fusion, top_k_indices
+)
+
+
+def _random_vectors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def test_flat_index_matches_bruteforce():
+    """Test flat index returns the exact cosine top-k."""
+    vectors = _random_vectors(500)
+    index = FlatVectorIndex(dimension=16, initial_capacity=8)
+    index.add([f"doc_{i}" for i in range(500)], vectors)
+
+    query = vectors[42] + 0.01
+    results = index.search(query, top_k=5)
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normed @ (query / np.linalg.norm(query))))[:5]
+
+    assert [doc_id for doc_id, _ in results] == [f"doc_{i}" for i in expected]
+    assert results[0][0] == "doc_42"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-3)
+
+
+def test_flat_index_skips_duplicate_ids():
+    """Test adding an existing id does not create a second row."""
+    index = FlatVectorIndex(dimension=16)
+    vectors = _random_vectors(3)
+
+    assert index.add(["a", "b", "a"], vectors) == 2
+    assert index.add(["b"], vectors[:1]) == 0
+    assert len(index) == 2
+
+
+def test_flat_index_rejects_wrong_dimension():
+    """Test dimension mismatch raises."""
+    index = FlatVectorIndex(dimension=16)
+    with pytest.raises(ValueError):
+        index.add(["a"], _random_vectors(1, dim=8))
+
+
+def test_flat_index_empty_search():
+    """Test searching an empty index."""
+    index = FlatVectorIndex(dimension=16)
+    assert index.search(_random_vectors(1)[0], top_k=3) == []
+
+
+def test_top_k_indices_ordering():
+    """Test top-k helper returns best-first indices."""
+    scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+    assert top_k_indices(scores, 2).tolist() == [1, 3]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 0]
+
+
+def _clustered_vectors(n, dim=16, clusters=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)) * 5
+    labels = rng.integers(0, clusters, n)
+    return (centers[labels] + rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def test_ivf_index_trains_and_recalls():
+    """Test IVF index trains on threshold and finds exact neighbours."""
+    vectors = _clustered_vectors(2000)
+    index = IVFFlatIndex(dimension=16, nlist=8, nprobe=3, min_train_size=500)
+    ids = [f"doc_{i}" for i in range(2000)]
+    index.add(ids[:1000], vectors[:1000])
+    assert index.trained
+    index.add(ids[1000:], vectors[1000:])
+
+    flat = FlatVectorIndex(dimension=16)
+    flat.add(ids, vectors)
+
+    hits = 0
+    for q in vectors[:50]:
+        expected = {doc_id for doc_id, _ in flat.search(q, top_k=10)}
+        found = {doc_id for doc_id, _ in index.search(q, top_k=10)}
+        hits += len(expected & found)
+    assert hits / 500 > 0.9
+
+
+def test_ivf_index_untrained_falls_back_to_exact():
+    """Test search before training is exact."""
+    vectors = _random_vectors(50)
+    index = IVFFlatIndex(dimension=16, nlist=8, min_train_size=1000)
+    index.add([f"doc_{i}" for i in range(50)], vectors)
+
+    assert not index.trained
+    assert index.search(vectors[7], top_k=1)[0][0] == "doc_7"
+
+
+def test_index_save_and_load(tmp_path):
+    """Test IVF index round-trips through disk."""
+    vectors = _clustered_vectors(600)
+    ids = [f"doc_{i}" for i in range(600)]
+    index = IVFFlatIndex(dimension=16, nlist=4, nprobe=2, min_train_size=200)
+    index.add(ids, vectors)
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+
+    restored = IVFFlatIndex(dimension=16, nlist=4, nprobe=2)
+    restored.load(path)
+
+    assert len(restored) == 600
+    assert restored.trained
+    for q in vectors[:5]:
+        assert restored.search(q, top_k=5) == index.search(q, top_k=5)
+
+    with pytest.raises(ValueError):
+        FlatVectorIndex(dimension=16).load(path)
+
+
+def test_create_vector_index():
+    """Test index factory."""
+    assert isinstance(create_vector_index("flat", dimension=16), FlatVectorIndex)
+    assert isinstance(create_vector_index("IVF", dimension=16), IVFFlatIndex)
+    with pytest.raises(ValueError):
+        create_vector_index("hnsw")
+
+
+def test_search_batch_matches_single_queries():
+    """Test batched search returns the same rankings as per-query search."""
+    vectors = _clustered_vectors(800)
+    ids = [f"doc_{i}" for i in range(800)]
+    for index in (
+        FlatVectorIndex(dimension=16),
+        IVFFlatIndex(dimension=16, nlist=4, nprobe=2, min_train_size=200),
+    ):
+        index.add(ids, vectors)
+        batch = index.search_batch(vectors[:3], top_k=5)
+        assert len(batch) == 3
+        for q, hits in zip(vectors[:3], batch):
+            single = index.search(q, top_k=5)
+            assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in single]
+            assert [score for _, score in hits] == pytest.approx([score for _, score in single], abs=1e-5)
+
+
+def test_reciprocal_rank_fusion():
+    """Test RRF rewards documents ranked by several queries."""
+    fused = reciprocal_rank_fusion([
+        [("a", 0.9), ("b", 0.8)],
+        [("b", 0.7), ("c", 0.6)],
+        [("b", 0.5), ("a", 0.4)],
+    ])
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] > fused[1][1] > fused[2][1]
+
+
+def _sharded_corpus(n=1000):
+    vectors = _clustered_vectors(n)
+    ids = [f"doc_{i}" for i in range(n)]
+    metadatas = [{"shard_id": f"shard_{i % 4}", "department": "Finance" if i % 2 else "Legal"} for i in range(n)]
+    return ids, vectors, metadatas
+
+
+def test_sharded_index_matches_flat():
+    """Test fan-out search over shards returns the exact global top-k."""
+    ids, vectors, metadatas = _sharded_corpus()
+    sharded = ShardedVectorIndex(dimension=16, n_shards=4, shard_index_type="flat")
+    sharded.add(ids, vectors, metadatas)
+    flat = FlatVectorIndex(dimension=16)
+    flat.add(ids, vectors)
+
+    assert len(sharded) == 1000
+    assert min(len(shard) for shard in sharded.shards) > 200
+    for expected, found in zip(flat.search_batch(vectors[:5], top_k=10), sharded.search_batch(vectors[:5], top_k=10)):
+        assert [doc_id for doc_id, _ in found] == [doc_id for doc_id, _ in expected]
+
+
+def test_sharded_index_balances_documents_of_one_shard_id():
+    """Test documents sharing one shard_id (e.g. batch uploads) still spread over every shard."""
+    ids, vectors, _ = _sharded_corpus()
+    index = ShardedVectorIndex(dimension=16, n_shards=4, shard_index_type="flat")
+    index.add(ids, vectors, [{"shard_id": "shard_1", "source": "batch_upload"}] * len(ids))
+
+    assert min(len(shard) for shard in index.shards) > 200
+    assert index.resolve_scope("shard_id:shard_1").size == len(ids)
+
+
+def test_sharded_index_scope_filters_across_shards():
+    """Test scoped candidates map back to the right shards."""
+    ids, vectors, metadatas = _sharded_corpus()
+    index = ShardedVectorIndex(dimension=16, n_shards=4, shard_index_type="flat")
+    index.add(ids, vectors, metadatas)
+
+    candidates = index.resolve_scope("shard_id:shard_1 AND department:finance")
+    assert candidates.size == 250
+    hits = index.search(vectors[5], top_k=20, candidates=candidates)
+    assert hits[0][0] == "doc_5"
+    assert all(int(doc_id[4:]) % 4 == 1 for doc_id, _ in hits)
+
+    assert index.search(vectors[3], top_k=5, candidates=index.resolve_scope("source:none")) == []
+
+
+def test_sharded_index_save_and_load(tmp_path):
+    """Test sharded index round-trips every shard through one snapshot."""
+    ids, vectors, metadatas = _sharded_corpus(400)
+    index = ShardedVectorIndex(dimension=16, n_shards=4, shard_index_type="flat")
+    index.add(ids, vectors, metadatas)
+
+    path = str(tmp_path / "sharded.npz")
+    index.save(path)
+    restored = ShardedVectorIndex(dimension=16, n_shards=4, shard_index_type="flat")
+    restored.load(path)
+
+    assert len(restored) == 400
+    assert "doc_7" in restored
+    assert restored.search(vectors[7], top_k=3) == index.search(vectors[7], top_k=3)
+    with pytest.raises(ValueError):
+        ShardedVectorIndex(dimension=16, n_shards=2, shard_index_type="flat").load(path)
+    with pytest.raises(ValueError):
+        ShardedVectorIndex(dimension=16, n_shards=4, shard_index_type="mmap")
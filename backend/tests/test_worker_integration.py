@@ -2,7 +2,14 @@
 import pytest
 import asyncio
 import json
-from workers.processor import DocumentProcessor, process_batch, WorkerQueueConsumer
+import redis
+from collections import Counter
+from app.config import settings
+from app.services.ingest_queue import publish_ingest_task, task_shard_id
+from app.services.uploads import upload_payload
+from workers.processor import (
+    DocumentProcessor, StreamTaskSource, WorkerQueueConsumer, create_task_source, process_batch
+)
 
 
 @pytest.mark.asyncio
@@ -185,3 +192,286 @@ def test_numeric_field_validation():
     assert result["valid"] is False
     assert len(result["errors"]) > 0
     assert "negative" in result["errors"][0].lower()
+
+
+class FakeAsyncRedis:
+    """In-memory stand-in for the asyncio Redis list, string and stream commands the consumer uses."""
+    
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.results = {}
+        self.pipelines = 0
+        self.streams = {}
+        self.groups = {}
+        self.seq = 0
+    
+    async def blpop(self, keys, timeout=0):
+        if not self.items:
+            await asyncio.sleep(0.01)
+            return None
+        return keys[0], self.items.pop(0)
+    
+    async def lpop(self, key, count=None):
+        if not self.items:
+            return None
+        if count is None:
+            return self.items.pop(0)
+        popped, self.items = self.items[:count], self.items[count:]
+        return popped
+    
+    async def setex(self, key, ttl, value):
+        self.results[key] = json.loads(value)
+    
+    async def xadd(self, stream, fields):
+        self.seq += 1
+        message_id = f"{self.seq}-0"
+        self.streams.setdefault(stream, {})[message_id] = dict(fields)
+        return message_id
+    
+    async def xgroup_create(self, stream, group, id="0", mkstream=False):
+        if (stream, group) in self.groups:
+            raise redis.ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.streams.setdefault(stream, {})
+        self.groups[(stream, group)] = {"last": 0, "pending": {}}
+    
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (stream, _), = streams.items()
+        state = self.groups[(stream, group)]
+        messages = [
+            (message_id, fields) for message_id, fields in self.streams[stream].items()
+            if int(message_id.split("-")[0]) > state["last"]
+        ][:count]
+        for message_id, _ in messages:
+            state["last"] = int(message_id.split("-")[0])
+            state["pending"][message_id] = {"consumer": consumer, "deliveries": 1}
+        if not messages and block:
+            await asyncio.sleep(0.01)
+        return [(stream, messages)] if messages else []
+    
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=None):
+        pending = self.groups[(stream, group)]["pending"]
+        claimed = []
+        for message_id, entry in list(pending.items())[:count]:
+            entry["consumer"] = consumer
+            entry["deliveries"] += 1
+            claimed.append((message_id, self.streams[stream].get(message_id)))
+        return ["0-0", claimed, []]
+    
+    async def xpending_range(self, stream, group, min, max, count, consumername=None):
+        pending = self.groups[(stream, group)]["pending"]
+        return [
+            {"message_id": message_id, "consumer": entry["consumer"], "times_delivered": entry["deliveries"]}
+            for message_id, entry in pending.items()
+            if consumername in (None, entry["consumer"])
+        ][:count]
+    
+    async def xack(self, stream, group, *message_ids):
+        pending = self.groups[(stream, group)]["pending"]
+        return sum(pending.pop(message_id, None) is not None for message_id in message_ids)
+    
+    async def xdel(self, stream, *message_ids):
+        return sum(self.streams[stream].pop(message_id, None) is not None for message_id in message_ids)
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute()."""
+    
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+    
+    async def execute(self):
+        self.redis.pipelines += 1
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+@pytest.mark.asyncio
+async def test_queue_consumer_processes_micro_batches():
+    """Test the consumer groups tasks into bounded micro-batches with one result pipeline each."""
+    tasks = [
+        json.dumps({"task_id": f"t{i}", "payload": {"title": f"Doc {i}"}})
+        for i in range(10)
+    ]
+    consumer = WorkerQueueConsumer(concurrency=2, batch_size=4)
+    consumer.client = FakeAsyncRedis(tasks)
+    batch_sizes = []
+    
+    async def process_documents(payloads):
+        batch_sizes.append(len(payloads))
+        await asyncio.sleep(0.02)
+        if sum(batch_sizes) >= 10:
+            consumer.stop()
+        return [{"status": "success", "title": payload["title"]} for payload in payloads]
+    
+    consumer.processor.process_documents = process_documents
+    await asyncio.wait_for(consumer.start(poll_interval=0.05), timeout=10)
+    
+    assert sorted(consumer.client.results) == sorted(f"task_result:t{i}" for i in range(10))
+    assert consumer.client.results["task_result:t7"]["title"] == "Doc 7"
+    assert batch_sizes == [4, 4, 2]
+    assert consumer.client.pipelines == 3
+
+
+@pytest.mark.asyncio
+async def test_process_documents_reports_each_payload():
+    """Test a micro-batch is stored in one bulk ingest with per-document results."""
+    processor = DocumentProcessor()
+    payloads = [
+        {"title": f"Micro {i}", "content": f"Total: {i}", "metadata": {"source": "micro_batch"}}
+        for i in range(3)
+    ]
+    payloads.append(None)
+    
+    results = await processor.process_documents(payloads)
+    
+    assert [r["status"] in ["success", "duplicate"] for r in results] == [True, True, True, False]
+    assert results[3]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_stream_source_acks_reclaims_and_dead_letters():
+    """Test stream entries are acknowledged on success, redelivered on failure and dead-lettered after N deliveries."""
+    client = FakeAsyncRedis()
+    for i in range(3):
+        await client.xadd("ingest_stream", {"task": json.dumps({"task_id": f"t{i}", "payload": {"title": f"Doc {i}"}})})
+    await client.xadd("ingest_stream", {"task": "not json"})
+    
+    consumer = WorkerQueueConsumer(concurrency=1, batch_size=10)
+    consumer.client = client
+    consumer.source = StreamTaskSource(
+        client, stream="ingest_stream", group="workers", consumer="w1",
+        claim_idle_ms=0, max_deliveries=2, dead_letter="ingest_dead",
+    )
+    consumer.source.claim_interval = 0
+    
+    async def process_documents(payloads):
+        # Doc 1 always fails
+        return [
+            {"status": "failed", "error": "boom"} if payload["title"] == "Doc 1" else {"status": "success"}
+            for payload in payloads
+        ]
+    
+    consumer.processor.process_documents = process_documents
+    for _ in range(4):
+        entries = await consumer._pop_batch(0)
+        if entries:
+            await consumer._handle_batch(entries)
+    
+    assert client.results["task_result:t0"]["status"] == "success"
+    assert client.results["task_result:t1"]["status"] == "failed"
+    assert set(client.streams["ingest_stream"]) == set()
+    assert client.groups[("ingest_stream", "workers")]["pending"] == {}
+    dead = list(client.streams["ingest_dead"].values())
+    assert sorted(entry["reason"] for entry in dead) == ["delivered more than 2 times", "invalid task JSON"]
+    assert json.loads(next(e["task"] for e in dead if e["reason"].startswith("delivered")))["task_id"] == "t1"
+
+
+@pytest.mark.asyncio
+async def test_failed_uploads_are_discarded_once_terminal(tmp_path, monkeypatch):
+    """Test a failing upload is kept while the stream redelivers it and deleted once it is dead-lettered."""
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "INGEST_TRANSPORT", "list")
+    
+    def upload_task(task_id):
+        path = tmp_path / f"{task_id}.txt"
+        path.write_text("unparseable")
+        return json.dumps({"task_id": task_id, "payload": {"title": task_id, "upload": {"path": str(path)}}})
+    
+    async def process_documents(payloads):
+        return [{"status": "failed", "error": "boom"} for _ in payloads]
+    
+    client = FakeAsyncRedis()
+    await client.xadd("ingest_stream", {"task": upload_task("streamed")})
+    consumer = WorkerQueueConsumer(concurrency=1, batch_size=10)
+    consumer.client = client
+    consumer.source = StreamTaskSource(
+        client, stream="ingest_stream", group="workers", consumer="w1",
+        claim_idle_ms=0, max_deliveries=2, dead_letter="ingest_dead",
+    )
+    consumer.source.claim_interval = 0
+    consumer.processor.process_documents = process_documents
+    
+    await consumer._handle_batch(await consumer._pop_batch(0))
+    assert (tmp_path / "streamed.txt").exists()
+    for _ in range(3):
+        entries = await consumer._pop_batch(0)
+        if entries:
+            await consumer._handle_batch(entries)
+    assert list(client.streams["ingest_dead"].values())[0]["message_id"] == "1-0"
+    assert not (tmp_path / "streamed.txt").exists()
+    
+    consumer.client = FakeAsyncRedis([upload_task("listed")])
+    consumer.source = create_task_source(consumer.client)
+    await consumer._handle_batch(await consumer._pop_batch(0))
+    assert consumer.client.results["task_result:listed"]["status"] == "failed"
+    assert not (tmp_path / "listed.txt").exists()
+
+
+class FakeLists:
+    """Keyed Redis lists supporting the pops the list task source uses."""
+    
+    def __init__(self, lists):
+        self.lists = {key: list(items) for key, items in lists.items()}
+    
+    async def lpop(self, key, count=None):
+        items = self.lists.get(key) or []
+        popped, self.lists[key] = items[:count], items[count:]
+        return popped or None
+    
+    async def blpop(self, keys, timeout=0):
+        for key in keys:
+            if self.lists.get(key):
+                return key, self.lists[key].pop(0)
+        return None
+
+
+@pytest.mark.asyncio
+async def test_shard_source_prefers_own_queue_then_steals():
+    """Test a shard worker drains its own queue before stealing from neighbours."""
+    client = FakeLists({
+        "ingest_tasks:shard_1": ["own-a", "own-b"],
+        "ingest_tasks:shard_2": ["neighbour"],
+        "ingest_tasks:shard_3": ["far"],
+        "ingest_tasks": ["legacy"],
+    })
+    source = create_task_source(client, shard_index=1)
+    
+    assert source.queue_names == [
+        "ingest_tasks:shard_1", "ingest_tasks:shard_2", "ingest_tasks:shard_3", "ingest_tasks:shard_0", "ingest_tasks",
+    ]
+    assert [task for _, task in await source.fetch(10, 0)] == ["own-a", "own-b"]
+    assert [task for _, task in await source.fetch(10, 0)] == ["neighbour"]
+    assert [task for _, task in await source.fetch(10, 0)] == ["far"]
+    assert [task for _, task in await source.fetch(10, 1)] == ["legacy"]
+    assert await source.fetch(10, 0) == []
+
+
+def test_publish_routes_tasks_to_shard_queues(monkeypatch):
+    """Test sharded publishing spreads uploads of one source over every shard queue."""
+    monkeypatch.setattr(settings, "INGEST_SHARDED_QUEUES", True)
+    monkeypatch.setattr(settings, "MAX_WORKERS", 4)
+    pushed = []
+    
+    class Client:
+        def rpush(self, key, value):
+            pushed.append((key, json.loads(value)["task_id"]))
+    
+    queues = [
+        publish_ingest_task(Client(), f"t{i}", upload_payload(
+            {"path": f"/spool/{i}.txt", "sha256": "", "size": 1, "filename": f"report_{i}.txt"}
+        ))
+        for i in range(400)
+    ]
+    
+    assert pushed[0] == (queues[0], "t0")
+    counts = Counter(queues)
+    assert set(counts) == {f"ingest_tasks:shard_{i}" for i in range(4)}
+    assert min(counts.values()) > 50
+    payload = {"title": "report_0.txt", "metadata": {"source": "batch_upload"}}
+    assert queues[0] == f"ingest_tasks:{task_shard_id(payload)}"
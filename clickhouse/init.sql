@@ -18,8 +18,8 @@ CREATE TABLE IF NOT EXISTS odra.documents (
 ORDER BY (created_at, id)
 PARTITION BY toYYYYMM(created_at);
 
--- Index for vector search (HNSW if available, otherwise just B-tree)
-ALTER TABLE odra.documents ADD INDEX embedding_idx embedding TYPE ngram(3);
+-- Vector search is served by the backend ANN index (VECTOR_INDEX_TYPE=ivf,
+-- persisted to VECTOR_INDEX_PATH); no ClickHouse-side embedding index is built.
 
 -- Audit jobs table
 CREATE TABLE IF NOT EXISTS odra.audit_jobs (
@@ -0,0 +1,25 @@
+"""Convert stored JSON-text document embeddings to binary float32 in place."""
+import argparse
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.db import migrate_embeddings_to_binary
+
+
+def main():
+    """Run the embedding storage migration."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows converted per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print("Migrating document embeddings to binary float32...")
+    converted = migrate_embeddings_to_binary(batch_size=args.batch_size)
+    print(f"Done: {converted} embeddings converted")
+
+
+if __name__ == "__main__":
+    main()
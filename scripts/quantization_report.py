@@ -0,0 +1,60 @@
+"""Report recall vs. memory of each embedding quantization mode."""
+import argparse
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.db import SessionLocal, Document, decode_embedding
+from app.config import settings
+from app.services.quantization import quantization_report
+from app.services.vector_index import normalize_rows
+
+
+def load_embeddings(limit: int) -> np.ndarray:
+    """Load up to `limit` stored document embeddings."""
+    db = SessionLocal()
+    try:
+        rows = db.query(Document.embedding, Document.embedding_dim).limit(limit).all()
+    finally:
+        db.close()
+    return normalize_rows(np.stack([decode_embedding(raw, dim) for raw, dim in rows if raw]))
+
+
+def main():
+    """Print the recall/memory table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=100000, help="max documents to load")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of the database")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        vectors = normalize_rows(rng.standard_normal((args.synthetic, settings.EMBEDDING_DIMENSION)))
+    else:
+        vectors = load_embeddings(args.limit)
+
+    # Perturbed corpus vectors stand in for real queries
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = normalize_rows(vectors[picks] + 0.1 * rng.standard_normal((len(picks), vectors.shape[1])))
+
+    report = quantization_report(
+        vectors, queries, top_k=args.top_k,
+        rerank_factor=settings.RERANK_FACTOR, pq_subvectors=settings.PQ_SUBVECTORS,
+    )
+
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{args.top_k}")
+    print(f"{'mode':<10}{'bytes/vec':>10}{'memory MB':>12}{'recall':>9}{'reranked':>10}{'score ms':>10}")
+    for row in report:
+        print(
+            f"{row['mode']:<10}{row['bytes_per_vector']:>10.0f}{row['memory_mb']:>12.1f}"
+            f"{row['recall']:>9.3f}{row['recall_reranked']:>10.3f}{row['score_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,31 @@
 """Worker processor for document ingestion."""
+import argparse
 import logging
+import multiprocessing
+import signal
+import time
 import json
 import asyncio
 import os
-from typing import Dict, Any, Optional
+import socket
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 import sys
 import redis
+import redis.asyncio as aioredis
 
 # PYTHONPATH is set in Dockerfile: /app:/app/backend
 # This allows us to import from app package directly
 
 from app.services.embeddings import embeddings_service
 from app.services.ingest import ingest_document
+from app.services.ingest_pipeline import (
+    check_numeric_fields, extract_numeric_fields, process_documents, validate_numeric_fields
+)
+from app.services.ingest_queue import INGEST_LIST, shard_queues, stream_transport
+from app.services.uploads import resolve_payload_async, discard_upload
+from app.services.extraction import pdf_extractor
 from app.db import init_db  # Import database initialization
+from app.config import settings
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 logging.basicConfig(
@@ -48,28 +61,26 @@ class DocumentProcessor:
     async def process_document(self, doc_payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Process single document:
-        1. Extract metadata
-        2. Compute embedding
-        3. Validate numeric fields if present
-        4. Store in database
+        1. Load and parse the spooled upload, if the payload references one
+        2. Extract metadata
+        3. Compute embedding
+        4. Validate numeric fields if present
+        5. Store in database
         """
+        title = doc_payload.get("title", "Unknown")
         try:
-            title = doc_payload.get("title", "Unknown")
-            content = doc_payload.get("content", "")
+            payload = await resolve_payload_async(doc_payload)
+            content = payload.get("content", "")
             
             logger.info(f"📄 Processing document: {title}")
             
             # Validate numeric fields if present (self-check)
-            numeric_fields = self._extract_numeric_fields(content)
-            validation_result = self._validate_numeric_fields(numeric_fields)
-            
-            if not validation_result["valid"]:
-                logger.warning(
-                    f"⚠️ Document {title} failed validation: {validation_result['errors']}"
-                )
+            self._check_numeric_fields(title, content)
             
             # Ingest document
-            result = await ingest_document(doc_payload)
+            result = await ingest_document(payload)
+            if result.get("status") in ("success", "duplicate"):
+                discard_upload(doc_payload)
             
             logger.info(f"✅ Processed document: {title} -> {result.get('status')}")
             return result
@@ -78,58 +89,30 @@ class DocumentProcessor:
             logger.error(f"❌ Failed to process document {title}: {e}", exc_info=True)
             raise
     
+    async def process_documents(self, doc_payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Process a micro-batch: one batched embed and bulk write (see ingest_pipeline)."""
+        return await process_documents(doc_payloads)
+    
+    def _check_numeric_fields(self, title: str, content: str):
+        """Log documents whose numeric fields fail validation."""
+        check_numeric_fields(title, content)
+    
     def _extract_numeric_fields(self, content: str) -> Dict[str, float]:
         """Extract numeric fields from content."""
-        import re
-        fields = {}
-        
-        patterns = {
-            "total": r"total[:\s]+(\d+\.?\d*)",
-            "sum": r"sum[:\s]+(\d+\.?\d*)",
-            "amount": r"amount[:\s]+(\d+\.?\d*)",
-            "count": r"count[:\s]+(\d+\.?\d*)",
-        }
-        
-        for field_name, pattern in patterns.items():
-            matches = re.findall(pattern, content, re.IGNORECASE)
-            if matches:
-                try:
-                    fields[field_name] = float(matches[0])
-                except (ValueError, IndexError):
-                    pass
-        
-        return fields
+        return extract_numeric_fields(content)
     
     def _validate_numeric_fields(self, fields: Dict[str, float]) -> Dict[str, Any]:
         """Validate numeric fields consistency."""
-        errors = []
-        for field_name, value in fields.items():
-            if value < 0:
-                errors.append(f"{field_name} is negative: {value}")
-        
-        return {
-            "valid": len(errors) == 0,
-            "errors": errors,
-        }
+        return validate_numeric_fields(fields)
 
 
 async def process_batch(documents: list) -> Dict[str, Any]:
-    """Process batch of documents in parallel with proper concurrency control."""
+    """Process batch of documents with one batched embed and bulk write per micro-batch."""
     processor = DocumentProcessor()
     
-    # Process documents with semaphore to avoid overwhelming resources
-    semaphore = asyncio.Semaphore(5)  # Max 5 concurrent documents
-    
-    async def process_with_semaphore(doc):
-        async with semaphore:
-            try:
-                return await processor.process_document(doc)
-            except Exception as e:
-                logger.error(f"Failed to process document: {e}")
-                return {"status": "failed", "error": str(e)}
-    
-    tasks = [process_with_semaphore(doc) for doc in documents]
-    results = await asyncio.gather(*tasks, return_exceptions=False)
+    results = []
+    for start in range(0, len(documents), settings.WORKER_BATCH_SIZE):
+        results.extend(await processor.process_documents(documents[start:start + settings.WORKER_BATCH_SIZE]))
     
     successful = sum(1 for r in results if isinstance(r, dict) and r.get("status") in ["success", "duplicate"])
     failed = len(results) - successful
@@ -144,66 +127,350 @@ async def process_batch(documents: list) -> Dict[str, Any]:
     }
 
 
+class ListTaskSource:
+    """Tasks popped from one or more Redis lists, in priority order.
+    
+    A fetch drains the first non-empty list, so a shard worker reading
+    `shard_queues(i)` takes its own shard's tasks first and steals from its
+    neighbours only when its own queue is empty. A pop removes the task, so
+    acknowledgement is a no-op and a task in flight when its worker dies is
+    lost.
+    """
+    
+    redelivers = False
+    
+    def __init__(self, client, queue_names: Union[str, Sequence[str]] = INGEST_LIST):
+        """Initialize source over `queue_names` (one list name or several)."""
+        self.client = client
+        self.queue_names = [queue_names] if isinstance(queue_names, str) else list(queue_names)
+        self.queue_name = self.queue_names[0]
+    
+    async def fetch(self, count: int, timeout: float) -> List[Tuple[Optional[str], str]]:
+        """Up to `count` (message id, task JSON) pairs, waiting up to `timeout` seconds for one."""
+        items = []
+        for queue_name in self.queue_names:
+            items = await self.client.lpop(queue_name, count) or []
+            if items:
+                break
+        if not items and timeout > 0:
+            # BLPOP serves the first non-empty key, keeping the priority order
+            popped = await self.client.blpop(self.queue_names, timeout=timeout)
+            items = [popped[1]] if popped else []
+        return [(None, item) for item in items]
+    
+    async def ack(self, message_ids: List[Optional[str]]):
+        pass
+    
+    async def reject(self, entries: List[Tuple[Optional[str], Any]], reason: str):
+        pass
+    
+    def release(self, message_ids: List[Optional[str]]):
+        pass
+
+
+def _stream_id_key(message_id: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in message_id.split("-"))
+
+
+class StreamTaskSource:
+    """Tasks read from a Redis stream through a consumer group (at-least-once).
+    
+    Entries stay pending until acknowledged, which happens only after the
+    task's result is stored. Entries left pending longer than
+    INGEST_CLAIM_IDLE_MS (their worker died, or processing failed) are
+    reclaimed with XAUTOCLAIM by any live consumer; an entry delivered more
+    than INGEST_MAX_DELIVERIES times moves to the dead-letter stream.
+    Acknowledged entries are deleted, so the stream holds only the backlog.
+    Ingest is idempotent, so a redelivered document is reported as a
+    duplicate rather than stored twice.
+    """
+    
+    redelivers = True
+    
+    def __init__(
+        self,
+        client,
+        stream: str = None,
+        group: str = None,
+        consumer: str = None,
+        claim_idle_ms: int = None,
+        max_deliveries: int = None,
+        dead_letter: str = None,
+    ):
+        """Initialize source; the consumer group is created on first fetch."""
+        self.client = client
+        self.stream = stream or settings.INGEST_STREAM
+        self.group = group or settings.INGEST_STREAM_GROUP
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle_ms = settings.INGEST_CLAIM_IDLE_MS if claim_idle_ms is None else claim_idle_ms
+        self.max_deliveries = max_deliveries or settings.INGEST_MAX_DELIVERIES
+        self.dead_letter = dead_letter or settings.INGEST_DEAD_LETTER_STREAM
+        # Reclaim scans run a few times per idle period, cursor carried between scans
+        self.claim_interval = max(self.claim_idle_ms / 4000, 1.0)
+        self._claim_cursor = "0-0"
+        self._next_claim = 0.0
+        self._group_ready = False
+        # Entries this consumer is processing; reclaiming them must not start a second copy
+        self._held = set()
+    
+    async def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            logger.info(f"Created consumer group '{self.group}' on '{self.stream}'")
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+    
+    async def _delivery_counts(self, message_ids: List[str]) -> Dict[str, int]:
+        pending = await self.client.xpending_range(
+            self.stream, self.group, min=message_ids[0], max=message_ids[-1],
+            count=max(100, 4 * len(message_ids)), consumername=self.consumer,
+        )
+        return {entry["message_id"]: entry["times_delivered"] for entry in pending}
+    
+    async def _reclaim(self, count: int) -> List[Tuple[str, Optional[str]]]:
+        """Claim entries other consumers left pending too long (rate-limited)."""
+        now = asyncio.get_running_loop().time()
+        if now < self._next_claim:
+            return []
+        self._next_claim = now + self.claim_interval
+        
+        response = await self.client.xautoclaim(
+            self.stream, self.group, self.consumer, self.claim_idle_ms,
+            start_id=self._claim_cursor, count=count,
+        )
+        self._claim_cursor = response[0]
+        # Entries deleted from the stream come back without fields
+        claimed = [(message_id, fields) for message_id, fields in response[1] if fields]
+        if not claimed:
+            return []
+        
+        counts = await self._delivery_counts(sorted((message_id for message_id, _ in claimed), key=_stream_id_key))
+        dead = {message_id for message_id, _ in claimed if counts.get(message_id, 0) > self.max_deliveries}
+        if dead:
+            await self.reject(
+                [(message_id, fields.get("task")) for message_id, fields in claimed if message_id in dead],
+                f"delivered more than {self.max_deliveries} times",
+            )
+        reclaimed = [
+            (message_id, fields.get("task")) for message_id, fields in claimed
+            if message_id not in dead and message_id not in self._held
+        ]
+        if reclaimed:
+            logger.info(f"Reclaimed {len(reclaimed)} stale ingest tasks")
+        return reclaimed
+    
+    async def fetch(self, count: int, timeout: float) -> List[Tuple[Optional[str], str]]:
+        """Up to `count` (message id, task JSON) pairs, waiting up to `timeout` seconds for one."""
+        await self._ensure_group()
+        entries = await self._reclaim(count)
+        if not entries:
+            block_ms = int(timeout * 1000)
+            response = await self.client.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=count, block=block_ms if block_ms > 0 else None
+            )
+            for _stream, messages in response or []:
+                entries.extend((message_id, fields.get("task")) for message_id, fields in messages)
+        self._held.update(message_id for message_id, _ in entries)
+        return entries
+    
+    async def ack(self, message_ids: List[Optional[str]]):
+        """Acknowledge and delete processed entries."""
+        if not message_ids:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xack(self.stream, self.group, *message_ids)
+        pipe.xdel(self.stream, *message_ids)
+        await pipe.execute()
+    
+    async def reject(self, entries: List[Tuple[Optional[str], Any]], reason: str):
+        """Move entries to the dead-letter stream, deleting their spooled uploads."""
+        if not entries:
+            return
+        logger.error(f"Moving {len(entries)} ingest tasks to '{self.dead_letter}': {reason}")
+        pipe = self.client.pipeline(transaction=False)
+        for message_id, task_json in entries:
+            pipe.xadd(self.dead_letter, {"task": task_json or "", "message_id": message_id, "reason": reason})
+        message_ids = [message_id for message_id, _ in entries]
+        pipe.xack(self.stream, self.group, *message_ids)
+        pipe.xdel(self.stream, *message_ids)
+        await pipe.execute()
+        
+        # Dead-lettered tasks are never processed again
+        for _, task_json in entries:
+            try:
+                task = json.loads(task_json)
+            except (TypeError, json.JSONDecodeError):
+                continue
+            if isinstance(task, dict):
+                discard_upload(task.get("payload"))
+    
+    def release(self, message_ids: List[Optional[str]]):
+        """Mark entries as no longer being processed here (unacknowledged ones can be reclaimed)."""
+        self._held.difference_update(message_ids)
+
+
+def create_task_source(client, queue_name: str = INGEST_LIST, shard_index: Optional[int] = None):
+    """Task source for INGEST_TRANSPORT (shard workers read their shard's queue first)."""
+    if stream_transport():
+        return StreamTaskSource(client)
+    if shard_index is not None:
+        return ListTaskSource(client, shard_queues(shard_index))
+    return ListTaskSource(client, queue_name)
+
+
 class WorkerQueueConsumer:
-    """Consume tasks from Redis queue and process them."""
+    """Consume tasks from Redis and process them in concurrent micro-batches.
+    
+    Tasks come from a list or, with INGEST_TRANSPORT=stream, a consumer
+    group (see StreamTaskSource). Uses the asyncio Redis client so waiting
+    for tasks never blocks the event loop. Fetched tasks are grouped into
+    micro-batches of up to WORKER_BATCH_SIZE tasks, waiting at most
+    WORKER_BATCH_WAIT_MS for a batch to fill; each batch is embedded and
+    written in bulk and its results stored in one Redis pipeline. Up to
+    `concurrency` batches are in flight, and the next batch is collected
+    while the current ones run.
+    """
     
-    def __init__(self, queue_name: str = "ingest_tasks"):
-        """Initialize queue consumer."""
+    def __init__(
+        self,
+        queue_name: str = INGEST_LIST,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        shard_index: Optional[int] = None,
+    ):
+        """Initialize queue consumer.
+        
+        `queue_name` is the list read by the list transport; with `shard_index`
+        the consumer reads that shard's queue, stealing from its neighbours.
+        """
         self.queue_name = queue_name
+        self.shard_index = shard_index
+        self.concurrency = max(1, concurrency or settings.WORKER_CONCURRENCY)
+        self.batch_size = max(1, batch_size or settings.WORKER_BATCH_SIZE)
+        self.batch_wait = settings.WORKER_BATCH_WAIT_MS / 1000
         self.processor = DocumentProcessor()
+        self.client = None
+        self.source = None
         self.running = False
+        self._inflight = set()
+    
+    async def _pop_batch(self, timeout: float) -> List[Tuple[Optional[str], str]]:
+        """Collect a micro-batch; waits up to `timeout` seconds for its first task only when idle."""
+        tasks = await self.source.fetch(self.batch_size, 0 if self._inflight else timeout)
+        if not tasks:
+            return []
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(tasks) < self.batch_size:
+            more = await self.source.fetch(self.batch_size - len(tasks), max(deadline - loop.time(), 0))
+            if not more:
+                break
+            tasks.extend(more)
+        return tasks
+    
+    async def _handle_batch(self, entries: List[Tuple[Optional[str], str]]):
+        """Process one micro-batch, store its results in one pipeline and acknowledge them."""
+        message_ids, task_ids, payloads, invalid = [], [], [], []
+        for message_id, task_json in entries:
+            try:
+                task = json.loads(task_json)
+            except (TypeError, json.JSONDecodeError):
+                logger.error(f"Invalid JSON in task: {task_json}")
+                invalid.append((message_id, task_json))
+                continue
+            message_ids.append(message_id)
+            task_ids.append(task.get("task_id", "unknown"))
+            payloads.append(task.get("payload", {}))
+        try:
+            if invalid:
+                await self.source.reject(invalid, "invalid task JSON")
+            if payloads:
+                await self._process_tasks(message_ids, task_ids, payloads)
+        finally:
+            self.source.release([message_id for message_id, _ in entries])
+    
+    async def _process_tasks(
+        self, message_ids: List[Optional[str]], task_ids: List[str], payloads: List[Dict[str, Any]]
+    ):
+        logger.info(f"🔄 Processing {len(payloads)} tasks from queue")
+        try:
+            results = await self.processor.process_documents(payloads)
+        except Exception as e:
+            logger.error(f"Error processing batch: {e}", exc_info=True)
+            results = [{"status": "failed", "error": str(e)}] * len(payloads)
+        
+        if not self.source.redelivers:
+            # A popped list task is never retried, so its upload is no longer needed
+            for payload in payloads:
+                discard_upload(payload)
+        
+        # Store results in Redis
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for task_id, result in zip(task_ids, results):
+                pipe.setex(
+                    f"task_result:{task_id}",
+                    3600,  # 1 hour expiry
+                    json.dumps(result)
+                )
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to store results for {len(task_ids)} tasks: {e}", exc_info=True)
+            return
+        
+        # Failed tasks stay unacknowledged and are redelivered (stream transport)
+        await self.source.ack([
+            message_id for message_id, result in zip(message_ids, results)
+            if result.get("status") in ("success", "duplicate")
+        ])
+        logger.info(f"✅ {len(task_ids)} tasks completed")
     
     async def start(self, poll_interval: float = 2.0):
         """Start consuming tasks from queue."""
-        if not self.processor.redis_client:
-            logger.error("Redis not available. Cannot start queue consumer.")
-            return
+        if self.client is None:
+            if not self.processor.redis_client:
+                logger.error("Redis not available. Cannot start queue consumer.")
+                return
+            self.client = aioredis.from_url(self.processor.redis_url, decode_responses=True)
+        if self.source is None:
+            self.source = create_task_source(self.client, self.queue_name, self.shard_index)
         
         self.running = True
-        logger.info(f"🚀 Starting queue consumer for '{self.queue_name}'")
+        logger.info(
+            f"🚀 Starting queue consumer ({type(self.source).__name__}) "
+            f"(concurrency={self.concurrency}, batch_size={self.batch_size})"
+        )
         
-        while self.running:
-            try:
-                # Pop task from queue (blocking pop with timeout)
-                # blpop is synchronous and returns (key, value) tuple or None
-                task_data: Optional[tuple] = self.processor.redis_client.blpop(  # type: ignore
-                    [self.queue_name],
-                    timeout=int(poll_interval)
-                )
-                
-                if task_data is not None:
-                    _queue_key, task_json = task_data
-                    try:
-                        task = json.loads(task_json)  # type: ignore
-                        task_id = task.get("task_id", "unknown")
-                        payload = task.get("payload", {})
-                        
-                        logger.info(f"🔄 Processing task {task_id} from queue")
-                        
-                        # Process document
-                        result = await self.processor.process_document(payload)
-                        
-                        # Store result in Redis
-                        result_key = f"task_result:{task_id}"
-                        self.processor.redis_client.setex(
-                            result_key,
-                            3600,  # 1 hour expiry
-                            json.dumps(result)
-                        )
-                        
-                        logger.info(f"✅ Task {task_id} completed: {result}")
+        try:
+            while self.running:
+                try:
+                    popped = await self._pop_batch(poll_interval)
+                    if popped:
+                        task = asyncio.create_task(self._handle_batch(popped))
+                        self._inflight.add(task)
+                        task.add_done_callback(self._inflight.discard)
                     
-                    except json.JSONDecodeError:
-                        logger.error(f"Invalid JSON in task: {task_json}")
-                    except Exception as e:
-                        logger.error(f"Error processing task: {e}", exc_info=True)
-                else:
-                    # No task in queue, continue polling
-                    await asyncio.sleep(0.1)
-            
-            except Exception as e:
-                logger.error(f"Queue consumer error: {e}", exc_info=True)
-                await asyncio.sleep(5)  # Back off on error
+                    full = len(self._inflight) >= self.concurrency
+                    if full or (self._inflight and not popped):
+                        # Wait for a slot (or, with slots free but an empty queue, poll again soon)
+                        await asyncio.wait(
+                            self._inflight,
+                            timeout=None if full else min(poll_interval, 0.1),
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
+                
+                except Exception as e:
+                    logger.error(f"Queue consumer error: {e}", exc_info=True)
+                    await asyncio.sleep(5)  # Back off on error
+        finally:
+            if self._inflight:
+                logger.info(f"Waiting for {len(self._inflight)} in-flight batches")
+                await asyncio.gather(*self._inflight, return_exceptions=True)
     
     def stop(self):
         """Stop the queue consumer."""
@@ -211,15 +478,15 @@ class WorkerQueueConsumer:
         logger.info("Stopping queue consumer")
 
 
-async def main():
+async def main(concurrency: Optional[int] = None, shard_index: Optional[int] = None):
     """Main worker entry point."""
-    logger.info("🟢 ODRA Worker started")
+    logger.info("🟢 ODRA Worker started" + (f" for shard_{shard_index}" if shard_index is not None else ""))
     
     # Initialize database tables
     await init_db()
     logger.info("✅ Database initialized")
     
-    consumer = WorkerQueueConsumer()
+    consumer = WorkerQueueConsumer(concurrency=concurrency, shard_index=shard_index)
     
     try:
         await consumer.start()
@@ -229,8 +496,101 @@ async def main():
     except Exception as e:
         logger.error(f"Worker crashed: {e}", exc_info=True)
         consumer.stop()
+    finally:
+        pdf_extractor.shutdown()
+
+
+def run_shard_worker(shard_index: int, concurrency: Optional[int] = None):
+    """Process entry point for one shard's worker."""
+    asyncio.run(main(concurrency, shard_index))
+
+
+class WorkerSupervisor:
+    """Runs one worker process per shard and restarts any that exit.
+    
+    Each process consumes its own shard's queue first, so a document that
+    is sent again hits the same process and its warm embedding cache;
+    idle processes steal from neighbouring shards. Processes are started
+    with the spawn method so none inherits the parent's threads or Redis
+    connections.
+    """
+    
+    def __init__(self, n_shards: Optional[int] = None, concurrency: Optional[int] = None, restart_delay: float = 5.0):
+        """Initialize supervisor for `n_shards` shards (default MAX_WORKERS)."""
+        self.n_shards = n_shards or settings.MAX_WORKERS
+        self.concurrency = concurrency
+        self.restart_delay = restart_delay
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.running = False
+        self._context = multiprocessing.get_context("spawn")
+    
+    def _spawn(self, shard_index: int):
+        process = self._context.Process(
+            target=run_shard_worker,
+            args=(shard_index, self.concurrency),
+            name=f"odra-worker-shard-{shard_index}",
+        )
+        process.start()
+        self.processes[shard_index] = process
+        logger.info(f"Started worker for shard_{shard_index} (pid {process.pid})")
+    
+    def stop(self, *_args):
+        """Stop supervising; running workers are terminated."""
+        self.running = False
+    
+    def run(self, poll_interval: float = 1.0):
+        """Start all shard workers and keep them running until stopped."""
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # Create tables once; concurrent CREATE TABLEs from the workers would race
+        asyncio.run(init_db())
+        for shard_index in range(self.n_shards):
+            self._spawn(shard_index)
+        
+        restart_at: Dict[int, float] = {}
+        try:
+            while self.running:
+                time.sleep(poll_interval)
+                for shard_index, process in list(self.processes.items()):
+                    if process.is_alive():
+                        continue
+                    if shard_index not in restart_at:
+                        logger.error(
+                            f"Worker for shard_{shard_index} exited with code {process.exitcode}, "
+                            f"restarting in {self.restart_delay}s"
+                        )
+                        restart_at[shard_index] = time.monotonic() + self.restart_delay
+                    elif time.monotonic() >= restart_at[shard_index]:
+                        del restart_at[shard_index]
+                        self._spawn(shard_index)
+        finally:
+            logger.info("Stopping shard workers")
+            for process in self.processes.values():
+                if process.is_alive():
+                    process.terminate()
+            for process in self.processes.values():
+                process.join(timeout=30)
 
 
 if __name__ == "__main__":
-    # Run worker queue consumer
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="ODRA ingest worker")
+    parser.add_argument(
+        "--concurrency", type=int, default=None,
+        help=f"micro-batches processed at once (default: WORKER_CONCURRENCY={settings.WORKER_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--shard", type=int, default=None,
+        help="consume this shard's queue first, stealing from neighbouring shards when it is empty",
+    )
+    parser.add_argument(
+        "--supervise", action="store_true",
+        help=f"run one worker process per shard (MAX_WORKERS={settings.MAX_WORKERS}) and restart them on exit",
+    )
+    args = parser.parse_args()
+    
+    if args.supervise:
+        WorkerSupervisor(concurrency=args.concurrency).run()
+    else:
+        # Run worker queue consumer
+        asyncio.run(main(args.concurrency, args.shard))